@@ -0,0 +1,19 @@
+"""
+ASGI config for AI Tutorials project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Under ASGI, streamed tutorial generation waits for OpenAI on the event loop,
+so one worker process holds many generations at once. The other endpoints
+are sync views, run by Django in a thread pool.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+application = get_asgi_application()
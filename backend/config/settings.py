@@ -82,6 +82,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "config.wsgi.application"
+ASGI_APPLICATION = "config.asgi.application"
 
 
 # Database
@@ -132,6 +133,45 @@ STATIC_URL = "static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Chunked video uploads (POST /api/uploads/)
+CHUNKED_UPLOAD_DIR = MEDIA_ROOT / "chunked_uploads"
+CHUNKED_UPLOAD_MAX_BYTES = env.int('CHUNKED_UPLOAD_MAX_BYTES', default=10 * 1024 ** 3)
+CHUNKED_UPLOAD_MAX_CHUNK_BYTES = env.int('CHUNKED_UPLOAD_MAX_CHUNK_BYTES', default=16 * 1024 ** 2)
+# Unfinished uploads not touched for this long are deleted
+CHUNKED_UPLOAD_EXPIRE_HOURS = env.int('CHUNKED_UPLOAD_EXPIRE_HOURS', default=24)
+
+# Bulk transcript import (POST /api/transcripts/import/, manage.py import_transcripts)
+# Transcripts validated and inserted together
+BULK_IMPORT_BATCH_SIZE = env.int('BULK_IMPORT_BATCH_SIZE', default=200)
+# Processes validating transcripts in parallel (1 = validate in the calling process)
+BULK_IMPORT_WORKERS = env.int('BULK_IMPORT_WORKERS', default=min(4, os.cpu_count() or 1))
+# Larger transcripts are rejected, they must go through the regular upload
+BULK_IMPORT_MAX_ITEM_BYTES = env.int('BULK_IMPORT_MAX_ITEM_BYTES', default=100 * 1024 ** 2)
+
+# Video clip extraction
+# 'reencode': every clip is re-encoded (frame accurate, CPU heavy)
+# 'copy': clips are stream-copied from keyframes, only the lead-in is re-encoded when needed
+#   (H.264 High yuv420p / AAC sources only; clips of other sources off a keyframe are re-encoded)
+VIDEO_CLIP_MODE = env('VIDEO_CLIP_MODE', default='reencode')
+# Max distance (seconds) between a clip start and a keyframe to copy from that keyframe directly
+VIDEO_CLIP_KEYFRAME_TOLERANCE = env.float('VIDEO_CLIP_KEYFRAME_TOLERANCE', default=0.5)
+# Max number of processes cutting clips in parallel (1 = extract in the calling process)
+VIDEO_CLIP_WORKERS = env.int('VIDEO_CLIP_WORKERS', default=min(4, os.cpu_count() or 1))
+# Content-addressed clip store shared across tutorials (MEDIA_ROOT/clip_store/)
+CLIP_STORE_ENABLED = env.bool('CLIP_STORE_ENABLED', default=True)
+# Disk budget of the clip store, least recently used clips are evicted above it
+CLIP_STORE_MAX_BYTES = env.int('CLIP_STORE_MAX_BYTES', default=5 * 1024 ** 3)
+
+# Generation job queue (workers: python manage.py run_generation_worker)
+# Seconds between two polls of an idle worker
+GENERATION_JOB_POLL_SECONDS = env.float('GENERATION_JOB_POLL_SECONDS', default=2.0)
+# Seconds between heartbeats of a running job
+GENERATION_JOB_HEARTBEAT_SECONDS = env.int('GENERATION_JOB_HEARTBEAT_SECONDS', default=30)
+# A running job without heartbeat for this long is considered abandoned
+GENERATION_JOB_STALE_SECONDS = env.int('GENERATION_JOB_STALE_SECONDS', default=300)
+# Max number of runs of a job (abandoned jobs are retried until this limit)
+GENERATION_JOB_MAX_ATTEMPTS = env.int('GENERATION_JOB_MAX_ATTEMPTS', default=3)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -201,6 +241,60 @@ SOCIAL_AUTH_GITHUB_SCOPE = ['user:email']
 
 # OpenAI Configuration
 OPENAI_API_KEY = env('OPENAI_API_KEY', default='')
+# Model generating tutorials
+LLM_MODEL = env('LLM_MODEL', default='gpt-4o')
+# Faster model trying small transcripts first, LLM_MODEL taking over when its answer is unusable
+# (empty sends everything to LLM_MODEL)
+LLM_SMALL_MODEL = env('LLM_SMALL_MODEL', default='gpt-4o-mini')
+# Small transcripts: tutorial prompt tokens and conversation minutes at most
+LLM_SMALL_MAX_PROMPT_TOKENS = env.int('LLM_SMALL_MAX_PROMPT_TOKENS', default=3000)
+LLM_SMALL_MAX_MINUTES = env.float('LLM_SMALL_MAX_MINUTES', default=10.0)
+# Completion tokens allowed to the small model (LLM_MODEL gets 4096)
+LLM_SMALL_MAX_TOKENS = env.int('LLM_SMALL_MAX_TOKENS', default=2048)
+# Backend answering chat completions: openai, fake (local stand-in, no network),
+# record (openai, saving answers to LLM_RECORDINGS_DIR) or replay (saved answers only)
+LLM_BACKEND = env('LLM_BACKEND', default='openai')
+# Fake backend: seconds per answer (spread over the chunks when streamed) and share of failed calls (HTTP 503)
+LLM_FAKE_LATENCY_SECONDS = env.float('LLM_FAKE_LATENCY_SECONDS', default=1.0)
+LLM_FAKE_FAILURE_RATE = env.float('LLM_FAKE_FAILURE_RATE', default=0.0)
+# Answers saved by the record backend and served by the replay backend, one JSON file per request
+LLM_RECORDINGS_DIR = env('LLM_RECORDINGS_DIR', default=str(BASE_DIR / 'llm_recordings'))
+# One pooled HTTP client is shared by all requests of a process
+# Seconds to establish a connection
+OPENAI_CONNECT_TIMEOUT = env.float('OPENAI_CONNECT_TIMEOUT', default=10.0)
+# Max seconds without receiving data from OpenAI (a full completion can take longer)
+OPENAI_READ_TIMEOUT = env.float('OPENAI_READ_TIMEOUT', default=120.0)
+# Max open connections per process, and how long idle connections are kept alive
+OPENAI_MAX_CONNECTIONS = env.int('OPENAI_MAX_CONNECTIONS', default=20)
+OPENAI_KEEPALIVE_SECONDS = env.float('OPENAI_KEEPALIVE_SECONDS', default=60.0)
+# Max open connections per event loop of the async client (ASGI), which holds many streams at once
+OPENAI_ASYNC_MAX_CONNECTIONS = env.int('OPENAI_ASYNC_MAX_CONNECTIONS', default=500)
+# Retries on connection errors, timeouts, 429 and 5xx responses, with jittered exponential backoff
+OPENAI_MAX_RETRIES = env.int('OPENAI_MAX_RETRIES', default=4)
+OPENAI_RETRY_BASE_SECONDS = env.float('OPENAI_RETRY_BASE_SECONDS', default=1.0)
+OPENAI_RETRY_MAX_SECONDS = env.float('OPENAI_RETRY_MAX_SECONDS', default=30.0)
+# Requests and tokens per minute allowed by the OpenAI account, shared by all processes
+# (calls over budget wait in line); 0 disables the limiter
+OPENAI_RPM_LIMIT = env.int('OPENAI_RPM_LIMIT', default=500)
+OPENAI_TPM_LIMIT = env.int('OPENAI_TPM_LIMIT', default=200000)
+# Max seconds between two checks of a waiting call
+OPENAI_RATE_LIMIT_POLL_SECONDS = env.float('OPENAI_RATE_LIMIT_POLL_SECONDS', default=1.0)
+
+# Answers: JSON schema enforced by the API (models with structured outputs, gpt-4o-2024-08-06 and later)
+OPENAI_STRUCTURED_OUTPUT = env.bool('OPENAI_STRUCTURED_OUTPUT', default=True)
+# Calls made again when an answer cannot be repaired locally
+OPENAI_INVALID_RESPONSE_RETRIES = env.int('OPENAI_INVALID_RESPONSE_RETRIES', default=1)
+
+# OpenAI response cache (CachedCompletion table), bypassed by `force` generations
+LLM_CACHE_ENABLED = env.bool('LLM_CACHE_ENABLED', default=True)
+# Cached completions are used for this long after they were received
+LLM_CACHE_TTL_HOURS = env.int('LLM_CACHE_TTL_HOURS', default=24 * 30)
+# Size budget of the cache, least recently used completions are evicted above it
+LLM_CACHE_MAX_BYTES = env.int('LLM_CACHE_MAX_BYTES', default=100 * 1024 ** 2)
+
+# Process metrics (GET /api/metrics/, staff only)
+# Metrics of processes that stopped publishing for this long are dropped
+METRICS_RETENTION_HOURS = env.int('METRICS_RETENTION_HOURS', default=24)
 
 # System prompt: defines role, style and output format
 OPENAI_SYSTEM_PROMPT = """You are an expert instructional designer specialized in creating concise, high-impact tutorials from conversation transcripts.
@@ -217,9 +311,9 @@ Your response must be a single valid JSON object **with no markdown fences** and
 - **steps** (array of objects), each containing:
     • **index** (integer): step number, starting at 1  
     • **text** (string): clear, rephrased instruction  
-    • **timestamp** (float): the phrase’s `offset_milliseconds` **converted to seconds**  
+    • **timestamp** (float): the start time in seconds of the related phrase, copied from the transcript  
     • **video_clip** (object, optional):  
-        – **start** (float): clip start in seconds (phrase `offset_milliseconds` converted to seconds)  
+        – **start** (float): clip start in seconds (start time of the related phrase)  
         – **end**   (float): clip end in seconds (5 to 25 seconds maximum after start of related phrases)  
       *(omit this field if no visual action is relevant)*  
 - **tips** (array of strings): optional clarifications or tips.  
@@ -231,13 +325,13 @@ Your response must be a single valid JSON object **with no markdown fences** and
 - Title must be imperative, <= 7 words; no causes or extra detail.  
 - Select steps by semantic relevance, not mere keywords.  
 - Include `video_clip` only for tangible, visual actions (e.g., plug, blow, turn). If not relevant, omit it.  
-- **Always convert all `offset_milliseconds` values to seconds** for `timestamp`, `video_clip.start`, and `video_clip.end`.  
+- **All times are in seconds**: copy phrase start times from the transcript as they are for `timestamp` and `video_clip.start`.  
 - NEVER include markdown formatting (no ```json). Respond with raw JSON only.  
 - Do not hallucinate or add commentary.
 """
 
 # User prompt : transcript injection and JSON format return
-OPENAI_USER_PROMPT_TEMPLATE = """Here is a conversation transcript (each phrase has `offset_milliseconds` and `display`).
+OPENAI_USER_PROMPT_TEMPLATE = """Here is a conversation transcript, one phrase per line as `<start time in seconds>|<text>`.
 
 Using the system instructions, generate a JSON tutorial that:
 - Yields a **specific, outcome-focused title**.
@@ -245,5 +339,106 @@ Using the system instructions, generate a JSON tutorial that:
 - Includes **video_clip** intervals only for the most representative, visible actions.
 
 Transcript:
-{transcript_json}
+{transcript}
 """
+
+# Long transcripts: map-reduce generation
+# Transcripts whose tutorial prompt is larger than this are split into time windows
+OPENAI_MAP_REDUCE_THRESHOLD_TOKENS = env.int('OPENAI_MAP_REDUCE_THRESHOLD_TOKENS', default=24000)
+# Transcript tokens per window, not counting the overlap
+OPENAI_WINDOW_TOKENS = env.int('OPENAI_WINDOW_TOKENS', default=8000)
+# Seconds of transcript repeated before and after each window as context
+OPENAI_WINDOW_OVERLAP_SECONDS = env.float('OPENAI_WINDOW_OVERLAP_SECONDS', default=30.0)
+# Windows sent to OpenAI at the same time
+OPENAI_MAP_WORKERS = env.int('OPENAI_MAP_WORKERS', default=4)
+
+# Map step: candidate steps of one window
+OPENAI_MAP_SYSTEM_PROMPT = """You are an expert instructional designer. You receive one part of a long conversation transcript and extract the reproducible steps it contains; other parts are handled separately and merged afterwards.
+
+Your response must be a single valid JSON object **with no markdown fences** with exactly one key:
+
+- **steps** (array of objects), each containing:
+    • **text** (string): clear, rephrased imperative instruction  
+    • **timestamp** (float): the start time in seconds of the related phrase, copied from the transcript  
+    • **video_clip** (object, optional): **start** and **end** in seconds (start time of the related phrase, end 5 to 25 seconds later)  
+      *(only for tangible, visual actions; omit it otherwise)*  
+
+**Strict instructions:**
+- Only return steps whose timestamp is inside the requested range; lines outside it are context only.
+- Select steps by semantic relevance and skip small talk. Return an empty `steps` array if the part has none.
+- NEVER include markdown formatting. Respond with raw JSON only. Do not hallucinate.
+"""
+
+OPENAI_MAP_USER_PROMPT_TEMPLATE = """Here is part of a conversation transcript, one phrase per line as `<start time in seconds>|<text>`.
+
+Extract the steps whose timestamp is between {start} and {end} seconds.
+
+Transcript:
+{transcript}
+"""
+
+# Reduce step: tutorial text around the merged steps
+OPENAI_REDUCE_SYSTEM_PROMPT = """You are an expert instructional designer. You receive the ordered steps of a tutorial extracted from a long conversation transcript, and write the text around them.
+
+Your response must be a single valid JSON object **with no markdown fences** and exactly these keys:
+
+- **title** (string): a short, imperative tutorial title (<= 7 words, start with a verb, no causes or extra detail).
+- **introduction** (string): 1–2 sentences of context and objective.
+- **tips** (array of strings): optional clarifications or tips.
+- **summary** (string): 1–2 sentence wrap-up of achieved outcome.
+- **duration_estimate** (string): estimated completion time (e.g. “5 minutes”).
+- **tags** (array[string]): up to 5 relevant keywords.
+
+NEVER include markdown formatting. Respond with raw JSON only. Do not hallucinate or add commentary.
+"""
+
+OPENAI_REDUCE_USER_PROMPT_TEMPLATE = """Here are the tutorial steps, one per line as `<step number>|<text>`.
+
+{steps}
+"""
+
+# Section regeneration: one step, the tips, the summary, or the title and tags
+# Seconds of transcript sent on each side of a regenerated step (and after each step for tips)
+OPENAI_SECTION_WINDOW_SECONDS = env.float('OPENAI_SECTION_WINDOW_SECONDS', default=60.0)
+
+OPENAI_SECTION_SYSTEM_PROMPT = """You are an expert instructional designer. You receive a tutorial generated from a conversation transcript and rewrite one part of it; the rest of the tutorial stays as it is.
+
+The author rejected the current version of that part: write a better one, consistent with the rest of the tutorial and without repeating other steps.
+
+Your response must be a single valid JSON object **with no markdown fences** holding only the keys asked for.
+**All times are in seconds**: copy phrase start times from the transcript as they are.
+NEVER include markdown formatting. Respond with raw JSON only. Do not hallucinate or add commentary.
+"""
+
+OPENAI_SECTION_USER_PROMPT_TEMPLATE = """Here is the current tutorial, as JSON:
+{tutorial}
+
+{instructions}
+"""
+
+# Appended to the user prompt when the section is written from the transcript
+OPENAI_SECTION_TRANSCRIPT_TEMPLATE = """
+Transcript, one phrase per line as `<start time in seconds>|<text>`:
+{transcript}
+"""
+
+# What to rewrite, per section
+OPENAI_SECTION_INSTRUCTIONS = {
+    'step': """Rewrite step {index}. Respond with exactly one key:
+
+- **step** (object), containing:
+    • **text** (string): clear, rephrased imperative instruction  
+    • **timestamp** (float): the start time in seconds of the related phrase, copied from the transcript, between {start} and {end}  
+    • **video_clip** (object, optional): **start** and **end** in seconds (start time of the related phrase, end 5 to 25 seconds later)  
+      *(only for a tangible, visual action; omit it otherwise)*""",
+    'tips': """Rewrite the tips, using what the transcript says around each step. Respond with exactly one key:
+
+- **tips** (array of strings): optional clarifications or tips.""",
+    'summary': """Rewrite the summary. Respond with exactly one key:
+
+- **summary** (string): 1–2 sentence wrap-up of achieved outcome.""",
+    'title': """Rewrite the title and the tags. Respond with exactly these keys:
+
+- **title** (string): a short, imperative tutorial title (<= 7 words, start with a verb, no causes or extra detail).
+- **tags** (array[string]): up to 5 relevant keywords.""",
+}
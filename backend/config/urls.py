@@ -19,15 +19,18 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
-from tutorials.views import auth_status, logout_view, TranscriptViewSet, TutorialViewSet
+from tutorials.views import auth_status, logout_view, metrics_view, TranscriptViewSet, TutorialViewSet, GenerationJobViewSet, VideoUploadViewSet
 
 router = DefaultRouter()
 router.register(r'transcripts', TranscriptViewSet, basename='transcript')
 router.register(r'tutorials', TutorialViewSet, basename='tutorial')
+router.register(r'jobs', GenerationJobViewSet, basename='job')
+router.register(r'uploads', VideoUploadViewSet, basename='upload')
 
 urlpatterns = [
     path("auth/", include('social_django.urls', namespace='social')),
     path("api/auth/status/", auth_status, name='api_auth_status'),  # API endpoint
+    path("api/metrics/", metrics_view, name='api_metrics'),
     path("logout/", logout_view, name='logout'),
     path("api/", include(router.urls)),
     path("", auth_status, name='auth_status'),  # Page d'accueil pour test legacy
@@ -0,0 +1,118 @@
+"""
+Database cache of OpenAI chat completions.
+
+Completions are keyed by a hash of every request parameter: model,
+messages (system prompt and the user template filled with the phrases) and
+sampling parameters, so any change to the prompt or the transcript misses.
+Entries expire after LLM_CACHE_TTL_HOURS, and least recently used entries
+are evicted when the cache exceeds LLM_CACHE_MAX_BYTES.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Optional
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import CachedCompletion
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(params: Dict[str, Any]) -> str:
+    """Hash chat completion request parameters into a cache key."""
+    canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def lookup(key: str) -> Optional[str]:
+    """
+    Return the cached completion content for `key` and mark it as recently used.
+
+    Returns:
+        Completion content, or None if not cached or expired
+    """
+    entry = (
+        CachedCompletion.objects
+        .filter(key=key, created_at__gte=_expiry())
+        .values_list('pk', 'content')
+        .first()
+    )
+    if entry is None:
+        return None
+
+    pk, content = entry
+    CachedCompletion.objects.filter(pk=pk).update(last_used_at=timezone.now(), hits=F('hits') + 1)
+    return content
+
+
+def store(key: str, params: Dict[str, Any], content: str, usage: Any = None) -> None:
+    """
+    Cache a completion, then evict expired and least recently used entries.
+
+    The cache is best effort: a failed write is logged and the completion
+    is still returned to the caller.
+
+    Args:
+        key: Cache key from `make_key`
+        params: Request parameters the completion answers
+        content: Completion message content
+        usage: Token usage of the response, if reported
+    """
+    now = timezone.now()
+    try:
+        CachedCompletion.objects.update_or_create(
+            key=key,
+            defaults={
+                'model': str(params.get('model', ''))[:100],
+                'content': content,
+                'size_bytes': len(content.encode()),
+                'prompt_tokens': getattr(usage, 'prompt_tokens', None) or 0,
+                'completion_tokens': getattr(usage, 'completion_tokens', None) or 0,
+                'created_at': now,
+                'last_used_at': now,
+            },
+        )
+    except IntegrityError:
+        # Same completion stored concurrently by another worker: keep theirs
+        pass
+    except DatabaseError as e:
+        logger.warning(f"Could not cache completion {key[:12]}: {e}")
+        return
+
+    try:
+        evict()
+    except DatabaseError as e:
+        logger.warning(f"Could not evict cached completions: {e}")
+
+
+def evict() -> int:
+    """
+    Delete expired entries, then least recently used ones until the cache fits LLM_CACHE_MAX_BYTES.
+
+    Returns:
+        Number of deleted entries
+    """
+    evicted, _ = CachedCompletion.objects.filter(created_at__lt=_expiry()).delete()
+
+    budget = settings.LLM_CACHE_MAX_BYTES
+    total = CachedCompletion.objects.aggregate(total=Sum('size_bytes'))['total'] or 0
+    if total > budget:
+        doomed = []
+        for pk, size_bytes in CachedCompletion.objects.order_by('last_used_at').values_list('pk', 'size_bytes').iterator():
+            if total <= budget:
+                break
+            total -= size_bytes
+            doomed.append(pk)
+        evicted += CachedCompletion.objects.filter(pk__in=doomed).delete()[0]
+
+    if evicted:
+        logger.info(f"Evicted {evicted} completions from the OpenAI response cache")
+    return evicted
+
+
+def _expiry():
+    """Creation time before which entries are expired."""
+    return timezone.now() - timedelta(hours=settings.LLM_CACHE_TTL_HOURS)
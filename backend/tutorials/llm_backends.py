@@ -0,0 +1,360 @@
+"""
+Chat completion backends.
+
+Every chat completion goes through the backend selected by LLM_BACKEND:
+
+- `openai`: the OpenAI API
+- `fake`: deterministic tutorials built from the transcript lines of the
+  prompt, answered after LLM_FAKE_LATENCY_SECONDS, with a share of
+  LLM_FAKE_FAILURE_RATE failed calls; no key or network needed
+- `record`: the OpenAI API, saving every answer to LLM_RECORDINGS_DIR
+- `replay`: answers saved by `record`, without network
+
+Backends return OpenAI SDK objects (a ChatCompletion, or chunks when
+`stream` is set), so retries, caching and parsing in `openai_client` work
+the same with all of them.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import httpx
+from openai import InternalServerError
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from . import completion_cache
+from .prompt_builder import count_tokens
+
+# `<seconds>|<text>` transcript lines, and `<number>|<text>` step lines
+PROMPT_LINE_PATTERN = re.compile(r'^(\d+(?:\.\d+)?)\|(.+)$', re.MULTILINE)
+
+# Most steps in a fake tutorial
+FAKE_MAX_STEPS = 8
+
+# Characters per chunk of fake and replayed streams
+STREAM_CHUNK_CHARS = 40
+
+
+class RecordingNotFound(LookupError):
+    """Raised by the replay backend for a request that was never recorded."""
+
+
+class LLMBackend(ABC):
+    """
+    Base class of chat completion backends.
+
+    `create` and `acreate` take the arguments of
+    `client.chat.completions.create` and return what it returns: a
+    ChatCompletion, or a stream of ChatCompletionChunk with a `close()`
+    method when `stream` is set.
+    """
+
+    @abstractmethod
+    def create(self, params: Dict[str, Any]) -> Any:
+        """Answer a chat completion request."""
+
+    @abstractmethod
+    async def acreate(self, params: Dict[str, Any]) -> Any:
+        """Async version of `create`."""
+
+
+class OpenAIBackend(LLMBackend):
+    """The OpenAI API, through the pooled clients of `openai_client`."""
+
+    def create(self, params: Dict[str, Any]) -> Any:
+        from .openai_client import get_client
+
+        return get_client().chat.completions.create(**params)
+
+    async def acreate(self, params: Dict[str, Any]) -> Any:
+        from .openai_client import get_async_client
+
+        return await get_async_client().chat.completions.create(**params)
+
+
+class FakeBackend(LLMBackend):
+    """
+    Local stand-in answering like the model would, from the prompt alone.
+
+    Steps are taken from the transcript lines of the prompt, so clip
+    ranges point into the real transcript, and the same prompt always
+    gets the same answer. Failures are HTTP 503 errors, retried like
+    those of the API.
+    """
+
+    def create(self, params: Dict[str, Any]) -> Any:
+        self._maybe_fail()
+        content = json.dumps(fake_answer(params['messages']))
+        usage = _fake_usage(params, content)
+        if params.get('stream'):
+            chunks = _build_chunks(params, content, 'stop', usage)
+            return ChunkStream(chunks, settings.LLM_FAKE_LATENCY_SECONDS / max(len(chunks), 1))
+        time.sleep(settings.LLM_FAKE_LATENCY_SECONDS)
+        return _build_completion(params, content, 'stop', usage)
+
+    async def acreate(self, params: Dict[str, Any]) -> Any:
+        self._maybe_fail()
+        content = json.dumps(fake_answer(params['messages']))
+        usage = _fake_usage(params, content)
+        if params.get('stream'):
+            chunks = _build_chunks(params, content, 'stop', usage)
+            return AsyncChunkStream(chunks, settings.LLM_FAKE_LATENCY_SECONDS / max(len(chunks), 1))
+        await asyncio.sleep(settings.LLM_FAKE_LATENCY_SECONDS)
+        return _build_completion(params, content, 'stop', usage)
+
+    @staticmethod
+    def _maybe_fail() -> None:
+        if random.random() < settings.LLM_FAKE_FAILURE_RATE:
+            request = httpx.Request('POST', 'http://fake-llm/v1/chat/completions')
+            raise InternalServerError(
+                "Fake backend failure",
+                response=httpx.Response(503, request=request),
+                body=None,
+            )
+
+
+class RecordingBackend(OpenAIBackend):
+    """
+    The OpenAI API, saving each answer for the replay backend.
+
+    Streams are read to their end and saved before being handed over, so
+    recording does not stream.
+    """
+
+    def create(self, params: Dict[str, Any]) -> Any:
+        response = super().create(params)
+        if params.get('stream'):
+            return self._record_stream(params, list(response))
+        self._save(params, response.choices[0].message.content, response.choices[0].finish_reason, response.usage)
+        return response
+
+    async def acreate(self, params: Dict[str, Any]) -> Any:
+        response = await super().acreate(params)
+        if params.get('stream'):
+            return AsyncChunkStream(self._record_stream(params, [chunk async for chunk in response]).chunks)
+        self._save(params, response.choices[0].message.content, response.choices[0].finish_reason, response.usage)
+        return response
+
+    def _record_stream(self, params: Dict[str, Any], chunks: List[Any]) -> 'ChunkStream':
+        parts = []
+        finish_reason = None
+        usage = None
+        for chunk in chunks:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if chunk.choices:
+                parts.append(chunk.choices[0].delta.content or "")
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+        self._save(params, "".join(parts), finish_reason, usage)
+        return ChunkStream(chunks)
+
+    @staticmethod
+    def _save(params: Dict[str, Any], content: str, finish_reason: Optional[str], usage: Any) -> None:
+        os.makedirs(settings.LLM_RECORDINGS_DIR, exist_ok=True)
+        recording = {
+            'params': _request_params(params),
+            'content': content,
+            'finish_reason': finish_reason,
+            'usage': usage.model_dump() if usage is not None else None,
+        }
+        # Written aside then renamed, so that a replay never reads half a file
+        handle, temporary = tempfile.mkstemp(dir=settings.LLM_RECORDINGS_DIR, suffix='.tmp')
+        with os.fdopen(handle, 'w') as file:
+            json.dump(recording, file, ensure_ascii=False, indent=1)
+        os.replace(temporary, recording_path(params))
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Answers saved by the recording backend, streamed or not.
+
+    A recording answers the same request whether it is streamed or not.
+    """
+
+    def create(self, params: Dict[str, Any]) -> Any:
+        content, finish_reason, usage = self._load(params)
+        if params.get('stream'):
+            return ChunkStream(_build_chunks(params, content, finish_reason, usage))
+        return _build_completion(params, content, finish_reason, usage)
+
+    async def acreate(self, params: Dict[str, Any]) -> Any:
+        content, finish_reason, usage = self._load(params)
+        if params.get('stream'):
+            return AsyncChunkStream(_build_chunks(params, content, finish_reason, usage))
+        return _build_completion(params, content, finish_reason, usage)
+
+    @staticmethod
+    def _load(params: Dict[str, Any]) -> Tuple[str, str, Optional[Dict[str, int]]]:
+        path = recording_path(params)
+        try:
+            with open(path) as file:
+                recording = json.load(file)
+        except FileNotFoundError:
+            raise RecordingNotFound(f"No recorded answer for this request ({os.path.basename(path)})")
+        return recording['content'], recording['finish_reason'] or 'stop', recording['usage']
+
+
+class ChunkStream:
+    """Completion chunks served as a stream, `delay` seconds apart."""
+
+    def __init__(self, chunks: List[Any], delay: float = 0.0):
+        self.chunks = chunks
+        self.delay = delay
+
+    def __iter__(self) -> Iterator[Any]:
+        for chunk in self.chunks:
+            if self.delay:
+                time.sleep(self.delay)
+            yield chunk
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncChunkStream(ChunkStream):
+    """Async version of ChunkStream."""
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        for chunk in self.chunks:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield chunk
+
+    async def close(self) -> None:
+        pass
+
+
+BACKENDS = {
+    'openai': OpenAIBackend,
+    'fake': FakeBackend,
+    'record': RecordingBackend,
+    'replay': ReplayBackend,
+}
+
+
+def get_backend() -> LLMBackend:
+    """Return the chat completion backend selected by LLM_BACKEND."""
+    try:
+        return BACKENDS[settings.LLM_BACKEND]()
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Unknown LLM_BACKEND {settings.LLM_BACKEND!r}, expected one of {', '.join(BACKENDS)}"
+        )
+
+
+def recording_path(params: Dict[str, Any]) -> str:
+    """File holding the recorded answer of a request."""
+    return os.path.join(settings.LLM_RECORDINGS_DIR, f"{completion_cache.make_key(_request_params(params))}.json")
+
+
+def fake_answer(messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    """
+    Answer a tutorial, map, reduce or section prompt with a tutorial built from its lines.
+
+    Steps are spread evenly over the transcript lines, each one quoting
+    the phrase it starts at; every other step gets a 10 second clip.
+    """
+    system = messages[0]['content']
+    lines = [(seconds, " ".join(text.split())) for seconds, text in PROMPT_LINE_PATTERN.findall(messages[-1]['content'])]
+
+    if system == settings.OPENAI_REDUCE_SYSTEM_PROMPT:
+        # Lines are the merged steps
+        return _fake_tutorial_text([text for _, text in lines], len(lines))
+
+    if system == settings.OPENAI_SECTION_SYSTEM_PROMPT:
+        # Every section at once, the caller keeps the one it asked for; a step quotes the middle line
+        answer = _fake_tutorial_text([text for _, text in lines], len(lines))
+        answer['tips'] = [f"Listen to what is said at {seconds}s." for seconds, _ in lines[:3]]
+        if lines:
+            seconds, text = lines[len(lines) // 2]
+            answer['step'] = {
+                'text': f"Do as said at {seconds}s: {text[:120]}",
+                'timestamp': float(seconds),
+                'video_clip': {'start': float(seconds), 'end': float(seconds) + 10.0},
+            }
+        return answer
+
+    steps = []
+    stride = -(-len(lines) // FAKE_MAX_STEPS) if lines else 1
+    for position in range(0, len(lines), stride):
+        seconds, text = lines[position]
+        step = {
+            'index': len(steps) + 1,
+            'text': f"Do as said at {seconds}s: {text[:120]}",
+            'timestamp': float(seconds),
+        }
+        if len(steps) % 2 == 0:
+            step['video_clip'] = {'start': float(seconds), 'end': float(seconds) + 10.0}
+        steps.append(step)
+
+    if system == settings.OPENAI_MAP_SYSTEM_PROMPT:
+        return {'steps': [{key: value for key, value in step.items() if key != 'index'} for step in steps]}
+    return {**_fake_tutorial_text([text for _, text in lines], len(steps)), 'steps': steps}
+
+
+def _fake_tutorial_text(texts: List[str], step_count: int) -> Dict[str, Any]:
+    """Title, introduction and other tutorial fields around `step_count` steps."""
+    words = [word.strip('.,!?;:"\'()').lower() for text in texts for word in text.split()]
+    tags = [word for word, _ in Counter(word for word in words if len(word) >= 5).most_common(5)]
+    first_words = texts[0].split()[:5] if texts else ["the", "transcript"]
+    return {
+        'title': "Follow " + " ".join(first_words),
+        'introduction': f"Generated locally from {len(texts)} lines, without a language model.",
+        'tips': ["This tutorial was produced by the fake LLM backend."],
+        'summary': f"{step_count} steps taken from the transcript.",
+        'duration_estimate': f"{max(step_count, 1) * 2} minutes",
+        'tags': tags,
+    }
+
+
+def _request_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Request parameters without the streaming options, which do not change the answer."""
+    return {key: value for key, value in params.items() if key not in ('stream', 'stream_options')}
+
+
+def _fake_usage(params: Dict[str, Any], content: str) -> Dict[str, int]:
+    model = params.get('model')
+    prompt_tokens = sum(count_tokens(message['content'], model) for message in params['messages'])
+    completion_tokens = count_tokens(content, model)
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens}
+
+
+def _build_completion(params: Dict[str, Any], content: str, finish_reason: str, usage: Optional[Dict[str, int]]) -> ChatCompletion:
+    return ChatCompletion.model_validate({
+        'id': 'chatcmpl-local',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': params.get('model', ''),
+        'choices': [{
+            'index': 0,
+            'finish_reason': finish_reason,
+            'message': {'role': 'assistant', 'content': content},
+        }],
+        'usage': usage,
+    })
+
+
+def _build_chunks(params: Dict[str, Any], content: str, finish_reason: str, usage: Optional[Dict[str, int]]) -> List[ChatCompletionChunk]:
+    pieces = [content[start:start + STREAM_CHUNK_CHARS] for start in range(0, len(content), STREAM_CHUNK_CHARS)] or [""]
+    base = {'id': 'chatcmpl-local', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': params.get('model', '')}
+    chunks = [
+        ChatCompletionChunk.model_validate({
+            **base,
+            'choices': [{
+                'index': 0,
+                'delta': {'content': piece},
+                'finish_reason': finish_reason if number == len(pieces) - 1 else None,
+            }],
+        })
+        for number, piece in enumerate(pieces)
+    ]
+    if usage is not None and (params.get('stream_options') or {}).get('include_usage'):
+        chunks.append(ChatCompletionChunk.model_validate({**base, 'choices': [], 'usage': usage}))
+    return chunks
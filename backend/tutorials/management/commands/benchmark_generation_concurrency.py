@@ -0,0 +1,240 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from tutorials.models import Transcript
+
+# Server setups to compare: gunicorn arguments of one worker process
+SERVERS = {
+    'sync': ['config.wsgi:application', '--worker-class', 'sync'],
+    'gthread': ['config.wsgi:application', '--worker-class', 'gthread', '--threads', '8'],
+    'asgi': ['config.asgi:application', '--worker-class', 'uvicorn_worker.UvicornWorker'],
+}
+
+# Tutorial streamed by the stub OpenAI server
+STUB_TUTORIAL = {
+    'title': "Load test",
+    'introduction': "Generated by the stub OpenAI server.",
+    'steps': [{'index': index, 'text': f"Step {index}", 'timestamp': float(index)} for index in range(1, 6)],
+    'tips': [],
+    'summary': "Done.",
+    'duration_estimate': "1 minute",
+    'tags': ["load-test"],
+}
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    """Streams STUB_TUTORIAL as chat completion chunks spread over `server.latency` seconds."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['content-length']))
+        self.server.enter()
+        try:
+            content = json.dumps(STUB_TUTORIAL)
+            pieces = [content[start:start + 40] for start in range(0, len(content), 40)]
+
+            self.send_response(200)
+            self.send_header('content-type', 'text/event-stream')
+            self.end_headers()
+            for number, piece in enumerate(pieces, 1):
+                time.sleep(self.server.latency / len(pieces))
+                chunk = {
+                    'id': 'stub', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'stub',
+                    'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': 'stop' if number == len(pieces) else None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+        finally:
+            self.server.leave()
+
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    """Stub chat completions API recording how many requests it serves at once."""
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency: float):
+        super().__init__(('127.0.0.1', 0), StubOpenAIHandler)
+        self.latency = latency
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def enter(self):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def leave(self):
+        with self.lock:
+            self.active -= 1
+
+
+class Command(BaseCommand):
+    """
+    Compare how many streamed generations one web worker process holds at once.
+
+    A stub OpenAI server streams each completion over `--latency` seconds.
+    For each server setup, one gunicorn worker is started and `--requests`
+    concurrent requests are sent to the streaming generate endpoint. The
+    peak number of completions the stub served at once is the concurrency
+    of the worker; with the stub latency it bounds the throughput.
+    """
+    help = "Load test streamed tutorial generation under WSGI and ASGI workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Concurrent generation requests per setup")
+        parser.add_argument('--latency', type=float, default=2.0, help="Seconds the stub takes to stream a completion")
+        parser.add_argument(
+            '--servers',
+            nargs='+',
+            choices=list(SERVERS),
+            default=list(SERVERS),
+            help="Server setups to measure",
+        )
+
+    def handle(self, *args, **options):
+        stub = StubOpenAIServer(options['latency'])
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+        user = get_user_model().objects.create(username=f"loadtest-{uuid.uuid4().hex[:8]}")
+        transcript = Transcript(
+            user=user,
+            timestamp='2024-01-01T00:00:00Z',
+            duration_in_ticks=60 * 10_000_000,
+            filename='loadtest.json',
+            fingerprint=uuid.uuid4().hex,
+        )
+        transcript.phrases = [
+            {'offset_milliseconds': index * 1000, 'duration_milliseconds': 900, 'display': f"Phrase {index}."}
+            for index in range(60)
+        ]
+        transcript.save()
+        session = _create_session(user)
+
+        self.stdout.write(
+            f"{options['requests']} requests, completions streamed in {options['latency']:.1f}s, one worker process"
+        )
+        self.stdout.write(f"{'server':>8} {'ok':>5} {'failed':>6} {'seconds':>8} {'req/s':>7} {'p50':>7} {'p95':>7} {'in flight':>9}")
+
+        try:
+            for name in options['servers']:
+                stub.peak = 0
+                port = _free_port()
+                server = _start_server(name, port, f"http://127.0.0.1:{stub.server_port}/v1")
+                try:
+                    _wait_until_listening(port, server)
+                    url = f"http://127.0.0.1:{port}/api/transcripts/{transcript.id}/generate/stream/"
+                    results, elapsed = asyncio.run(_load(url, session.session_key, options['requests']))
+                finally:
+                    server.terminate()
+                    server.wait(timeout=30)
+
+                durations = sorted(seconds for ok, seconds in results if ok)
+                failed = len(results) - len(durations)
+                self.stdout.write(
+                    f"{name:>8} {len(durations):>5} {failed:>6} {elapsed:>8.1f} {len(durations) / elapsed:>7.1f} "
+                    f"{_percentile(durations, 0.5):>7.1f} {_percentile(durations, 0.95):>7.1f} {stub.peak:>9}"
+                )
+        finally:
+            session.delete()
+            user.delete()
+            stub.shutdown()
+
+
+async def _load(url: str, session_key: str, count: int):
+    """
+    Send `count` concurrent streaming requests and read each stream to its end.
+
+    Returns:
+        Tuple of ([(succeeded, seconds)] per request, total seconds)
+    """
+    limits = httpx.Limits(max_connections=count, max_keepalive_connections=0)
+    timeout = httpx.Timeout(600.0, connect=60.0)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout, cookies={settings.SESSION_COOKIE_NAME: session_key}) as client:
+
+        async def generate():
+            started = time.perf_counter()
+            try:
+                async with client.stream('GET', url, headers={'Host': 'localhost'}) as response:
+                    body = b"".join([part async for part in response.aiter_bytes()])
+                ok = response.status_code == 200 and b"event: tutorial" in body
+            except httpx.HTTPError:
+                ok = False
+            return ok, time.perf_counter() - started
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(generate() for _ in range(count)))
+        return results, time.perf_counter() - started
+
+
+def _create_session(user) -> SessionStore:
+    """Open a logged-in session for `user`, as the login view would."""
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return session
+
+
+def _start_server(name: str, port: int, openai_base_url: str) -> subprocess.Popen:
+    """Start one gunicorn worker of setup `name`, using the stub OpenAI server."""
+    env = {
+        **os.environ,
+        'OPENAI_BASE_URL': openai_base_url,
+        'OPENAI_API_KEY': settings.OPENAI_API_KEY or 'stub',
+        # Every request must reach the stub
+        'LLM_CACHE_ENABLED': 'False',
+    }
+    command = [
+        sys.executable, '-m', 'gunicorn', *SERVERS[name],
+        '--bind', f"127.0.0.1:{port}",
+        '--workers', '1',
+        '--backlog', '2048',
+        '--timeout', '600',
+        '--log-level', 'warning',
+    ]
+    return subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+
+
+def _wait_until_listening(port: int, server: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise CommandError(f"Server exited with code {server.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"Server did not listen on port {port} within {timeout:.0f}s")
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def _percentile(values, quantile: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(quantile * len(values)))]
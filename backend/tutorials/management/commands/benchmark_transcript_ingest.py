@@ -0,0 +1,131 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+# Words used to build synthetic phrase texts
+WORDS = "click the settings button then open the advanced tab and select video quality".split()
+
+
+def measure_ingest(mode: str, path: str):
+    """
+    Ingest a transcript file and report elapsed time and peak memory.
+
+    Runs in a fresh process so that peak RSS only reflects this ingest.
+
+    Returns:
+        Tuple of (seconds, peak RSS growth in bytes, phrase count)
+    """
+    from tutorials.serializers import TranscriptSerializer
+    from tutorials.services.transcript_service import TranscriptService
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+
+    with open(path, 'rb') as handle:
+        if mode == 'load':
+            # Previous implementation: whole file, parsed tree and serializer copy in memory
+            raw_data = handle.read()
+            transcript_data = json.loads(raw_data)
+            hashlib.sha256(raw_data).hexdigest()
+            serializer = TranscriptSerializer(data=transcript_data)
+            serializer.is_valid(raise_exception=True)
+            phrases = serializer.validated_data['phrases']
+        else:
+            uploaded = File(handle, name=path)
+            TranscriptService.compute_fingerprint(uploaded)
+            transcript_data = TranscriptService.read_transcript_file(uploaded)
+            phrases = transcript_data.pop('phrases')
+            serializer = TranscriptSerializer(data={**transcript_data, 'phrases': []})
+            serializer.is_valid(raise_exception=True)
+
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in kilobytes on Linux
+    peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) * 1024
+    return elapsed, peak, len(phrases)
+
+
+def write_transcript(path: str, phrase_count: int) -> None:
+    """Write a synthetic transcript with `phrase_count` phrases, one phrase at a time."""
+    rng = random.Random(phrase_count)
+
+    with open(path, 'w') as handle:
+        handle.write(json.dumps({
+            'timestamp': '2024-01-01T00:00:00Z',
+            'duration_in_ticks': phrase_count * 3 * 10_000_000,
+        })[:-1])
+        handle.write(', "phrases": [')
+
+        for index in range(phrase_count):
+            if index:
+                handle.write(', ')
+            handle.write(json.dumps({
+                'offset_milliseconds': index * 3000,
+                'duration_milliseconds': 2800,
+                'display': " ".join(rng.choices(WORDS, k=12)).capitalize() + ".",
+                'locale': 'en-US',
+                'confidence': round(rng.uniform(0.7, 1.0), 3),
+                'speaker': index % 2,
+            }))
+
+        handle.write(']}')
+
+
+class Command(BaseCommand):
+    """
+    Compare memory use of transcript ingestion against file size.
+
+    Each measurement runs in its own process. `load` is the previous
+    read-everything implementation, `stream` the incremental parser.
+    """
+    help = "Measure peak memory of transcript ingestion for growing file sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--phrases',
+            type=int,
+            nargs='+',
+            default=[10_000, 50_000, 200_000],
+            help="Phrase counts of the generated transcripts",
+        )
+        parser.add_argument(
+            '--modes',
+            nargs='+',
+            choices=['load', 'stream'],
+            default=['load', 'stream'],
+            help="Ingest implementations to measure",
+        )
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('spawn')
+        self.stdout.write(f"{'phrases':>10} {'file MB':>9} {'mode':>7} {'seconds':>8} {'peak MB':>8} {'x file':>7}")
+
+        with tempfile.TemporaryDirectory() as directory:
+            for phrase_count in options['phrases']:
+                path = os.path.join(directory, f"transcript_{phrase_count}.json")
+                write_transcript(path, phrase_count)
+                size = os.path.getsize(path)
+
+                for mode in options['modes']:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_setup_django) as pool:
+                        elapsed, peak, parsed = pool.submit(measure_ingest, mode, path).result()
+
+                    assert parsed == phrase_count
+                    self.stdout.write(
+                        f"{phrase_count:>10} {size / 2**20:>9.1f} {mode:>7} {elapsed:>8.2f} "
+                        f"{peak / 2**20:>8.1f} {peak / size:>7.2f}"
+                    )
+
+                os.remove(path)
+
+
+def _setup_django():
+    import django
+    django.setup()
@@ -0,0 +1,50 @@
+import itertools
+import os
+import zipfile
+from contextlib import ExitStack
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from tutorials.services import BulkImportService
+
+
+class Command(BaseCommand):
+    """
+    Import transcripts from local files for one user.
+
+    Each path can be a directory (every *.json file below it), a ZIP
+    archive of JSON files or an NDJSON file with one transcript per line.
+    """
+    help = "Bulk import transcripts from directories, ZIP archives or NDJSON files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="Directories, .zip or .ndjson files to import")
+        parser.add_argument('--user', required=True, help="Username owning the imported transcripts")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Unknown user {options['user']}")
+
+        with ExitStack() as stack:
+            sources = []
+            for path in options['paths']:
+                if os.path.isdir(path):
+                    sources.append(BulkImportService.iter_directory(path))
+                elif zipfile.is_zipfile(path):
+                    archive = stack.enter_context(zipfile.ZipFile(path))
+                    sources.append(BulkImportService.iter_zip(archive))
+                elif os.path.isfile(path):
+                    stream = stack.enter_context(open(path, 'rb'))
+                    sources.append(BulkImportService.iter_ndjson(stream))
+                else:
+                    raise CommandError(f"{path} not found")
+
+            results = BulkImportService.import_items(user, itertools.chain(*sources))
+
+        for result in results:
+            detail = result.get('id') or result.get('error') or result.get('duplicate_of', '')
+            self.stdout.write(f"{result['status']:<10} {result['name']}  {detail}")
+
+        summary = ", ".join(f"{count} {status}" for status, count in BulkImportService.summarize(results).items())
+        self.stdout.write(self.style.SUCCESS(f"Imported {len(results)} items: {summary}"))
@@ -0,0 +1,64 @@
+import logging
+import os
+import signal
+import socket
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from tutorials import metrics
+from tutorials.services import GenerationJobService
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Worker process for the tutorial generation queue.
+
+    Claims queued GenerationJob rows one at a time and runs them. Start as
+    many workers as needed; they coordinate through the database only.
+    """
+    help = "Run queued tutorial generation jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Process the jobs currently queued, then exit",
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.GENERATION_JOB_POLL_SECONDS,
+            help="Seconds to wait between polls when the queue is empty",
+        )
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.stdout.write(f"Generation worker {worker} started")
+
+        while not self._stopping:
+            close_old_connections()
+            GenerationJobService.requeue_stale()
+
+            job = GenerationJobService.claim_next(worker)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            logger.info(f"Worker {worker} running generation job {job.id}")
+            GenerationJobService.run(job)
+            metrics.flush()
+
+        self.stdout.write(f"Generation worker {worker} stopped")
+
+    def _stop(self, signum, frame):
+        """Finish the current job, then exit."""
+        self._stopping = True
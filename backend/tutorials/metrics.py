@@ -0,0 +1,166 @@
+"""
+Process metrics: counters and latency histograms.
+
+Each process records into memory, which costs a lock and a few additions
+per event. Processes publish their totals to the ProcessMetrics table with
+`flush()` (generation workers after every job), and `collect()` merges the
+published rows, so the metrics endpoint also sees work done by the workers.
+Histograms use fixed buckets so that rows from several processes can be
+added together.
+"""
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Iterator, List
+from django.conf import settings
+from django.utils import timezone
+
+# Upper bounds (seconds) of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_histograms: Dict[str, Dict[str, Any]] = {}
+
+
+def increment(name: str, value: float = 1) -> None:
+    """Add `value` to a counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record a duration in a latency histogram."""
+    bucket = bisect_left(LATENCY_BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = _empty_histogram()
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+        histogram['max'] = max(histogram['max'], seconds)
+        histogram['buckets'][bucket] += 1
+
+
+@contextmanager
+def timer(name: str) -> Iterator[None]:
+    """Record the duration of the block in a latency histogram, even if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+def snapshot() -> Dict[str, Any]:
+    """Return a copy of the metrics recorded by this process."""
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'histograms': {
+                name: {**histogram, 'buckets': list(histogram['buckets'])}
+                for name, histogram in _histograms.items()
+            },
+        }
+
+
+def reset() -> None:
+    """Forget the metrics recorded by this process."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def flush() -> None:
+    """
+    Publish the metrics of this process to the database.
+
+    Rows of processes that stopped publishing more than
+    METRICS_RETENTION_HOURS ago are deleted.
+    """
+    from .models import ProcessMetrics
+
+    ProcessMetrics.objects.update_or_create(process=process_name(), defaults={'data': snapshot()})
+    ProcessMetrics.objects.filter(
+        updated_at__lt=timezone.now() - timedelta(hours=settings.METRICS_RETENTION_HOURS)
+    ).delete()
+
+
+def collect() -> Dict[str, Any]:
+    """
+    Publish the metrics of this process and merge those of all processes.
+
+    Returns:
+        Dict with the number of processes, summed counters and histograms;
+        histograms also get their average and estimated p50, p95 and p99
+    """
+    from .models import ProcessMetrics
+
+    flush()
+    rows = list(ProcessMetrics.objects.values_list('data', flat=True))
+    merged = merge(rows)
+
+    for histogram in merged['histograms'].values():
+        histogram['avg'] = histogram['sum'] / histogram['count'] if histogram['count'] else 0.0
+        for quantile in (0.5, 0.95, 0.99):
+            histogram[f"p{round(quantile * 100)}"] = _estimate_quantile(histogram, quantile)
+        histogram['buckets'] = dict(zip([*map(str, LATENCY_BUCKETS), 'inf'], histogram['buckets']))
+
+    return {'processes': len(rows), **merged}
+
+
+def merge(snapshots: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Add up metric snapshots of several processes."""
+    counters: Dict[str, float] = {}
+    histograms: Dict[str, Dict[str, Any]] = {}
+
+    for data in snapshots:
+        for name, value in data.get('counters', {}).items():
+            counters[name] = counters.get(name, 0) + value
+        for name, histogram in data.get('histograms', {}).items():
+            if len(histogram['buckets']) != len(LATENCY_BUCKETS) + 1:
+                # Published with other bucket bounds
+                continue
+            total = histograms.setdefault(name, _empty_histogram())
+            total['count'] += histogram['count']
+            total['sum'] += histogram['sum']
+            total['max'] = max(total['max'], histogram['max'])
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+
+    return {'counters': counters, 'histograms': histograms}
+
+
+def process_name() -> str:
+    """Identifier of this process in the ProcessMetrics table."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _empty_histogram() -> Dict[str, Any]:
+    return {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * (len(LATENCY_BUCKETS) + 1)}
+
+
+def _estimate_quantile(histogram: Dict[str, Any], quantile: float) -> float:
+    """Upper bound of the bucket holding the quantile, capped by the largest value seen."""
+    buckets: List[int] = histogram['buckets']
+    rank = quantile * histogram['count']
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS, buckets):
+        seen += count
+        if count and seen >= rank:
+            return min(bound, histogram['max'])
+    return histogram['max']
+
+
+def _reset_after_fork() -> None:
+    """Start a forked child with empty metrics and a lock no other thread can hold."""
+    global _lock
+    _lock = threading.Lock()
+    _counters.clear()
+    _histograms.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tutorials", "0003_alter_tutorial_tips"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CachedClip",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        help_text="Content address of the clip",
+                        max_length=64,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "source_sha256",
+                    models.CharField(
+                        db_index=True,
+                        help_text="SHA-256 hash of the source video",
+                        max_length=64,
+                    ),
+                ),
+                ("start", models.FloatField(help_text="Clip start in seconds")),
+                ("end", models.FloatField(help_text="Clip end in seconds")),
+                (
+                    "profile",
+                    models.CharField(
+                        help_text="Extraction profile used to produce this clip",
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "path",
+                    models.CharField(
+                        help_text="Clip file path relative to MEDIA_ROOT",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "size_bytes",
+                    models.BigIntegerField(help_text="Clip file size in bytes"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text="When this clip was added to the store",
+                    ),
+                ),
+                (
+                    "last_used_at",
+                    models.DateTimeField(
+                        db_index=True, help_text="When this clip was last used"
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["last_used_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="transcript",
+            name="video_sha256",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="SHA-256 hash of the video file content, used as clip cache key",
+                max_length=64,
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tutorials", "0005_generation_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transcript",
+            name="video_info",
+            field=models.JSONField(
+                blank=True,
+                help_text="Video duration, codecs, resolution, frame rate and keyframe timestamps",
+                null=True,
+            ),
+        ),
+    ]
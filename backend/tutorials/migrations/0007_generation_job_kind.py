@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tutorials", "0006_transcript_video_info"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="generationjob",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("generate", "Generate tutorial"),
+                    ("reclip", "Re-extract edited clips"),
+                ],
+                default="generate",
+                help_text="Type of work done by this job",
+                max_length=20,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="generationjob",
+            name="tutorial",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Tutorial produced or updated by this job",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="generation_jobs",
+                to="tutorials.tutorial",
+            ),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tutorials", "0007_generation_job_kind"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VideoUpload",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        help_text="Unique identifier for this upload",
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "filename",
+                    models.CharField(
+                        help_text="Original filename of the uploaded video",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "size",
+                    models.BigIntegerField(help_text="Expected total size in bytes"),
+                ),
+                (
+                    "offset",
+                    models.BigIntegerField(
+                        default=0, help_text="Number of bytes received and committed"
+                    ),
+                ),
+                (
+                    "sha256",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="SHA-256 hash of the complete file",
+                        max_length=64,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("uploading", "Uploading"), ("complete", "Complete")],
+                        default="uploading",
+                        help_text="Current state of the upload",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, help_text="When this upload was started"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, help_text="When the last chunk was received"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        help_text="User who started this upload",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="video_uploads",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
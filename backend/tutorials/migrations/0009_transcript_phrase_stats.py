@@ -0,0 +1,68 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:53
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def fill_phrase_stats(apps, schema_editor):
+    """Compute phrase statistics of existing transcripts."""
+    Transcript = apps.get_model("tutorials", "Transcript")
+
+    for transcript in Transcript.objects.only("pk", "phrases").iterator(chunk_size=100):
+        phrases = [
+            phrase for phrase in transcript.phrases or [] if isinstance(phrase, dict)
+        ]
+        locales = Counter(
+            phrase["locale"] for phrase in phrases if phrase.get("locale")
+        )
+        confidences = [
+            phrase["confidence"]
+            for phrase in phrases
+            if isinstance(phrase.get("confidence"), (int, float))
+        ]
+
+        Transcript.objects.filter(pk=transcript.pk).update(
+            phrase_count=len(transcript.phrases or []),
+            language=locales.most_common(1)[0][0][:35] if locales else "",
+            average_confidence=(
+                sum(confidences) / len(confidences) if confidences else None
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tutorials", "0008_video_upload"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transcript",
+            name="average_confidence",
+            field=models.FloatField(
+                blank=True,
+                help_text="Mean recognition confidence of the phrases that report one",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="transcript",
+            name="language",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Most common phrase locale (e.g. en-US), empty if phrases have none",
+                max_length=35,
+            ),
+        ),
+        migrations.AddField(
+            model_name="transcript",
+            name="phrase_count",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Number of phrases in this transcript"
+            ),
+        ),
+        migrations.RunPython(fill_phrase_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:55
+
+import json
+import math
+import sys
+import zlib
+from array import array
+
+from django.db import migrations, models
+
+# Storage format as of this migration, copied from tutorials.phrase_storage so
+# that later changes to the app code don't change what this migration does
+
+PHRASE_OFFSET_KEYS = ("offset_milliseconds", "offsetMilliseconds")
+PHRASE_DURATION_KEYS = ("duration_milliseconds", "durationMilliseconds")
+COLUMN_TYPECODE = "d"
+
+
+def get_timing(phrase, keys, default):
+    """Return the first numeric timing found under `keys`, or `default`."""
+    if isinstance(phrase, dict):
+        for key in keys:
+            value = phrase.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return float(value)
+    return default
+
+
+def pack_column(column):
+    """Pack a column as little-endian bytes."""
+    if sys.byteorder == "big":
+        column = array(COLUMN_TYPECODE, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def encode_phrases(phrases):
+    """Encode phrases into (compressed phrase JSON, packed offsets, packed durations)."""
+    data = zlib.compress(
+        json.dumps(phrases, ensure_ascii=False, separators=(",", ":")).encode()
+    )
+    offsets = array(
+        COLUMN_TYPECODE,
+        (get_timing(phrase, PHRASE_OFFSET_KEYS, math.nan) for phrase in phrases),
+    )
+    durations = array(
+        COLUMN_TYPECODE,
+        (get_timing(phrase, PHRASE_DURATION_KEYS, 0.0) for phrase in phrases),
+    )
+    return data, pack_column(offsets), pack_column(durations)
+
+
+def decode_phrases(data):
+    """Decode the compressed phrase JSON column."""
+    if not data:
+        return []
+    return json.loads(zlib.decompress(data))
+
+
+def encode_existing_phrases(apps, schema_editor):
+    """Move phrases of existing transcripts to the compact columns."""
+    Transcript = apps.get_model("tutorials", "Transcript")
+
+    for transcript in Transcript.objects.only("pk", "phrases").iterator(chunk_size=100):
+        data, offsets, durations = encode_phrases(transcript.phrases or [])
+        Transcript.objects.filter(pk=transcript.pk).update(
+            phrase_data=data, phrase_offsets=offsets, phrase_durations=durations
+        )
+
+
+def decode_existing_phrases(apps, schema_editor):
+    """Restore the phrases JSON column from the compact columns."""
+    Transcript = apps.get_model("tutorials", "Transcript")
+
+    for transcript in Transcript.objects.only("pk", "phrase_data").iterator(
+        chunk_size=100
+    ):
+        Transcript.objects.filter(pk=transcript.pk).update(
+            phrases=decode_phrases(transcript.phrase_data)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tutorials", "0009_transcript_phrase_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transcript",
+            name="phrase_data",
+            field=models.BinaryField(
+                default=b"", help_text="Phrase objects as zlib-compressed JSON"
+            ),
+        ),
+        migrations.AddField(
+            model_name="transcript",
+            name="phrase_durations",
+            field=models.BinaryField(
+                default=b"",
+                help_text="Phrase durations in milliseconds (little-endian float64 array)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="transcript",
+            name="phrase_offsets",
+            field=models.BinaryField(
+                default=b"",
+                help_text="Phrase start offsets in milliseconds (little-endian float64 array)",
+            ),
+        ),
+        # Nullable first so that unapplying can re-add the column before filling it
+        migrations.AlterField(
+            model_name="transcript",
+            name="phrases",
+            field=models.JSONField(
+                null=True,
+                help_text="Array of conversation phrases with text, timestamps, and metadata",
+            ),
+        ),
+        migrations.RunPython(encode_existing_phrases, decode_existing_phrases),
+        migrations.RemoveField(
+            model_name="transcript",
+            name="phrases",
+        ),
+    ]
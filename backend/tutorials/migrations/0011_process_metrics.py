@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tutorials", "0010_compact_phrase_storage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProcessMetrics",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "process",
+                    models.CharField(
+                        help_text="Host and process id of the publishing process",
+                        max_length=255,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "data",
+                    models.JSONField(
+                        default=dict,
+                        help_text="Metrics recorded by the process since it started",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True,
+                        db_index=True,
+                        help_text="When the process last published its metrics",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "process metrics",
+                "ordering": ["process"],
+            },
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tutorials", "0011_process_metrics"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CachedCompletion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        help_text="Hash of the request parameters",
+                        max_length=64,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "model",
+                    models.CharField(
+                        help_text="Model that produced the completion", max_length=100
+                    ),
+                ),
+                (
+                    "content",
+                    models.TextField(help_text="Completion returned by OpenAI"),
+                ),
+                (
+                    "size_bytes",
+                    models.PositiveIntegerField(help_text="Completion size in bytes"),
+                ),
+                (
+                    "prompt_tokens",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Prompt tokens of the original request"
+                    ),
+                ),
+                (
+                    "completion_tokens",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Completion tokens of the original request"
+                    ),
+                ),
+                (
+                    "hits",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Number of times this completion was reused",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        db_index=True,
+                        help_text="When this completion was received from OpenAI",
+                    ),
+                ),
+                (
+                    "last_used_at",
+                    models.DateTimeField(
+                        db_index=True, help_text="When this completion was last used"
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["last_used_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="generationjob",
+            name="force",
+            field=models.BooleanField(
+                default=False, help_text="Regenerate even if a cached completion exists"
+            ),
+        ),
+    ]
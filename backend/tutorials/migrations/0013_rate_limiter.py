@@ -0,0 +1,87 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tutorials", "0012_completion_cache"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RateLimitBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        help_text="Upstream API the budgets apply to",
+                        max_length=50,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "requests",
+                    models.FloatField(default=0, help_text="Requests available"),
+                ),
+                ("tokens", models.FloatField(default=0, help_text="Tokens available")),
+                (
+                    "refilled_at",
+                    models.DateTimeField(
+                        help_text="When the budgets were last refilled"
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="RateLimitTicket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "bucket",
+                    models.CharField(
+                        db_index=True,
+                        help_text="Name of the bucket the call waits for",
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "tokens",
+                    models.PositiveIntegerField(help_text="Tokens the call will use"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, help_text="When the call started waiting"
+                    ),
+                ),
+                (
+                    "heartbeat_at",
+                    models.DateTimeField(
+                        help_text="When the waiting process last polled"
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["id"],
+            },
+        ),
+    ]
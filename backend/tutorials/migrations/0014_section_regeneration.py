@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tutorials", "0013_rate_limiter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="generationjob",
+            name="section",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("step", "One step"),
+                    ("tips", "Tips"),
+                    ("summary", "Summary"),
+                    ("title", "Title and tags"),
+                ],
+                default="",
+                help_text="Tutorial section rewritten by a regenerate job",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="generationjob",
+            name="step_index",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Index of the step rewritten by a regenerate job",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="generationjob",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("generate", "Generate tutorial"),
+                    ("reclip", "Re-extract edited clips"),
+                    ("regenerate", "Regenerate tutorial section"),
+                ],
+                default="generate",
+                help_text="Type of work done by this job",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tutorials", "0014_section_regeneration"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tutorial",
+            name="generation_model",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Language model that generated this tutorial",
+                max_length=100,
+            ),
+        ),
+        migrations.AddField(
+            model_name="tutorial",
+            name="generation_seconds",
+            field=models.FloatField(
+                blank=True,
+                help_text="Seconds taken by the language model to generate this tutorial",
+                null=True,
+            ),
+        ),
+    ]
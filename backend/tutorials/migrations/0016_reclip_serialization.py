@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tutorials", "0015_tutorial_generation_info"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="generationjob",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("kind", "reclip"), ("status", "running")),
+                fields=("tutorial",),
+                name="one_running_reclip_per_tutorial",
+            ),
+        ),
+    ]
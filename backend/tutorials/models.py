@@ -1,6 +1,8 @@
 import uuid
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from .phrase_index import get_index
+from .phrase_storage import decode_column, decode_phrases, encode_phrases
 
 
 class User(AbstractUser):
@@ -70,6 +72,21 @@ class Transcript(models.Model):
         help_text="Optional video file associated with this transcript for asset extraction"
     )
     
+    # SHA-256 hash of the video file content, computed on first clip extraction
+    video_sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        help_text="SHA-256 hash of the video file content, used as clip cache key"
+    )
+    
+    # Video probe done at upload: duration, codecs, resolution, fps and keyframe index
+    video_info = models.JSONField(
+        blank=True,
+        null=True,
+        help_text="Video duration, codecs, resolution, frame rate and keyframe timestamps"
+    )
+    
     # Timestamp from the transcript data (when conversation occurred)
     timestamp = models.DateTimeField(
         help_text="When the original conversation took place"
@@ -80,9 +97,39 @@ class Transcript(models.Model):
         help_text="Duration of conversation in system ticks (10,000,000 ticks = 1 second)"
     )
     
-    # JSON field containing all conversation phrases/segments
-    phrases = models.JSONField(
-        help_text="Array of conversation phrases with text, timestamps, and metadata"
+    # Conversation phrases/segments in compact form, exposed through the `phrases` property
+    phrase_data = models.BinaryField(
+        default=b"",
+        help_text="Phrase objects as zlib-compressed JSON"
+    )
+    
+    phrase_offsets = models.BinaryField(
+        default=b"",
+        help_text="Phrase start offsets in milliseconds (little-endian float64 array)"
+    )
+    
+    phrase_durations = models.BinaryField(
+        default=b"",
+        help_text="Phrase durations in milliseconds (little-endian float64 array)"
+    )
+    
+    # Phrase statistics stored at upload so lists don't have to load `phrases`
+    phrase_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of phrases in this transcript"
+    )
+    
+    language = models.CharField(
+        max_length=35,
+        blank=True,
+        default="",
+        help_text="Most common phrase locale (e.g. en-US), empty if phrases have none"
+    )
+    
+    average_confidence = models.FloatField(
+        blank=True,
+        null=True,
+        help_text="Mean recognition confidence of the phrases that report one"
     )
     
     # SHA-256 hash of transcript content to prevent duplicates
@@ -98,6 +145,12 @@ class Transcript(models.Model):
         help_text="When this transcript was uploaded"
     )
 
+    # Columns holding the phrases, to defer in queries that don't need them
+    PHRASE_FIELDS = ('phrase_data', 'phrase_offsets', 'phrase_durations')
+
+    # Decoded phrases, filled on first access
+    _phrases = None
+
     class Meta:
         # Ensure one user can't upload the same transcript twice
         unique_together = [('user', 'fingerprint')]
@@ -106,19 +159,62 @@ class Transcript(models.Model):
     def __str__(self):
         return f"Transcript: {self.filename} - {self.user.username}"
 
+    @property
+    def phrases(self):
+        """Array of conversation phrases with text, timestamps, and metadata"""
+        if self._phrases is None:
+            self._phrases = decode_phrases(self.phrase_data)
+        return self._phrases
+
+    @phrases.setter
+    def phrases(self, phrases):
+        self.phrase_data, self.phrase_offsets, self.phrase_durations = encode_phrases(phrases)
+        self._phrases = phrases
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._phrases = None
+
+    def get_phrase_offsets(self):
+        """Phrase start offsets in milliseconds, without decoding the phrases"""
+        return decode_column(self.phrase_offsets)
+
+    def get_phrase_durations(self):
+        """Phrase durations in milliseconds, without decoding the phrases"""
+        return decode_column(self.phrase_durations)
+
+    def get_phrase_index(self):
+        """Interval index over phrase timings, cached per process by fingerprint"""
+        return get_index(self.fingerprint, lambda: (self.get_phrase_offsets(), self.get_phrase_durations()))
+
+    def phrases_between(self, start, end):
+        """Phrases overlapping [start, end] (seconds), in start order"""
+        positions = self.get_phrase_index().between(_to_milliseconds(start), _to_milliseconds(end))
+        return [self.phrases[position] for position in positions]
+
+    def nearest_phrase(self, time):
+        """Phrase spoken at `time` (seconds), or the closest one; None without timed phrases"""
+        position = self.get_phrase_index().nearest(_to_milliseconds(time))
+        return None if position is None else self.phrases[position]
+
     def get_duration_seconds(self):
         """Convert ticks to seconds for easier display"""
         return self.duration_in_ticks / 10_000_000
 
     def get_phrase_count(self):
         """Get total number of phrases in this transcript"""
-        return len(self.phrases) if self.phrases else 0
+        return self.phrase_count
     
     def has_video(self):
         """Check if this transcript has an associated video file"""
         return bool(self.video_file)
 
 
+def _to_milliseconds(seconds):
+    """Convert seconds to milliseconds without float error (3.332 s -> 3332.0, not 3331.9999999999995)"""
+    return round(seconds * 1000, 6)
+
+
 class Tutorial(models.Model):
     """
     Model representing an AI-generated tutorial from a transcript
@@ -187,6 +283,21 @@ class Tutorial(models.Model):
         help_text="Array of relevant tags/keywords for this tutorial"
     )
     
+    # Model that wrote the tutorial, after routing and escalation
+    generation_model = models.CharField(
+        max_length=100,
+        blank=True,
+        default="",
+        help_text="Language model that generated this tutorial"
+    )
+    
+    # Time spent generating the text (clip extraction not included)
+    generation_seconds = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Seconds taken by the language model to generate this tutorial"
+    )
+    
     # When this tutorial was last modified
     updated_at = models.DateTimeField(
         auto_now=True,
@@ -206,3 +317,445 @@ class Tutorial(models.Model):
     def get_step_count(self):
         """Get number of steps in this tutorial"""
         return len(self.steps) if self.steps else 0
+
+
+class CachedClip(models.Model):
+    """
+    Model representing a video clip stored in the content-addressed clip store
+    
+    Clips are keyed by the source video hash, the clip range and the encoding
+    profile, so identical clips are encoded once and shared across tutorials
+    through hard links. Least recently used entries are evicted when the store
+    exceeds its disk budget.
+    """
+    # SHA-256 of (source hash, start, end, profile)
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text="Content address of the clip"
+    )
+    
+    # SHA-256 of the source video file
+    source_sha256 = models.CharField(
+        max_length=64,
+        db_index=True,
+        help_text="SHA-256 hash of the source video"
+    )
+    
+    # Clip range in seconds
+    start = models.FloatField(help_text="Clip start in seconds")
+    end = models.FloatField(help_text="Clip end in seconds")
+    
+    # Encoding profile the clip was produced with (e.g. "reencode:aac")
+    profile = models.CharField(
+        max_length=100,
+        help_text="Extraction profile used to produce this clip"
+    )
+    
+    # Path of the clip relative to MEDIA_ROOT
+    path = models.CharField(
+        max_length=255,
+        help_text="Clip file path relative to MEDIA_ROOT"
+    )
+    
+    # Clip file size used for the disk budget
+    size_bytes = models.BigIntegerField(help_text="Clip file size in bytes")
+    
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="When this clip was added to the store"
+    )
+    
+    # Updated on every cache hit, drives LRU eviction
+    last_used_at = models.DateTimeField(
+        db_index=True,
+        help_text="When this clip was last used"
+    )
+    
+    class Meta:
+        ordering = ['last_used_at']  # Least recently used first
+    
+    def __str__(self):
+        return f"CachedClip: {self.start}s-{self.end}s ({self.profile}) of {self.source_sha256[:12]}"
+
+
+class CachedCompletion(models.Model):
+    """
+    Model representing a cached OpenAI chat completion
+    
+    Keyed by a hash of the full request (model, prompts, transcript phrases
+    and sampling parameters), so regenerating a tutorial from an unchanged
+    transcript returns the stored answer instead of calling OpenAI again.
+    Entries expire after a TTL and least recently used entries are evicted
+    above the cache size budget.
+    """
+    # SHA-256 of the canonical request parameters
+    key = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text="Hash of the request parameters"
+    )
+    
+    model = models.CharField(
+        max_length=100,
+        help_text="Model that produced the completion"
+    )
+    
+    # Message content of the completion
+    content = models.TextField(help_text="Completion returned by OpenAI")
+    
+    # Content size used for the cache budget
+    size_bytes = models.PositiveIntegerField(help_text="Completion size in bytes")
+    
+    # Token usage of the original request, i.e. what each hit saves
+    prompt_tokens = models.PositiveIntegerField(default=0, help_text="Prompt tokens of the original request")
+    completion_tokens = models.PositiveIntegerField(default=0, help_text="Completion tokens of the original request")
+    
+    hits = models.PositiveIntegerField(default=0, help_text="Number of times this completion was reused")
+    
+    # Drives TTL expiry
+    created_at = models.DateTimeField(
+        db_index=True,
+        help_text="When this completion was received from OpenAI"
+    )
+    
+    # Updated on every cache hit, drives LRU eviction
+    last_used_at = models.DateTimeField(
+        db_index=True,
+        help_text="When this completion was last used"
+    )
+    
+    class Meta:
+        ordering = ['last_used_at']  # Least recently used first
+    
+    def __str__(self):
+        return f"CachedCompletion: {self.key[:12]} ({self.model})"
+
+
+class GenerationJob(models.Model):
+    """
+    Model representing a queued tutorial generation, clip re-extraction or
+    section regeneration
+    
+    Generation (OpenAI call + clip extraction), re-extraction of clips
+    after a tutorial edit and regeneration of one tutorial section run in separate worker
+    processes (`manage.py run_generation_worker`) that claim jobs from this
+    table, so the API only enqueues work and clients poll the job status.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    KIND_GENERATE = 'generate'
+    KIND_RECLIP = 'reclip'
+    KIND_REGENERATE = 'regenerate'
+    KIND_CHOICES = [
+        (KIND_GENERATE, 'Generate tutorial'),
+        (KIND_RECLIP, 'Re-extract edited clips'),
+        (KIND_REGENERATE, 'Regenerate tutorial section'),
+    ]
+    
+    SECTION_STEP = 'step'
+    SECTION_TIPS = 'tips'
+    SECTION_SUMMARY = 'summary'
+    SECTION_TITLE = 'title'
+    SECTION_CHOICES = [
+        (SECTION_STEP, 'One step'),
+        (SECTION_TIPS, 'Tips'),
+        (SECTION_SUMMARY, 'Summary'),
+        (SECTION_TITLE, 'Title and tags'),
+    ]
+    
+    # Primary key as UUID, returned to clients for polling
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+        help_text="Unique identifier for this job"
+    )
+    
+    # Transcript the tutorial is generated from
+    transcript = models.ForeignKey(
+        Transcript,
+        on_delete=models.CASCADE,
+        related_name="generation_jobs",
+        help_text="Source transcript of the generation"
+    )
+    
+    # Tutorial produced by the job (set on success), or edited tutorial for reclip and regenerate jobs
+    tutorial = models.ForeignKey(
+        Tutorial,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="generation_jobs",
+        help_text="Tutorial produced or updated by this job"
+    )
+    
+    # What the job does: full generation, clip reconciliation after an edit or section regeneration
+    kind = models.CharField(
+        max_length=20,
+        choices=KIND_CHOICES,
+        default=KIND_GENERATE,
+        help_text="Type of work done by this job"
+    )
+    
+    # Section rewritten by regenerate jobs
+    section = models.CharField(
+        max_length=20,
+        choices=SECTION_CHOICES,
+        blank=True,
+        default="",
+        help_text="Tutorial section rewritten by a regenerate job"
+    )
+    
+    # Index of the rewritten step, for step regeneration
+    step_index = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Index of the step rewritten by a regenerate job"
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_QUEUED,
+        db_index=True,
+        help_text="Current state of the job"
+    )
+    
+    # Error message when the job failed
+    error = models.TextField(
+        blank=True,
+        default="",
+        help_text="Error message if the job failed"
+    )
+    
+    # Number of times a worker picked this job up
+    attempts = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of times this job was started"
+    )
+    
+    # Skip the OpenAI response cache and request a fresh completion
+    force = models.BooleanField(
+        default=False,
+        help_text="Regenerate even if a cached completion exists"
+    )
+    
+    # Worker currently (or last) running this job
+    worker = models.CharField(
+        max_length=100,
+        blank=True,
+        default="",
+        help_text="Identifier of the worker running this job"
+    )
+    
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="When this job was queued"
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When a worker started this job"
+    )
+    
+    # Refreshed periodically while running, used to detect dead workers
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Last sign of life from the worker running this job"
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When this job succeeded or failed"
+    )
+    
+    class Meta:
+        ordering = ['-created_at']  # Most recent first
+        constraints = [
+            # Clip re-extractions of one tutorial write the same files: one at a time
+            models.UniqueConstraint(
+                fields=['tutorial'],
+                condition=models.Q(kind='reclip', status='running'),
+                name='one_running_reclip_per_tutorial',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"GenerationJob: {self.id} ({self.status}) - {self.transcript_id}"
+
+
+class VideoUpload(models.Model):
+    """
+    Model representing a chunked, resumable video upload
+    
+    Chunks are appended to a partial file on disk and hashed as they arrive.
+    `offset` is the number of bytes committed so far: an interrupted upload
+    resumes from there. Once complete, the file is moved (not copied) to the
+    transcript it is attached to.
+    """
+    STATUS_UPLOADING = 'uploading'
+    STATUS_COMPLETE = 'complete'
+    STATUS_CHOICES = [
+        (STATUS_UPLOADING, 'Uploading'),
+        (STATUS_COMPLETE, 'Complete'),
+    ]
+    
+    # Primary key as UUID, used by the client for every chunk
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+        help_text="Unique identifier for this upload"
+    )
+    
+    # User uploading the file
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="video_uploads",
+        help_text="User who started this upload"
+    )
+    
+    # Original filename of the video
+    filename = models.CharField(
+        max_length=255,
+        help_text="Original filename of the uploaded video"
+    )
+    
+    # Total size announced by the client
+    size = models.BigIntegerField(help_text="Expected total size in bytes")
+    
+    # Bytes committed to disk so far
+    offset = models.BigIntegerField(
+        default=0,
+        help_text="Number of bytes received and committed"
+    )
+    
+    # SHA-256 of the whole file, set when the upload is finalized
+    sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        help_text="SHA-256 hash of the complete file"
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_UPLOADING,
+        help_text="Current state of the upload"
+    )
+    
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="When this upload was started"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        help_text="When the last chunk was received"
+    )
+    
+    class Meta:
+        ordering = ['-created_at']  # Most recent first
+    
+    def __str__(self):
+        return f"VideoUpload: {self.filename} ({self.offset}/{self.size}) - {self.user.username}"
+
+
+class ProcessMetrics(models.Model):
+    """
+    Model holding the latest metrics published by one process
+    
+    Web and worker processes record counters and latency histograms in
+    memory (`tutorials.metrics`) and publish them here, so that the metrics
+    endpoint can add up the totals of every process.
+    """
+    # "<hostname>:<pid>" of the publishing process
+    process = models.CharField(
+        max_length=255,
+        unique=True,
+        help_text="Host and process id of the publishing process"
+    )
+    
+    # Counters and histograms as returned by metrics.snapshot()
+    data = models.JSONField(
+        default=dict,
+        help_text="Metrics recorded by the process since it started"
+    )
+    
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        help_text="When the process last published its metrics"
+    )
+    
+    class Meta:
+        ordering = ['process']
+        verbose_name_plural = "process metrics"
+    
+    def __str__(self):
+        return f"ProcessMetrics: {self.process}"
+
+
+class RateLimitBucket(models.Model):
+    """
+    Model holding the shared request and token budgets of an upstream API
+    
+    Every process takes from the same row (locked while it is updated), so
+    the requests and tokens per minute limits hold across all web and
+    worker processes. Budgets refill continuously up to one minute's worth.
+    """
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        help_text="Upstream API the budgets apply to"
+    )
+    
+    # Can go negative after a 429, to hold every process back for a while
+    requests = models.FloatField(default=0, help_text="Requests available")
+    tokens = models.FloatField(default=0, help_text="Tokens available")
+    
+    refilled_at = models.DateTimeField(help_text="When the budgets were last refilled")
+    
+    def __str__(self):
+        return f"RateLimitBucket: {self.name} ({self.requests:.0f} requests, {self.tokens:.0f} tokens)"
+
+
+class RateLimitTicket(models.Model):
+    """
+    Model representing a call waiting for rate limit budget
+    
+    Waiting calls are admitted in ticket order: a call may only take from
+    the bucket if what is left covers the older tickets. Tickets of processes that stopped polling
+    are dropped so that they do not block the queue.
+    """
+    bucket = models.CharField(
+        max_length=50,
+        db_index=True,
+        help_text="Name of the bucket the call waits for"
+    )
+    
+    # Estimated cost: prompt tokens plus max_tokens, as counted by OpenAI
+    tokens = models.PositiveIntegerField(help_text="Tokens the call will use")
+    
+    created_at = models.DateTimeField(auto_now_add=True, help_text="When the call started waiting")
+    
+    # Refreshed while the process polls
+    heartbeat_at = models.DateTimeField(help_text="When the waiting process last polled")
+    
+    class Meta:
+        ordering = ['id']  # Admission order
+    
+    def __str__(self):
+        return f"RateLimitTicket: {self.id} for {self.bucket} ({self.tokens} tokens)"
@@ -1,54 +1,1059 @@
-from openai import OpenAI
+import asyncio
 import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import httpx
+from asgiref.sync import sync_to_async
+from openai import AsyncOpenAI, OpenAI, APIConnectionError, APIStatusError
 from django.conf import settings
+from django.db import connections
+from . import completion_cache, metrics, rate_limiter
+from .llm_backends import get_backend
+from .prompt_builder import (
+    build_map_messages,
+    build_reduce_messages,
+    build_section_messages,
+    build_tutorial_messages,
+    conversation_seconds,
+    count_tokens,
+    split_windows,
+)
+from .streaming_json import END, FIELD, ITEM, Event, StreamingObjectParser
+from .structured_output import (
+    MAP_SCHEMA,
+    MAX_TAGS,
+    REDUCE_SCHEMA,
+    SECTION_SCHEMAS,
+    TUTORIAL_SCHEMA,
+    parse_json,
+    repair_step,
+    response_format,
+    validate_tutorial,
+)
 
+logger = logging.getLogger(__name__)
 
-def generate_tutorial_from_transcript(phrases: list) -> dict:
+# Completion tokens of a single-pass tutorial written by LLM_MODEL
+TUTORIAL_MAX_TOKENS = 4096
+
+# (RESTART, 'tutorial', model) in tutorial streams: drop what was streamed, `model` answers again
+RESTART = 'restart'
+
+# Client shared by all requests of this process, created on first use
+_client: Optional[OpenAI] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+# Async clients, one per event loop
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+
+class CompletionTruncated(ValueError):
+    """Raised when a completion stopped at `max_tokens` before its end."""
+
+
+def get_client() -> OpenAI:
+    """
+    Return the process-wide OpenAI client, creating it on first use.
+
+    The client keeps a pool of keep-alive connections, so consecutive
+    generations reuse an open TLS connection. A forked process gets its own
+    client: connections cannot be shared with the parent.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            timeout = httpx.Timeout(
+                settings.OPENAI_READ_TIMEOUT,
+                connect=settings.OPENAI_CONNECT_TIMEOUT,
+            )
+            http_client = httpx.Client(
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS,
+                    keepalive_expiry=settings.OPENAI_KEEPALIVE_SECONDS,
+                ),
+            )
+            # Retries are done by `create_chat_completion`, which records them
+            _client = OpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                http_client=http_client,
+                timeout=timeout,
+                max_retries=0,
+            )
+            _client_pid = os.getpid()
+        return _client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Return the async OpenAI client of the running event loop, creating it on first use.
+
+    Connections of an async client belong to the event loop that opened
+    them, so each loop (one per ASGI worker) gets its own client, with the
+    larger OPENAI_ASYNC_MAX_CONNECTIONS pool.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        timeout = httpx.Timeout(
+            settings.OPENAI_READ_TIMEOUT,
+            connect=settings.OPENAI_CONNECT_TIMEOUT,
+        )
+        http_client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_ASYNC_MAX_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_SECONDS,
+            ),
+        )
+        # Retries are done by `acreate_chat_completion`, which records them
+        client = _async_clients[loop] = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=http_client,
+            timeout=timeout,
+            max_retries=0,
+        )
+    return client
+
+
+def create_chat_completion(**params: Any) -> Any:
+    """
+    Call the chat completions API of the LLM_BACKEND backend, retrying transient failures.
+
+    Connection errors, timeouts, 429 and 5xx responses are retried up to
+    OPENAI_MAX_RETRIES times with jittered exponential backoff; a
+    `Retry-After` header sent by the API is honoured when it is shorter
+    than OPENAI_RETRY_MAX_SECONDS.
+
+    Each attempt first waits for its share of the rate limit budget shared
+    by all processes (see `rate_limiter`); a 429 holds every process back.
+
+    Recorded metrics:
+        openai.requests, openai.retries, openai.errors (counters),
+        openai.prompt_tokens, openai.completion_tokens (counters),
+        openai.request_seconds (latency of each attempt),
+        openai.call_seconds (latency including retries)
+
+    Args:
+        **params: Arguments of `client.chat.completions.create`
+
+    Returns:
+        Chat completion response
+    """
+    backend = get_backend()
+    tokens = _estimate_tokens(params)
+    started = time.perf_counter()
+    attempt = 0
+
+    while True:
+        rate_limiter.acquire(tokens)
+        attempt_started = time.perf_counter()
+        metrics.increment('openai.requests')
+        try:
+            response = backend.create(params)
+        except (APIConnectionError, APIStatusError) as e:
+            delay = _record_failure(e, attempt, started, attempt_started)
+            attempt += 1
+            if _is_rate_limited(e) and rate_limiter.enabled():
+                # Wait in the shared queue, with the calls of every other process
+                rate_limiter.hold_back(delay)
+                delay = 0
+            time.sleep(delay)
+            continue
+
+        _record_success(response, started, attempt_started)
+        return response
+
+
+async def acreate_chat_completion(**params: Any) -> Any:
+    """
+    Async version of `create_chat_completion`, on the client of the running event loop.
+
+    Waiting for OpenAI only holds a coroutine, so one ASGI process can keep
+    up to OPENAI_ASYNC_MAX_CONNECTIONS requests in flight. Retries and
+    metrics are the same as for `create_chat_completion`.
+    """
+    backend = get_backend()
+    tokens = _estimate_tokens(params)
+    started = time.perf_counter()
+    attempt = 0
+
+    while True:
+        await rate_limiter.aacquire(tokens)
+        attempt_started = time.perf_counter()
+        metrics.increment('openai.requests')
+        try:
+            response = await backend.acreate(params)
+        except (APIConnectionError, APIStatusError) as e:
+            delay = _record_failure(e, attempt, started, attempt_started)
+            attempt += 1
+            if _is_rate_limited(e) and rate_limiter.enabled():
+                # Wait in the shared queue, with the calls of every other process
+                await sync_to_async(rate_limiter.hold_back)(delay)
+                delay = 0
+            await asyncio.sleep(delay)
+            continue
+
+        _record_success(response, started, attempt_started)
+        return response
+
+
+def complete_json(
+    params: Dict[str, Any],
+    force: bool = False,
+    validate: Optional[Callable[[Any], Tuple[Any, List[str]]]] = None,
+    retries: Optional[int] = None
+) -> Any:
+    """
+    Return a chat completion parsed as JSON, from the response cache when possible.
+
+    Answers are repaired locally (`structured_output.parse_json`) and then
+    checked by `validate`; what was fixed is logged and counted in the
+    openai.repaired_responses metric. Only an answer that cannot be
+    repaired is asked for again, up to `retries` times (counted in
+    openai.invalid_responses).
+
+    Completions are cached only once they passed, with their syntax
+    repaired, so an invalid answer is never served again. Cache hits and
+    misses are logged and counted in the openai.cache_hits and
+    openai.cache_misses metrics; cache lookups are timed in
+    openai.cache_seconds.
+
+    Args:
+        params: Arguments of `client.chat.completions.create`
+        force: Skip the cache lookup and request a fresh completion (which
+            then replaces the cached one)
+        validate: Check of the parsed answer, returning the (possibly fixed)
+            answer and the list of fixes, raising ValueError if unusable
+        retries: Calls made again for unusable answers,
+            OPENAI_INVALID_RESPONSE_RETRIES by default
+
+    Raises:
+        CompletionTruncated: If the completion was cut at `max_tokens`
+        ValueError: If no answer could be repaired into valid JSON passing `validate`
+    """
+    use_cache = settings.LLM_CACHE_ENABLED
+    key = completion_cache.make_key(params) if use_cache else None
+
+    if use_cache and not force:
+        with metrics.timer('openai.cache_seconds'):
+            content = completion_cache.lookup(key)
+        if content is not None:
+            try:
+                data, _ = _read_json(content, validate, params)
+            except ValueError as e:
+                # Cached before the current checks
+                logger.warning(f"Ignoring invalid cached OpenAI response {key[:12]}: {e}")
+            else:
+                metrics.increment('openai.cache_hits')
+                logger.info(f"OpenAI response cache hit {key[:12]} ({params.get('model')})")
+                return data
+        metrics.increment('openai.cache_misses')
+        logger.info(f"OpenAI response cache miss {key[:12]} ({params.get('model')})")
+
+    attempts = (settings.OPENAI_INVALID_RESPONSE_RETRIES if retries is None else retries) + 1
+    for attempt in range(1, attempts + 1):
+        response = create_chat_completion(**params)
+
+        choice = response.choices[0]
+        if choice.finish_reason == 'length':
+            raise CompletionTruncated(f"OpenAI response was truncated at {params.get('max_tokens')} tokens")
+
+        content = (choice.message.content or "").strip()
+        try:
+            data, content = _read_json(content, validate, params)
+            break
+        except ValueError as e:
+            metrics.increment('openai.invalid_responses')
+            if attempt == attempts:
+                raise
+            logger.warning(f"Unrepairable OpenAI response, asking again ({attempt}/{attempts - 1}): {e}")
+
+    if use_cache:
+        completion_cache.store(key, params, content, getattr(response, 'usage', None))
+    return data
+
+
+def _read_json(content: str, validate: Optional[Callable], params: Dict[str, Any]) -> Tuple[Any, str]:
+    """
+    Parse and validate an answer, reporting the repairs.
+
+    Returns:
+        Tuple of (validated answer, content to cache: the answer with its syntax repaired)
+    """
+    parsed, fixes = parse_json(content)
+    if fixes:
+        content = json.dumps(parsed, ensure_ascii=False)
+
+    data = parsed
+    if validate is not None:
+        data, checked = validate(parsed)
+        fixes = [*fixes, *checked]
+
+    _report_repairs(fixes, params.get('model'))
+    return data, content
+
+
+def generate_tutorial_from_transcript(phrases: list, force: bool = False) -> dict:
     """
     Generate structured tutorial with video clips from transcript phrases using OpenAI.
-    
+
+    The model is picked by `route_tutorial`: a small transcript is first
+    given to LLM_SMALL_MODEL, and to LLM_MODEL only if that answer cannot
+    be used. Transcripts whose prompt exceeds
+    OPENAI_MAP_REDUCE_THRESHOLD_TOKENS, or whose tutorial does not fit in
+    `max_tokens` of LLM_MODEL, are generated window by window with
+    `generate_tutorial_map_reduce`.
+
     Args:
         phrases (list): List of transcript phrases with timing data
-        
+        force (bool): Bypass the response cache and ask OpenAI again
+
     Returns:
         dict: Structured tutorial data with steps containing optional video_clip:
             - title: Tutorial title
-            - introduction: Introduction paragraph  
+            - introduction: Introduction paragraph
             - steps: List of steps with text, index, timestamp, and optional video_clip
             - tips: List of practical tips
             - summary: Summary paragraph
             - duration_estimate: Estimated completion time
             - tags: List of relevant keywords
+            - generation_model: Model that wrote the tutorial
+            - generation_seconds: Time taken, escalations included
+    """
+    started = time.perf_counter()
+    model = settings.LLM_MODEL
+    messages, stats = _build_tutorial_prompt(phrases, model)
+
+    if stats['prompt_tokens'] > settings.OPENAI_MAP_REDUCE_THRESHOLD_TOKENS:
+        logger.info(f"Tutorial prompt over {settings.OPENAI_MAP_REDUCE_THRESHOLD_TOKENS} tokens, generating window by window")
+        return _with_generation_info(generate_tutorial_map_reduce(phrases, model, force=force), model, started)
+
+    routes = route_tutorial(phrases, stats)
+    for route, fallback in zip(routes, routes[1:]):
+        try:
+            # Not asked again: the next model is more likely to answer well
+            tutorial = complete_json(
+                _tutorial_params(route['model'], messages, route['max_tokens']),
+                force=force,
+                validate=validate_tutorial,
+                retries=0,
+            )
+            return _with_generation_info(tutorial, route['model'], started)
+        except ValueError as e:
+            _record_escalation(route, fallback, e)
+
+    try:
+        tutorial = complete_json(_tutorial_params(model, messages), force=force, validate=validate_tutorial)
+    except CompletionTruncated:
+        logger.warning("Tutorial did not fit in the response, generating window by window")
+        tutorial = generate_tutorial_map_reduce(phrases, model, force=force)
+    return _with_generation_info(tutorial, model, started)
+
+
+def route_tutorial(phrases: list, stats: Dict[str, int]) -> List[Dict[str, Any]]:
+    """
+    Pick the models generating a single-pass tutorial, in the order they are tried.
+
+    A transcript is small when its tutorial prompt holds at most
+    LLM_SMALL_MAX_PROMPT_TOKENS tokens and its conversation lasts at most
+    LLM_SMALL_MAX_MINUTES (longer conversations cover more steps, which
+    small models tend to merge or miss). Small transcripts are tried on
+    LLM_SMALL_MODEL with LLM_SMALL_MAX_TOKENS completion tokens first;
+    LLM_MODEL, with TUTORIAL_MAX_TOKENS, always comes last.
+
+    Args:
+        phrases: Transcript phrases
+        stats: Prompt statistics from `build_tutorial_messages`
+
+    Returns:
+        Routes, each a dict with `model` and `max_tokens`
     """
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-    
-    # Send raw JSON transcript directly to OpenAI
-    raw_transcript_json = json.dumps(phrases, indent=2)
-
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {
-                "role": "system",
-                "content": settings.OPENAI_SYSTEM_PROMPT
-            },
-            {
-                "role": "user", 
-                "content": settings.OPENAI_USER_PROMPT_TEMPLATE.format(transcript_json=raw_transcript_json)
-            }
-        ],
-        max_tokens=4096,
-        temperature=0.2,
-        top_p=0.9,
+    routes = [{'model': settings.LLM_MODEL, 'max_tokens': TUTORIAL_MAX_TOKENS}]
+    if not settings.LLM_SMALL_MODEL or settings.LLM_SMALL_MODEL == settings.LLM_MODEL:
+        return routes
+
+    minutes = conversation_seconds(phrases) / 60
+    if stats['prompt_tokens'] <= settings.LLM_SMALL_MAX_PROMPT_TOKENS and minutes <= settings.LLM_SMALL_MAX_MINUTES:
+        routes.insert(0, {'model': settings.LLM_SMALL_MODEL, 'max_tokens': settings.LLM_SMALL_MAX_TOKENS})
+
+    logger.info(
+        f"Routing tutorial of {stats['prompt_tokens']} prompt tokens and {minutes:.1f} minutes "
+        f"to {' then '.join(route['model'] for route in routes)}"
     )
-    
-    # Parse JSON response from OpenAI
-    raw_content = response.choices[0].message.content.strip()
-    
+    return routes
+
+
+def stream_tutorial_from_transcript(phrases: list, force: bool = False) -> Iterator[Event]:
+    """
+    Generate a tutorial like `generate_tutorial_from_transcript`, yielding its parts as they arrive.
+
+    The request is the same as the non-streamed one, so both share their
+    cached completions. Transcripts generated window by window are not
+    streamed: their parts are yielded once the whole tutorial is merged.
+
+    When the answer of a small model turns out unusable, (RESTART,
+    'tutorial', model) tells to drop what was yielded so far, and the
+    tutorial is streamed again from the next model. When the tutorial does
+    not fit in the response of the last one, it is generated window by
+    window instead, after a RESTART if anything was yielded.
+
+    Yields:
+        Parser events (see `streaming_json`): (FIELD, name, value) for each
+        tutorial field, (ITEM, 'steps', step) for each step as soon as it is
+        complete and (END, 'steps', None) after the last step; then
+        (FIELD, 'generation_model', model) and (FIELD, 'generation_seconds', seconds)
+
+    Raises:
+        ValueError: If the completion is not valid JSON
+    """
+    started = time.perf_counter()
+    model = settings.LLM_MODEL
+    messages, stats = _build_tutorial_prompt(phrases, model)
+
+    if stats['prompt_tokens'] > settings.OPENAI_MAP_REDUCE_THRESHOLD_TOKENS:
+        tutorial = _with_generation_info(generate_tutorial_map_reduce(phrases, model, force=force), model, started)
+        yield from _tutorial_events(tutorial)
+        return
+
+    routes = route_tutorial(phrases, stats)
+    for position, route in enumerate(routes):
+        params = _tutorial_params(route['model'], messages, route['max_tokens'])
+        streamed = False
+        try:
+            events = stream_json(params, stream_keys=('steps',), force=force, validate=validate_tutorial)
+            for event in _repair_tutorial_stream(events, route['model']):
+                streamed = True
+                yield event
+        except ValueError as e:
+            if position < len(routes) - 1:
+                _record_escalation(route, routes[position + 1], e)
+                if streamed:
+                    yield RESTART, 'tutorial', routes[position + 1]['model']
+                continue
+            if not isinstance(e, CompletionTruncated):
+                raise
+            logger.warning("Tutorial did not fit in the response, generating window by window")
+            if streamed:
+                yield RESTART, 'tutorial', model
+            tutorial = _with_generation_info(generate_tutorial_map_reduce(phrases, model, force=force), model, started)
+            yield from _tutorial_events(tutorial)
+            return
+
+        yield FIELD, 'generation_model', route['model']
+        yield FIELD, 'generation_seconds', _generation_seconds(started)
+        return
+
+
+def stream_json(
+    params: Dict[str, Any],
+    stream_keys: Iterable[str] = (),
+    force: bool = False,
+    validate: Optional[Callable[[Any], Any]] = None
+) -> Iterator[Event]:
+    """
+    Stream a chat completion holding a JSON object, as incremental parser events.
+
+    Works like `complete_json` (response cache, retries before the response
+    starts), except that object members and the items of `stream_keys`
+    arrays are yielded as soon as they are complete. A cached completion is
+    replayed through the same parser. The time to the first token is
+    recorded in openai.first_token_seconds.
+
+    The whole answer is checked by `validate` before it is cached, and
+    cached answers before they are replayed, so an invalid answer is never
+    served again (it is already streamed by then: the caller drops it).
+
+    Args:
+        params: Arguments of `client.chat.completions.create`
+        stream_keys: Keys of arrays whose items are yielded one by one
+        force: Skip the cache lookup and request a fresh completion
+        validate: Check of the parsed answer, raising ValueError if unusable
+
+    Raises:
+        CompletionTruncated: If the completion was cut at `max_tokens`
+        ValueError: If the completion is not valid JSON or fails `validate`
+    """
+    use_cache = settings.LLM_CACHE_ENABLED
+    key = completion_cache.make_key(params) if use_cache else None
+    parser = StreamingObjectParser(stream_keys)
+
     try:
-        return json.loads(raw_content)
+        if use_cache and not force:
+            with metrics.timer('openai.cache_seconds'):
+                content = completion_cache.lookup(key)
+            if content is not None and _is_valid_content(content, validate, key):
+                metrics.increment('openai.cache_hits')
+                logger.info(f"OpenAI response cache hit {key[:12]} ({params.get('model')}), replaying stream")
+                yield from parser.feed(content)
+                yield from parser.close()
+                return
+            metrics.increment('openai.cache_misses')
+
+        started = time.perf_counter()
+        stream = create_chat_completion(**params, stream=True, stream_options={'include_usage': True})
+        parts = []
+        finish_reason = None
+        usage = None
+
+        try:
+            for chunk in stream:
+                text, finish_reason, usage = _read_chunk(chunk, finish_reason, usage)
+                if not text:
+                    continue
+                if not parts:
+                    metrics.observe('openai.first_token_seconds', time.perf_counter() - started)
+                parts.append(text)
+                yield from parser.feed(text)
+        finally:
+            # Stops the download if the consumer went away
+            stream.close()
+
+        metrics.observe('openai.stream_seconds', time.perf_counter() - started)
+        if usage is not None:
+            metrics.increment('openai.prompt_tokens', usage.prompt_tokens or 0)
+            metrics.increment('openai.completion_tokens', usage.completion_tokens or 0)
+        if finish_reason == 'length':
+            raise CompletionTruncated(f"OpenAI response was truncated at {params.get('max_tokens')} tokens")
+
+        yield from parser.close()
     except json.JSONDecodeError as e:
         raise ValueError(f"OpenAI response is not valid JSON: {e}")
 
+    content = "".join(parts).strip()
+    if validate is not None:
+        validate(json.loads(content))
+    if use_cache:
+        completion_cache.store(key, params, content, usage)
+
+
+async def astream_tutorial_from_transcript(phrases: list, force: bool = False) -> AsyncIterator[Event]:
+    """
+    Async version of `stream_tutorial_from_transcript`.
+
+    Token counting and window by window generation run in a worker thread,
+    the streamed completion on the event loop.
+    """
+    started = time.perf_counter()
+    model = settings.LLM_MODEL
+    messages, stats = await sync_to_async(_build_tutorial_prompt, thread_sensitive=False)(phrases, model)
+
+    if stats['prompt_tokens'] > settings.OPENAI_MAP_REDUCE_THRESHOLD_TOKENS:
+        tutorial = await sync_to_async(generate_tutorial_map_reduce)(phrases, model, force=force)
+        for event in _tutorial_events(_with_generation_info(tutorial, model, started)):
+            yield event
+        return
+
+    routes = await sync_to_async(route_tutorial, thread_sensitive=False)(phrases, stats)
+    for position, route in enumerate(routes):
+        params = _tutorial_params(route['model'], messages, route['max_tokens'])
+        streamed = False
+        try:
+            events = astream_json(params, stream_keys=('steps',), force=force, validate=validate_tutorial)
+            async for event in _arepair_tutorial_stream(events, route['model']):
+                streamed = True
+                yield event
+        except ValueError as e:
+            if position < len(routes) - 1:
+                _record_escalation(route, routes[position + 1], e)
+                if streamed:
+                    yield RESTART, 'tutorial', routes[position + 1]['model']
+                continue
+            if not isinstance(e, CompletionTruncated):
+                raise
+            logger.warning("Tutorial did not fit in the response, generating window by window")
+            if streamed:
+                yield RESTART, 'tutorial', model
+            tutorial = await sync_to_async(generate_tutorial_map_reduce)(phrases, model, force=force)
+            for event in _tutorial_events(_with_generation_info(tutorial, model, started)):
+                yield event
+            return
+
+        yield FIELD, 'generation_model', route['model']
+        yield FIELD, 'generation_seconds', _generation_seconds(started)
+        return
+
+
+async def astream_json(
+    params: Dict[str, Any],
+    stream_keys: Iterable[str] = (),
+    force: bool = False,
+    validate: Optional[Callable[[Any], Any]] = None
+) -> AsyncIterator[Event]:
+    """
+    Async version of `stream_json`: the completion is read on the event loop,
+    cache reads and writes run in a thread.
+    """
+    use_cache = settings.LLM_CACHE_ENABLED
+    key = completion_cache.make_key(params) if use_cache else None
+    parser = StreamingObjectParser(stream_keys)
+
+    try:
+        if use_cache and not force:
+            with metrics.timer('openai.cache_seconds'):
+                content = await sync_to_async(completion_cache.lookup)(key)
+            if content is not None and _is_valid_content(content, validate, key):
+                metrics.increment('openai.cache_hits')
+                logger.info(f"OpenAI response cache hit {key[:12]} ({params.get('model')}), replaying stream")
+                for event in [*parser.feed(content), *parser.close()]:
+                    yield event
+                return
+            metrics.increment('openai.cache_misses')
+
+        started = time.perf_counter()
+        stream = await acreate_chat_completion(**params, stream=True, stream_options={'include_usage': True})
+        parts = []
+        finish_reason = None
+        usage = None
+
+        try:
+            async for chunk in stream:
+                text, finish_reason, usage = _read_chunk(chunk, finish_reason, usage)
+                if not text:
+                    continue
+                if not parts:
+                    metrics.observe('openai.first_token_seconds', time.perf_counter() - started)
+                parts.append(text)
+                for event in parser.feed(text):
+                    yield event
+        finally:
+            # Stops the download if the consumer went away
+            await stream.close()
+
+        metrics.observe('openai.stream_seconds', time.perf_counter() - started)
+        if usage is not None:
+            metrics.increment('openai.prompt_tokens', usage.prompt_tokens or 0)
+            metrics.increment('openai.completion_tokens', usage.completion_tokens or 0)
+        if finish_reason == 'length':
+            raise CompletionTruncated(f"OpenAI response was truncated at {params.get('max_tokens')} tokens")
+
+        for event in parser.close():
+            yield event
+    except json.JSONDecodeError as e:
+        raise ValueError(f"OpenAI response is not valid JSON: {e}")
+
+    content = "".join(parts).strip()
+    if validate is not None:
+        validate(json.loads(content))
+    if use_cache:
+        await sync_to_async(completion_cache.store)(key, params, content, usage)
+
+
+def _is_valid_content(content: str, validate: Optional[Callable[[Any], Any]], key: str) -> bool:
+    """Whether a cached answer may be replayed as a stream: valid JSON, as is, passing `validate`."""
+    try:
+        data = json.loads(content)
+        if validate is not None:
+            validate(data)
+    except ValueError as e:
+        # Cached before the current checks
+        logger.warning(f"Ignoring invalid cached OpenAI response {key[:12]}: {e}")
+        return False
+    return True
+
+
+def generate_tutorial_map_reduce(phrases: list, model: Optional[str] = None, force: bool = False) -> dict:
+    """
+    Generate a tutorial from a long transcript, window by window.
+
+    Map: the transcript is split into overlapping time windows
+    (`split_windows`) and OPENAI_MAP_WORKERS windows at a time are asked for
+    their candidate steps. Each window only keeps the steps of its own time
+    range, so the overlap adds context without duplicating steps.
+    Reduce: steps are merged in time order and numbered from 1, then one
+    last request writes the title, introduction, tips, summary and tags
+    around them. Timestamps and clip times are absolute in every window, so
+    they are kept as returned.
+
+    Args:
+        phrases: Transcript phrases
+        model: Model used for every request, LLM_MODEL by default
+        force: Bypass the response cache
+
+    Returns:
+        Structured tutorial data, as `generate_tutorial_from_transcript`
+
+    Raises:
+        ValueError: If no window produced a step
+    """
+    model = model or settings.LLM_MODEL
+    windows = split_windows(phrases, model, settings.OPENAI_WINDOW_TOKENS, settings.OPENAI_WINDOW_OVERLAP_SECONDS)
+    metrics.increment('openai.map_reduce_generations')
+    metrics.increment('openai.map_windows', len(windows))
+    logger.info(f"Generating tutorial from {len(phrases)} phrases in {len(windows)} windows")
+
+    def extract(window):
+        try:
+            return _extract_window_steps(window, model, force)
+        finally:
+            # Cache queries opened a database connection in this thread
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(settings.OPENAI_MAP_WORKERS, len(windows)))) as executor:
+        candidates = [step for steps in executor.map(extract, windows) for step in steps]
+
+    steps = merge_steps(candidates)
+    if not steps:
+        raise ValueError("No tutorial step found in the transcript")
+
+    return complete_json(
+        _json_params(model, build_reduce_messages(steps), 1024, 'tutorial_text', REDUCE_SCHEMA),
+        force=force,
+        validate=lambda data: validate_tutorial({**data, 'steps': steps} if isinstance(data, dict) else data),
+    )
+
+
+def generate_tutorial_section(
+    section: str,
+    tutorial: Dict[str, Any],
+    phrases: list,
+    force: bool = False,
+    **details: Any
+) -> Dict[str, Any]:
+    """
+    Rewrite one section of a tutorial.
+
+    Args:
+        section: 'step', 'tips', 'summary' or 'title' (title and tags)
+        tutorial: Current tutorial fields, sent as context
+        phrases: Transcript phrases the section is written from
+        force: Bypass the response cache
+        details: Placeholders of the section instructions (`index`, `start`
+            and `end` for a step)
+
+    Returns:
+        The rewritten fields: `step` (text, timestamp and optional
+        video_clip, without index), `tips`, `summary`, or `title` and `tags`
+
+    Raises:
+        ValueError: If the answer misses a field or has the wrong type
+    """
+    messages = build_section_messages(section, tutorial, phrases, **details)
+    return complete_json(
+        _json_params(settings.LLM_MODEL, messages, 1024, f'tutorial_{section}', SECTION_SCHEMAS[section]),
+        force=force,
+        validate=lambda data: _validate_section(section, data),
+    )
+
+
+def _validate_section(section: str, data: Any) -> Tuple[Dict[str, Any], List[str]]:
+    """Check a regenerated section, returning its fields and the fixes applied (see `generate_tutorial_section`)."""
+    if not isinstance(data, dict):
+        raise ValueError("OpenAI response is not a JSON object")
+    fixes = []
+
+    if section == 'step':
+        step = repair_step(data.get('step'), fixes)
+        if step is None:
+            raise ValueError(f"OpenAI response has no usable step: {'; '.join(fixes)}")
+        step.pop('index', None)
+        return {'step': step}, fixes
+
+    if section == 'tips':
+        tips = data.get('tips')
+        if not isinstance(tips, list):
+            raise ValueError("OpenAI response has no tips")
+        return {'tips': [tip.strip() for tip in tips if isinstance(tip, str) and tip.strip()]}, fixes
+
+    if section == 'summary':
+        if not isinstance(data.get('summary'), str) or not data['summary'].strip():
+            raise ValueError("OpenAI response has no summary")
+        return {'summary': data['summary'].strip()}, fixes
+
+    if not isinstance(data.get('title'), str) or not data['title'].strip():
+        raise ValueError("OpenAI response has no title")
+    if not isinstance(data.get('tags'), list):
+        raise ValueError("OpenAI response has no tags")
+    tags = [tag.strip() for tag in data['tags'] if isinstance(tag, str) and tag.strip()]
+    return {'title': data['title'].strip(), 'tags': tags[:MAX_TAGS]}, fixes
+
+
+def _build_tutorial_prompt(phrases: list, model: str) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """Build the tutorial messages, recording and logging their token counts."""
+    messages, stats = build_tutorial_messages(phrases, model)
+    metrics.increment('openai.prompt_tokens_estimated', stats['prompt_tokens'])
+    metrics.increment('openai.prompt_tokens_saved', stats['saved_tokens'])
+    logger.info(
+        f"Tutorial prompt for {len(phrases)} phrases: {stats['prompt_tokens']} tokens, "
+        f"{stats['saved_tokens']} saved by the compact transcript"
+    )
+    return messages, stats
+
+
+def _tutorial_params(model: str, messages: List[Dict[str, str]], max_tokens: int = TUTORIAL_MAX_TOKENS) -> Dict[str, Any]:
+    """Request parameters of a single-pass tutorial generation."""
+    return _json_params(model, messages, max_tokens, 'tutorial', TUTORIAL_SCHEMA)
+
+
+def _json_params(model: str, messages: List[Dict[str, str]], max_tokens: int, name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Request parameters of a JSON answer following `schema` (when structured outputs are enabled)."""
+    params = {
+        'model': model,
+        'messages': messages,
+        'max_tokens': max_tokens,
+        'temperature': 0.2,
+        'top_p': 0.9,
+    }
+    structured = response_format(name, schema)
+    if structured is not None:
+        params['response_format'] = structured
+    return params
+
+
+def _repair_tutorial_stream(events: Iterator[Event], model: str) -> Iterator[Event]:
+    """
+    Repair the steps of a streamed tutorial as they arrive, then check the whole.
+
+    Raises:
+        ValueError: Once the stream ended, if it had no title or no usable step
+    """
+    steps = []
+    fixes = []
+    title = None
+    for kind, name, value in events:
+        if kind == ITEM:
+            value = _repair_streamed_step(value, steps, fixes)
+            if value is None:
+                continue
+        elif kind == FIELD and name == 'title':
+            title = value
+        yield kind, name, value
+    _report_repairs(fixes, model)
+    _check_streamed_tutorial(title, steps)
+
+
+async def _arepair_tutorial_stream(events: AsyncIterator[Event], model: str) -> AsyncIterator[Event]:
+    """Async version of `_repair_tutorial_stream`."""
+    steps = []
+    fixes = []
+    title = None
+    async for kind, name, value in events:
+        if kind == ITEM:
+            value = _repair_streamed_step(value, steps, fixes)
+            if value is None:
+                continue
+        elif kind == FIELD and name == 'title':
+            title = value
+        yield kind, name, value
+    _report_repairs(fixes, model)
+    _check_streamed_tutorial(title, steps)
+
+
+def _check_streamed_tutorial(title: Any, steps: List[Any]) -> None:
+    if not isinstance(title, str) or not title.strip():
+        raise ValueError("OpenAI response has no title")
+    if not any(step is not None for step in steps):
+        raise ValueError("OpenAI response has no usable step")
+
+
+def _tutorial_events(tutorial: Dict[str, Any]) -> Iterator[Event]:
+    """Events of a tutorial generated at once, in the streamed order (steps last)."""
+    for name, value in tutorial.items():
+        if name != 'steps':
+            yield FIELD, name, value
+    for step in tutorial['steps']:
+        yield ITEM, 'steps', step
+    yield END, 'steps', None
+
+
+def _with_generation_info(tutorial: Dict[str, Any], model: str, started: float) -> Dict[str, Any]:
+    """Add the model that wrote the tutorial and the seconds since `started`."""
+    return {**tutorial, 'generation_model': model, 'generation_seconds': _generation_seconds(started)}
+
+
+def _generation_seconds(started: float) -> float:
+    """Seconds since `started`, recorded in the openai.generation_seconds histogram."""
+    seconds = time.perf_counter() - started
+    metrics.observe('openai.generation_seconds', seconds)
+    return round(seconds, 3)
+
+
+def _record_escalation(route: Dict[str, Any], fallback: Dict[str, Any], error: Exception) -> None:
+    metrics.increment('openai.escalations')
+    logger.warning(f"Unusable tutorial from {route['model']}, escalating to {fallback['model']}: {error}")
+
+
+def _repair_streamed_step(step: Any, steps: List[Any], fixes: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Repair a streamed step like `validate_tutorial` does, numbering the kept steps from 1.
+
+    Args:
+        step: Step as streamed
+        steps: Steps streamed so far (None for dropped ones), the step is appended
+        fixes: List the applied fixes are appended to
+
+    Returns:
+        The repaired step, or None to drop it
+    """
+    label = f"step {len(steps) + 1}"
+    number = sum(1 for kept in steps if kept is not None) + 1
+    step = repair_step(step, fixes, label=label)
+    if step is not None and step.get('index') != number:
+        fixes.append(f"renumbered {label} to {number}")
+        step = {**step, 'index': number}
+    steps.append(step)
+    return step
+
+
+def _report_repairs(fixes: List[str], model: Optional[str]) -> None:
+    """Log and count the fixes applied to one answer."""
+    if fixes:
+        metrics.increment('openai.repaired_responses')
+        logger.warning(f"Repaired OpenAI response ({model}): {'; '.join(fixes)}")
+
+
+def merge_steps(candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Order candidate steps by timestamp and number them from 1.
+
+    Steps repeating the timestamp and text of a previous step are dropped.
+    """
+    merged = []
+    seen = set()
+    for step in sorted(candidates, key=lambda step: step['timestamp']):
+        identity = (step['timestamp'], " ".join(step['text'].lower().split()))
+        if identity in seen:
+            continue
+        seen.add(identity)
+        merged.append({'index': len(merged) + 1, **step})
+    return merged
+
+
+def _extract_window_steps(window: Dict[str, Any], model: str, force: bool) -> List[Dict[str, Any]]:
+    """
+    Ask for the candidate steps of one window.
+
+    Returns:
+        Steps with a text and a timestamp inside the window core range, in
+        the tutorial step format without index
+    """
+    candidates = complete_json(
+        _json_params(model, build_map_messages(window), 2048, 'window_steps', MAP_SCHEMA),
+        force=force,
+        validate=_validate_window_steps,
+    )
+
+    # Steps of the overlap are extracted by the neighbouring window
+    return [step for step in candidates if window['start'] <= step['timestamp'] < window['end']]
+
+
+def _validate_window_steps(data: Any) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Repair the candidate steps of a window answer, dropping unusable ones."""
+    if not isinstance(data, dict) or not isinstance(data.get('steps'), list):
+        raise ValueError("OpenAI response has no steps")
+
+    fixes = []
+    steps = []
+    for position, step in enumerate(data['steps'], 1):
+        step = repair_step(step, fixes, label=f"step {position}")
+        if step is not None:
+            step.pop('index', None)
+            steps.append(step)
+    return steps, fixes
+
+
+def _record_failure(error: Exception, attempt: int, started: float, attempt_started: float) -> float:
+    """
+    Record a failed attempt and return the delay before the next one.
+
+    Raises:
+        The error itself when it is not retryable or retries are exhausted
+    """
+    metrics.observe('openai.request_seconds', time.perf_counter() - attempt_started)
+    if attempt >= settings.OPENAI_MAX_RETRIES or not _is_retryable(error):
+        metrics.increment('openai.errors')
+        metrics.observe('openai.call_seconds', time.perf_counter() - started)
+        raise error
+
+    delay = _retry_delay(attempt, error)
+    metrics.increment('openai.retries')
+    logger.warning(
+        f"OpenAI request failed ({_describe(error)}), "
+        f"retry {attempt + 1}/{settings.OPENAI_MAX_RETRIES} in {delay:.1f}s"
+    )
+    return delay
+
+
+def _record_success(response: Any, started: float, attempt_started: float) -> None:
+    """Record the latency and token usage of a successful call."""
+    finished = time.perf_counter()
+    metrics.observe('openai.request_seconds', finished - attempt_started)
+    metrics.observe('openai.call_seconds', finished - started)
+    if getattr(response, 'usage', None) is not None:
+        metrics.increment('openai.prompt_tokens', response.usage.prompt_tokens or 0)
+        metrics.increment('openai.completion_tokens', response.usage.completion_tokens or 0)
+
+
+def _read_chunk(chunk: Any, finish_reason: Optional[str], usage: Any) -> Tuple[Optional[str], Optional[str], Any]:
+    """
+    Read a streamed completion chunk.
+
+    Returns:
+        Tuple of (text delta or None, finish reason, usage), the last two
+        carried over from previous chunks until a chunk reports them
+    """
+    if getattr(chunk, 'usage', None) is not None:
+        usage = chunk.usage
+    if not chunk.choices:
+        return None, finish_reason, usage
+    choice = chunk.choices[0]
+    text = choice.delta.content if choice.delta else None
+    return text, choice.finish_reason or finish_reason, usage
+
+
+def _estimate_tokens(params: Dict[str, Any]) -> int:
+    """Tokens a request counts against the tokens per minute limit: its prompt plus `max_tokens`."""
+    model = params.get('model')
+    prompt_tokens = sum(count_tokens(message.get('content') or '', model) for message in params.get('messages', []))
+    return prompt_tokens + (params.get('max_tokens') or 0)
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    return isinstance(error, APIStatusError) and error.status_code == 429
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Whether a failed request may succeed if sent again."""
+    if isinstance(error, APIConnectionError):
+        # Includes timeouts
+        return True
+    if error.status_code == 429:
+        # An exhausted quota does not recover within the retry window
+        return getattr(error, 'code', None) != 'insufficient_quota'
+    return error.status_code >= 500
+
+
+def _retry_delay(attempt: int, error: Exception) -> float:
+    """
+    Seconds to wait before retry number `attempt + 1`.
+
+    Full jitter: a random delay up to base * 2^attempt, so that clients
+    throttled together do not retry together.
+    """
+    ceiling = min(settings.OPENAI_RETRY_MAX_SECONDS, settings.OPENAI_RETRY_BASE_SECONDS * 2 ** attempt)
+    delay = random.uniform(0, ceiling)
+
+    response = getattr(error, 'response', None)
+    if response is not None:
+        try:
+            retry_after = float(response.headers.get('retry-after', ''))
+        except ValueError:
+            retry_after = None
+        if retry_after is not None and 0 <= retry_after <= settings.OPENAI_RETRY_MAX_SECONDS:
+            delay = max(delay, retry_after)
+
+    return delay
+
 
- 
\ No newline at end of file
+def _describe(error: Exception) -> str:
+    if isinstance(error, APIStatusError):
+        return f"HTTP {error.status_code}"
+    return type(error).__name__
@@ -0,0 +1,112 @@
+"""
+Time-interval index over transcript phrases.
+
+Built from the stored offset and duration columns, without decoding the
+phrases. Phrases are sorted by start time and each position keeps the
+largest end time seen so far, so the first phrase that can still overlap
+a time is found by bisection too. Range and nearest-phrase queries then
+take O(log n) plus the size of the result.
+"""
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+from typing import Callable, List, Optional, Tuple
+
+# Number of indexes kept in memory per process
+INDEX_CACHE_SIZE = 128
+
+_cache: 'OrderedDict[str, PhraseIndex]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class PhraseIndex:
+    """Interval index answering time queries with phrase positions."""
+
+    def __init__(self, offsets: array, durations: array):
+        """
+        Args:
+            offsets: Phrase start offsets in milliseconds (NaN when unknown)
+            durations: Phrase durations in milliseconds
+        """
+        positions = sorted(
+            (position for position, offset in enumerate(offsets) if not math.isnan(offset)),
+            key=offsets.__getitem__
+        )
+        # Position in the phrase list of each indexed phrase, in start order
+        self._positions = array('q', positions)
+        self._starts = array('d', (offsets[position] for position in positions))
+        self._ends = array('d', (
+            offsets[position] + max(durations[position], 0.0) if position < len(durations) else offsets[position]
+            for position in positions
+        ))
+        self._max_ends = array('d', accumulate(self._ends, max))
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def between(self, start: float, end: float) -> List[int]:
+        """
+        Return positions of the phrases overlapping [start, end], in start order.
+
+        Args:
+            start: Range start in milliseconds
+            end: Range end in milliseconds
+        """
+        upper = bisect_right(self._starts, end)
+        lower = bisect_left(self._max_ends, start, 0, upper)
+        return [
+            self._positions[k] for k in range(lower, upper)
+            if self._ends[k] >= start
+        ]
+
+    def nearest(self, time: float) -> Optional[int]:
+        """
+        Return the position of the phrase closest to `time` in milliseconds.
+
+        A phrase being spoken at `time` wins (the first started one if they
+        overlap); otherwise the phrase ending just before or starting just
+        after, whichever is closer. None if no phrase has a known offset.
+        """
+        if not self._positions:
+            return None
+
+        following = bisect_right(self._starts, time)
+        if following and self._max_ends[following - 1] >= time:
+            # A phrase started before `time` is still running
+            return self._positions[bisect_left(self._max_ends, time, 0, following)]
+
+        candidates = []
+        if following:
+            # Phrase that ended last before `time`
+            previous = bisect_left(self._max_ends, self._max_ends[following - 1], 0, following)
+            candidates.append((time - self._ends[previous], previous))
+        if following < len(self._starts):
+            candidates.append((self._starts[following] - time, following))
+
+        return self._positions[min(candidates)[1]]
+
+
+def get_index(key: str, load: Callable[[], Tuple[array, array]]) -> PhraseIndex:
+    """
+    Return the index cached under `key`, building it from `load()` on a miss.
+
+    Args:
+        key: Identifier of immutable phrase content, e.g. the transcript fingerprint
+        load: Returns (offsets, durations) columns of the phrases
+    """
+    with _cache_lock:
+        index = _cache.get(key)
+        if index is not None:
+            _cache.move_to_end(key)
+            return index
+
+    index = PhraseIndex(*load())
+
+    with _cache_lock:
+        _cache[key] = index
+        while len(_cache) > INDEX_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return index
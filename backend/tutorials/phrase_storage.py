@@ -0,0 +1,77 @@
+"""
+Compact storage format for transcript phrases.
+
+Phrases are stored as three binary columns:
+- the full phrase objects as compact JSON, zlib-compressed, so every
+  uploaded key is kept and decoding gives back the same objects;
+- parallel arrays of offsets and durations (milliseconds, float64), so
+  timing lookups don't need to decompress the text.
+"""
+import json
+import math
+import sys
+import zlib
+from array import array
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# Accepted names for the phrase start offset and duration
+PHRASE_OFFSET_KEYS = ('offset_milliseconds', 'offsetMilliseconds')
+PHRASE_DURATION_KEYS = ('duration_milliseconds', 'durationMilliseconds')
+# Accepted names for the phrase text
+PHRASE_TEXT_KEYS = ('display', 'text')
+
+# Column items are little-endian float64 whatever the platform
+COLUMN_TYPECODE = 'd'
+
+Binary = Union[bytes, memoryview]
+
+
+def encode_phrases(phrases: List[Dict[str, Any]]) -> Tuple[bytes, bytes, bytes]:
+    """
+    Encode phrases into their storage columns.
+
+    Args:
+        phrases: Transcript phrases
+
+    Returns:
+        Tuple of (compressed phrase JSON, packed offsets, packed durations)
+    """
+    data = zlib.compress(json.dumps(phrases, ensure_ascii=False, separators=(',', ':')).encode())
+    offsets = array(COLUMN_TYPECODE, (get_timing(phrase, PHRASE_OFFSET_KEYS, math.nan) for phrase in phrases))
+    durations = array(COLUMN_TYPECODE, (get_timing(phrase, PHRASE_DURATION_KEYS, 0.0) for phrase in phrases))
+    return data, pack_column(offsets), pack_column(durations)
+
+
+def decode_phrases(data: Optional[Binary]) -> List[Dict[str, Any]]:
+    """Decode the compressed phrase JSON column."""
+    if not data:
+        return []
+    return json.loads(zlib.decompress(data))
+
+
+def decode_column(packed: Optional[Binary]) -> array:
+    """Decode a packed offsets or durations column."""
+    column = array(COLUMN_TYPECODE)
+    if packed:
+        column.frombytes(bytes(packed))
+        if sys.byteorder == 'big':
+            column.byteswap()
+    return column
+
+
+def pack_column(column: array) -> bytes:
+    """Pack a column as little-endian bytes."""
+    if sys.byteorder == 'big':
+        column = array(COLUMN_TYPECODE, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def get_timing(phrase: Any, keys: Tuple[str, ...], default: float) -> float:
+    """Return the first numeric timing found under `keys`, or `default`."""
+    if isinstance(phrase, dict):
+        for key in keys:
+            value = phrase.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return float(value)
+    return default
@@ -0,0 +1,253 @@
+"""
+Compact transcript prompts.
+
+Phrases are projected down to what the tutorial prompt uses, their start
+time and display text, and written one per line as `<seconds>|<text>`.
+Start times are given in seconds, the unit the model answers in, so step
+timestamps are copied from the transcript instead of converted.
+
+Transcripts too long for one prompt are split into time windows
+(`split_windows`) for map-reduce generation: steps are extracted window by
+window, then merged. A single section of an existing tutorial is rewritten
+from the tutorial itself and only the phrases around that section
+(`build_section_messages`).
+
+Tokens are counted locally with tiktoken when it is installed, and
+estimated from the text length otherwise.
+"""
+import json
+import logging
+import math
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from django.conf import settings
+from .phrase_storage import PHRASE_OFFSET_KEYS, PHRASE_TEXT_KEYS, get_timing
+
+try:
+    import tiktoken
+except ImportError:  # Optional: token counts are estimated without it
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Average characters per token, used when tiktoken is not available
+CHARS_PER_TOKEN = 4
+
+# Tokenizer used for models tiktoken does not know
+DEFAULT_ENCODING = 'o200k_base'
+
+
+def project_phrases(phrases: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """
+    Keep only the start time and text of each phrase.
+
+    Phrases without a start offset or without text cannot anchor a step and
+    are left out. Whitespace inside texts is collapsed so that each phrase
+    stays on one line.
+
+    Returns:
+        List of (start in seconds, text), in transcript order
+    """
+    projected = []
+    for phrase in phrases:
+        if not isinstance(phrase, dict):
+            continue
+        offset = get_timing(phrase, PHRASE_OFFSET_KEYS, None)
+        text = next((phrase[key] for key in PHRASE_TEXT_KEYS if isinstance(phrase.get(key), str)), "")
+        text = " ".join(text.split())
+        if offset is None or not text:
+            continue
+        projected.append((format_seconds(offset), text))
+    return projected
+
+
+def format_seconds(milliseconds: float) -> str:
+    """Format an offset in milliseconds as seconds, without trailing zeros (12500 -> "12.5")."""
+    return f"{milliseconds / 1000:.3f}".rstrip('0').rstrip('.')
+
+
+def conversation_seconds(phrases: List[Dict[str, Any]]) -> float:
+    """Seconds between the first and the last phrase start."""
+    times = [float(seconds) for seconds, _ in project_phrases(phrases)]
+    return max(times) - min(times) if times else 0.0
+
+
+def format_transcript(phrases: List[Dict[str, Any]]) -> str:
+    """Encode phrases as `<seconds>|<text>` lines."""
+    return "\n".join(f"{seconds}|{text}" for seconds, text in project_phrases(phrases))
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Count the tokens of `text` for `model`.
+
+    Uses tiktoken when it is installed and its encoding can be loaded,
+    otherwise estimates CHARS_PER_TOKEN characters per token.
+    """
+    encoding = _get_encoding(model or '')
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def build_tutorial_messages(phrases: List[Dict[str, Any]], model: str) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """
+    Build the chat messages asking for a tutorial, with the compact transcript.
+
+    Args:
+        phrases: Transcript phrases
+        model: Model the prompt is sent to, for token counting
+
+    Returns:
+        Tuple of (messages, stats) where stats holds `prompt_tokens` (system
+        and user messages) and `saved_tokens`, the difference with the
+        transcript sent as indented JSON with every phrase field
+    """
+    transcript = format_transcript(phrases)
+    messages = [
+        {"role": "system", "content": settings.OPENAI_SYSTEM_PROMPT},
+        {"role": "user", "content": settings.OPENAI_USER_PROMPT_TEMPLATE.format(transcript=transcript)},
+    ]
+
+    prompt_tokens = sum(count_tokens(message['content'], model) for message in messages)
+    # The rest of the prompt is the same in both encodings
+    saved_tokens = count_tokens(json.dumps(phrases, indent=2), model) - count_tokens(transcript, model)
+
+    return messages, {'prompt_tokens': prompt_tokens, 'saved_tokens': saved_tokens}
+
+
+def split_windows(
+    phrases: List[Dict[str, Any]],
+    model: str,
+    window_tokens: int,
+    overlap_seconds: float
+) -> List[Dict[str, Any]]:
+    """
+    Split a transcript into consecutive time windows.
+
+    Each window owns the phrases of a core time range holding about
+    `window_tokens` tokens; core ranges never overlap, so a step belongs to
+    the one window whose range holds its timestamp. Phrases spoken up to
+    `overlap_seconds` before and after the core are added as context, so
+    that steps spanning a boundary are understood by both sides.
+
+    Args:
+        phrases: Transcript phrases
+        model: Model the windows are sent to, for token counting
+        window_tokens: Token budget of the core of a window
+        overlap_seconds: Context added on each side of the core
+
+    Returns:
+        Windows in time order, each a dict with `start` and `end` (core range
+        in seconds, `end` excluded and infinite for the last window), `first`
+        and `last` (start times of the first and last core phrases, as
+        written in the prompt) and `lines` (the (seconds, text) lines to send)
+    """
+    lines = sorted(project_phrases(phrases), key=lambda line: float(line[0]))
+    times = [float(seconds) for seconds, _ in lines]
+
+    # Indexes of the first line of each core, only cut between different start times
+    cores = [0] if lines else []
+    tokens = 0
+    for position, (seconds, text) in enumerate(lines):
+        line_tokens = count_tokens(f"{seconds}|{text}\n", model)
+        if tokens and tokens + line_tokens > window_tokens and times[position] > times[position - 1]:
+            cores.append(position)
+            tokens = 0
+        tokens += line_tokens
+
+    windows = []
+    for number, first in enumerate(cores):
+        last = (cores[number + 1] if number + 1 < len(cores) else len(lines)) - 1
+        start = times[first]
+        end = times[last + 1] if last + 1 < len(lines) else math.inf
+        context_start = bisect_left(times, start - overlap_seconds)
+        context_end = bisect_left(times, times[last] + overlap_seconds, lo=last + 1) if end != math.inf else len(lines)
+        windows.append({
+            # The first window also owns steps placed before the first phrase
+            'start': start if number else 0.0,
+            'end': end,
+            'first': lines[first][0],
+            'last': lines[last][0],
+            'lines': lines[context_start:max(context_end, last + 1)],
+        })
+
+    return windows
+
+
+def build_map_messages(window: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Build the chat messages extracting the candidate steps of one window."""
+    transcript = "\n".join(f"{seconds}|{text}" for seconds, text in window['lines'])
+    return [
+        {"role": "system", "content": settings.OPENAI_MAP_SYSTEM_PROMPT},
+        {"role": "user", "content": settings.OPENAI_MAP_USER_PROMPT_TEMPLATE.format(
+            start=window['first'],
+            end=window['last'],
+            transcript=transcript,
+        )},
+    ]
+
+
+def build_reduce_messages(steps: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Build the chat messages writing the tutorial text around merged steps."""
+    lines = "\n".join(f"{step['index']}|{' '.join(step['text'].split())}" for step in steps)
+    return [
+        {"role": "system", "content": settings.OPENAI_REDUCE_SYSTEM_PROMPT},
+        {"role": "user", "content": settings.OPENAI_REDUCE_USER_PROMPT_TEMPLATE.format(steps=lines)},
+    ]
+
+
+def build_section_messages(
+    section: str,
+    tutorial: Dict[str, Any],
+    phrases: List[Dict[str, Any]],
+    **details: Any
+) -> List[Dict[str, str]]:
+    """
+    Build the chat messages rewriting one section of a tutorial.
+
+    The tutorial is sent as compact JSON, clips reduced to their range, and
+    the transcript phrases (if any) as `<seconds>|<text>` lines.
+
+    Args:
+        section: Key of OPENAI_SECTION_INSTRUCTIONS
+        tutorial: Current tutorial fields (title, introduction, steps, tips, summary, tags)
+        phrases: Transcript phrases the section is written from, possibly empty
+        details: Values of the instruction placeholders (`index`, `start`, `end` for a step)
+    """
+    context = {**tutorial, 'steps': [_compact_step(step) for step in tutorial['steps']]}
+    content = settings.OPENAI_SECTION_USER_PROMPT_TEMPLATE.format(
+        tutorial=json.dumps(context, ensure_ascii=False, separators=(',', ':')),
+        instructions=settings.OPENAI_SECTION_INSTRUCTIONS[section].format(**details),
+    )
+    if phrases:
+        content += settings.OPENAI_SECTION_TRANSCRIPT_TEMPLATE.format(transcript=format_transcript(phrases))
+    return [
+        {"role": "system", "content": settings.OPENAI_SECTION_SYSTEM_PROMPT},
+        {"role": "user", "content": content},
+    ]
+
+
+def _compact_step(step: Any) -> Any:
+    """Step as shown to the model: clip files are left out."""
+    if not isinstance(step, dict) or not isinstance(step.get('video_clip'), dict):
+        return step
+    video_clip = {key: step['video_clip'][key] for key in ('start', 'end') if key in step['video_clip']}
+    return {**step, 'video_clip': video_clip}
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    """Return the tiktoken encoding of `model`, or None to estimate token counts."""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        # Encodings are downloaded on first use, which fails on offline hosts
+        logger.warning(f"Cannot load tiktoken encoding for {model!r}, estimating token counts: {e}")
+        return None
@@ -0,0 +1,231 @@
+"""
+Rate limiter shared by all processes calling OpenAI.
+
+A token bucket per limit, requests per minute and tokens per minute, is
+kept in the RateLimitBucket table, so web and worker processes draw from
+the same budget. A call takes one request and its estimated tokens
+(prompt plus `max_tokens`, which is how OpenAI counts them when admitting
+a request). Budgets refill continuously, up to one minute's worth.
+
+Calls over budget wait in line rather than fail: each one holds a
+RateLimitTicket, and a call is only admitted when the budget covers it
+and every older ticket, so calls are admitted in arrival order whichever
+process made them. After a 429, `hold_back` empties the budgets so that
+every process waits together instead of all retrying at once.
+
+Waits are recorded in the openai.rate_limit_wait_seconds histogram;
+`status()` reports the live queue.
+"""
+import asyncio
+import random
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+from django.utils import timezone
+from . import metrics
+from .models import RateLimitBucket, RateLimitTicket
+
+# Bucket of the chat completions API
+BUCKET = 'openai'
+
+# Tickets whose process did not poll for this long are dropped from the queue
+STALE_TICKET_SECONDS = 30
+
+
+def enabled() -> bool:
+    """Whether calls are rate limited (both limits set)."""
+    return settings.OPENAI_RPM_LIMIT > 0 and settings.OPENAI_TPM_LIMIT > 0
+
+
+def acquire(tokens: int) -> float:
+    """
+    Wait until the call may be sent, then take its budget.
+
+    Args:
+        tokens: Estimated tokens of the call
+
+    Returns:
+        Seconds waited
+    """
+    if not enabled():
+        return 0.0
+
+    started = time.monotonic()
+    ticket = _take_ticket(tokens)
+    queued = False
+    try:
+        while True:
+            delay = _try_admit(ticket)
+            if delay is None:
+                break
+            queued = True
+            time.sleep(delay)
+    except BaseException:
+        RateLimitTicket.objects.filter(pk=ticket.pk).delete()
+        raise
+
+    return _record_wait(started, queued)
+
+
+async def aacquire(tokens: int) -> float:
+    """Async version of `acquire`: waits on the event loop, polls in a thread."""
+    if not enabled():
+        return 0.0
+
+    started = time.monotonic()
+    ticket = await sync_to_async(_take_ticket)(tokens)
+    queued = False
+    try:
+        while True:
+            delay = await sync_to_async(_try_admit)(ticket)
+            if delay is None:
+                break
+            queued = True
+            await asyncio.sleep(delay)
+    except BaseException:
+        await sync_to_async(RateLimitTicket.objects.filter(pk=ticket.pk).delete)()
+        raise
+
+    return _record_wait(started, queued)
+
+
+def hold_back(seconds: float) -> None:
+    """
+    Empty the budgets so that no call is admitted for about `seconds`.
+
+    Called on a 429: calls queued in every process then wait for the
+    budget to refill instead of retrying together.
+    """
+    if not enabled():
+        return
+
+    _ensure_bucket()
+    with transaction.atomic():
+        bucket = _lock_bucket()
+        _refill(bucket, timezone.now())
+        # The next request is admitted after `seconds`, then the budgets refill from empty
+        bucket.requests = min(bucket.requests, 1 - seconds * settings.OPENAI_RPM_LIMIT / 60)
+        bucket.tokens = min(bucket.tokens, 0)
+        bucket.save(update_fields=['requests', 'tokens', 'refilled_at'])
+
+
+def status() -> Dict[str, Any]:
+    """
+    Live state of the limiter.
+
+    Returns:
+        Dict with the limits, the budgets available now, the number of
+        waiting calls and how long the oldest one has been waiting
+    """
+    if not enabled():
+        return {'enabled': False}
+
+    now = timezone.now()
+    queue = RateLimitTicket.objects.filter(bucket=BUCKET, heartbeat_at__gte=_stale_before(now))
+    oldest = queue.aggregate(oldest=Min('created_at'))['oldest']
+
+    bucket = RateLimitBucket.objects.filter(name=BUCKET).first()
+    if bucket is not None:
+        _refill(bucket, now)
+
+    return {
+        'enabled': True,
+        'rpm_limit': settings.OPENAI_RPM_LIMIT,
+        'tpm_limit': settings.OPENAI_TPM_LIMIT,
+        'requests_available': round(bucket.requests, 1) if bucket else settings.OPENAI_RPM_LIMIT,
+        'tokens_available': round(bucket.tokens) if bucket else settings.OPENAI_TPM_LIMIT,
+        'queue_depth': queue.count(),
+        'oldest_wait_seconds': round((now - oldest).total_seconds(), 3) if oldest else 0.0,
+    }
+
+
+def _take_ticket(tokens: int) -> RateLimitTicket:
+    _ensure_bucket()
+    # A call larger than a full minute of tokens would never be admitted
+    tokens = min(tokens, settings.OPENAI_TPM_LIMIT)
+    return RateLimitTicket.objects.create(bucket=BUCKET, tokens=tokens, heartbeat_at=timezone.now())
+
+
+def _try_admit(ticket: RateLimitTicket) -> Optional[float]:
+    """
+    Admit the call if the budget covers it and every call waiting before it.
+
+    Calls ahead keep their place: a call is only admitted out of order if
+    what is left still covers them.
+
+    Returns:
+        None once admitted, otherwise seconds to wait before trying again
+    """
+    now = timezone.now()
+    RateLimitTicket.objects.filter(bucket=BUCKET, heartbeat_at__lt=_stale_before(now)).delete()
+    ahead = RateLimitTicket.objects.filter(bucket=BUCKET, id__lt=ticket.pk).aggregate(count=Count('id'), tokens=Sum('tokens'))
+    requests_needed = ahead['count'] + 1
+    tokens_needed = (ahead['tokens'] or 0) + ticket.tokens
+
+    with transaction.atomic():
+        bucket = _lock_bucket()
+        # Read once locked: a time from before the wait could move refilled_at
+        # back past a refill made meanwhile, and that budget be added twice
+        now = timezone.now()
+        _refill(bucket, now)
+        admitted = bucket.requests >= requests_needed and bucket.tokens >= tokens_needed
+        if admitted:
+            bucket.requests -= 1
+            bucket.tokens -= ticket.tokens
+        bucket.save(update_fields=['requests', 'tokens', 'refilled_at'])
+
+        if admitted:
+            RateLimitTicket.objects.filter(pk=ticket.pk).delete()
+            return None
+        RateLimitTicket.objects.filter(pk=ticket.pk).update(heartbeat_at=now)
+
+    # Time until the budget covers this call and those ahead, checked at least every OPENAI_RATE_LIMIT_POLL_SECONDS
+    missing = max(
+        (requests_needed - bucket.requests) * 60 / settings.OPENAI_RPM_LIMIT,
+        (tokens_needed - bucket.tokens) * 60 / settings.OPENAI_TPM_LIMIT,
+    )
+    # Jittered so that waiting processes do not poll in lockstep
+    return min(max(missing, 0.01), settings.OPENAI_RATE_LIMIT_POLL_SECONDS) * random.uniform(0.9, 1.1)
+
+
+def _lock_bucket() -> RateLimitBucket:
+    """Lock the bucket row until the end of the transaction, and return it."""
+    # A write rather than SELECT ... FOR UPDATE: SQLite ignores the latter, and a
+    # transaction that reads before writing fails there when another one writes
+    RateLimitBucket.objects.filter(name=BUCKET).update(name=BUCKET)
+    return RateLimitBucket.objects.get(name=BUCKET)
+
+
+def _refill(bucket: RateLimitBucket, now) -> None:
+    """Add the budget earned since the last refill, up to one minute's worth."""
+    elapsed = max((now - bucket.refilled_at).total_seconds(), 0.0)
+    bucket.requests = min(bucket.requests + elapsed * settings.OPENAI_RPM_LIMIT / 60, settings.OPENAI_RPM_LIMIT)
+    bucket.tokens = min(bucket.tokens + elapsed * settings.OPENAI_TPM_LIMIT / 60, settings.OPENAI_TPM_LIMIT)
+    bucket.refilled_at = now
+
+
+def _ensure_bucket() -> None:
+    RateLimitBucket.objects.get_or_create(
+        name=BUCKET,
+        defaults={
+            'requests': settings.OPENAI_RPM_LIMIT,
+            'tokens': settings.OPENAI_TPM_LIMIT,
+            'refilled_at': timezone.now(),
+        },
+    )
+
+
+def _record_wait(started: float, queued: bool) -> float:
+    waited = time.monotonic() - started
+    metrics.observe('openai.rate_limit_wait_seconds', waited)
+    if queued:
+        metrics.increment('openai.rate_limited')
+    return waited
+
+
+def _stale_before(now):
+    return now - timedelta(seconds=STALE_TICKET_SECONDS)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import User, Transcript, Tutorial
+from .models import User, Transcript, Tutorial, GenerationJob, VideoUpload
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -16,7 +16,29 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'username', 'email', 'github_id']
 
 
-class TranscriptSerializer(serializers.ModelSerializer):
+class TranscriptListSerializer(serializers.ModelSerializer):
+    """
+    Slim serializer for Transcript model
+    
+    Used for lists and nested representations. Phrases are replaced by
+    their statistics, so querysets using it should defer
+    `Transcript.PHRASE_FIELDS`.
+    """
+    # Nested serializer to include user information in transcript responses
+    user = UserSerializer(read_only=True)
+    has_video = serializers.BooleanField(read_only=True)
+    duration_seconds = serializers.FloatField(source='get_duration_seconds', read_only=True)
+    
+    class Meta:
+        model = Transcript
+        fields = [
+            'id', 'user', 'filename', 'video_file', 'has_video', 'timestamp', 'duration_in_ticks',
+            'duration_seconds', 'phrase_count', 'language', 'average_confidence', 'created_at'
+        ]
+        read_only_fields = ['id', 'user', 'filename', 'phrase_count', 'language', 'average_confidence']
+
+
+class TranscriptSerializer(TranscriptListSerializer):
     """
     Serializer for Transcript model
     
@@ -24,14 +46,13 @@ class TranscriptSerializer(serializers.ModelSerializer):
     Includes nested user data and makes most fields read-only since
     transcripts are uploaded as complete JSON files. Now supports
     optional video file upload alongside the transcript JSON.
+    Adds the full `phrases` to the slim representation.
     """
-    # Nested serializer to include user information in transcript responses
-    user = UserSerializer(read_only=True)
+    # Decoded from the compact phrase columns by the model
+    phrases = serializers.JSONField()
     
-    class Meta:
-        model = Transcript
-        fields = ['id', 'user', 'filename', 'video_file', 'timestamp', 'duration_in_ticks', 'phrases', 'created_at']
-        read_only_fields = ['id', 'user', 'filename']
+    class Meta(TranscriptListSerializer.Meta):
+        fields = TranscriptListSerializer.Meta.fields + ['phrases']
 
 
 class TutorialSerializer(serializers.ModelSerializer):
@@ -42,13 +63,42 @@ class TutorialSerializer(serializers.ModelSerializer):
     Includes nested transcript data with user information and enriched
     steps structure with associated assets.
     """
-    # Nested serializer to include full transcript information
-    transcript = TranscriptSerializer(read_only=True)
+    # Nested slim transcript: phrases are available from /api/transcripts/{id}/phrases/
+    transcript = TranscriptListSerializer(read_only=True)
     
     class Meta:
         model = Tutorial
         fields = [
             'id', 'transcript', 'title', 'introduction', 'steps', 'tips',
-            'summary', 'duration_estimate', 'tags', 'updated_at'
+            'summary', 'duration_estimate', 'tags', 'generation_model', 'generation_seconds', 'updated_at'
         ]
-        read_only_fields = ['id', 'transcript', 'updated_at'] 
\ No newline at end of file
+        read_only_fields = ['id', 'transcript', 'generation_model', 'generation_seconds', 'updated_at']
+
+
+class GenerationJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for GenerationJob model (read-only)
+    
+    Returned when a generation is queued and when clients poll its status.
+    The produced tutorial is referenced by id once the job has succeeded.
+    """
+    class Meta:
+        model = GenerationJob
+        fields = [
+            'id', 'kind', 'transcript', 'tutorial', 'section', 'step_index', 'force', 'status', 'error', 'attempts',
+            'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+
+class VideoUploadSerializer(serializers.ModelSerializer):
+    """
+    Serializer for VideoUpload model
+    
+    Clients create an upload with the video filename and total size, then
+    use `offset` to know where to send (or resume) the next chunk.
+    """
+    class Meta:
+        model = VideoUpload
+        fields = ['id', 'filename', 'size', 'offset', 'sha256', 'status', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'offset', 'sha256', 'status', 'created_at', 'updated_at']
@@ -1,5 +1,8 @@
 from .transcript_service import TranscriptService
 from .tutorial_service import TutorialService
 from .video_service import VideoClipService
+from .job_service import GenerationJobService
+from .upload_service import ChunkedUploadService
+from .bulk_import_service import BulkImportService
 
-__all__ = ['TranscriptService', 'TutorialService', 'VideoClipService'] 
\ No newline at end of file
+__all__ = ['TranscriptService', 'TutorialService', 'VideoClipService', 'GenerationJobService', 'ChunkedUploadService', 'BulkImportService'] 
\ No newline at end of file
@@ -0,0 +1,296 @@
+import atexit
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from rest_framework.serializers import ValidationError
+from ..models import Transcript
+from ..phrase_storage import encode_phrases
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# Per-item import outcomes
+STATUS_CREATED = 'created'      # New transcript inserted
+STATUS_EXISTS = 'exists'        # Already imported by this user, existing transcript returned
+STATUS_DUPLICATE = 'duplicate'  # Same content as an earlier item of this import
+STATUS_CONFLICT = 'conflict'    # Already imported by another user
+STATUS_INVALID = 'invalid'      # Malformed JSON or invalid transcript data
+STATUS_FAILED = 'failed'        # Not validated (worker process crashed), can be imported again
+
+ZIP_MAGIC = b'PK\x03\x04'
+
+# (name, raw JSON bytes) of one transcript to import
+ImportItem = Tuple[str, bytes]
+
+# Fewer items to validate are not worth sending to worker processes
+PARALLEL_MIN_ITEMS = 8
+
+# Process pool shared by all imports of this process, created on first use
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class BulkImportService:
+    """Service for importing many transcripts at once."""
+
+    @staticmethod
+    def import_file(user: User, upload: BinaryIO) -> List[Dict[str, Any]]:
+        """
+        Import the transcripts of a ZIP archive or NDJSON file.
+
+        ZIP archives are detected from their content; anything else is read
+        as NDJSON, one transcript object per line.
+
+        Args:
+            user: User who owns the imported transcripts
+            upload: ZIP or NDJSON file
+
+        Returns:
+            Per-item results, see `import_items`
+        """
+        upload.seek(0)
+        is_zip = upload.read(len(ZIP_MAGIC)) == ZIP_MAGIC
+        upload.seek(0)
+
+        if is_zip:
+            with zipfile.ZipFile(upload) as archive:
+                return BulkImportService.import_items(user, BulkImportService.iter_zip(archive))
+        return BulkImportService.import_items(user, BulkImportService.iter_ndjson(upload))
+
+    @staticmethod
+    def import_items(user: User, items: Iterable[ImportItem]) -> List[Dict[str, Any]]:
+        """
+        Validate and insert transcripts in batches.
+
+        For each batch of BULK_IMPORT_BATCH_SIZE items, fingerprints are
+        checked against the database in one query, the remaining items are
+        validated in parallel worker processes (in this process when there
+        are only a few) and the valid ones are inserted with a single bulk
+        insert. If a worker process dies, the items of its batch are
+        reported as failed and the pool is replaced for the next batch.
+
+        Args:
+            user: User who owns the imported transcripts
+            items: (name, raw JSON bytes) of each transcript
+
+        Returns:
+            One result per item, in input order: name, status (created, exists,
+            duplicate, conflict or invalid), transcript id when known and error
+            message for invalid and failed items
+        """
+        items = iter(items)
+        results = []
+        seen = {}
+
+        while batch := list(islice(items, settings.BULK_IMPORT_BATCH_SIZE)):
+            results.extend(BulkImportService._import_batch(user, batch, seen))
+
+        logger.info(f"Bulk import for user {user.id}: {BulkImportService.summarize(results)}")
+        return results
+
+    @staticmethod
+    def summarize(results: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Count import results by status."""
+        return dict(Counter(result['status'] for result in results))
+
+    @staticmethod
+    def iter_zip(archive: zipfile.ZipFile) -> Iterator[ImportItem]:
+        """Yield the JSON files of a ZIP archive, skipping oversized members."""
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or not name.lower().endswith('.json') or name.startswith('__MACOSX/'):
+                continue
+            if info.file_size > settings.BULK_IMPORT_MAX_ITEM_BYTES:
+                # Not decompressed: reported as invalid by the size check
+                yield name, b''
+                continue
+            yield name, archive.read(info)
+
+    @staticmethod
+    def iter_ndjson(stream: BinaryIO) -> Iterator[ImportItem]:
+        """Yield the non-empty lines of an NDJSON file, named after the file and line number."""
+        name = os.path.basename(getattr(stream, 'name', None) or 'import.ndjson')
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if line:
+                yield f"{name} line {number}", line
+
+    @staticmethod
+    def iter_directory(path: str) -> Iterator[ImportItem]:
+        """Yield the JSON files found under a directory, in path order."""
+        root = Path(path)
+        for file_path in sorted(root.rglob('*.json')):
+            if file_path.is_file():
+                yield str(file_path.relative_to(root)), file_path.read_bytes()
+
+    @staticmethod
+    def _import_batch(user: User, batch: List[ImportItem], seen: Dict[str, str]) -> List[Dict[str, Any]]:
+        """
+        Import one batch of items.
+
+        Args:
+            user: User who owns the imported transcripts
+            batch: Items of this batch
+            seen: Fingerprint to item name of items already handled by this import
+
+        Returns:
+            Results of the batch items, in order
+        """
+        results = [{'name': name} for name, _ in batch]
+        fingerprints = [hashlib.sha256(raw).hexdigest() for _, raw in batch]
+
+        existing = {
+            fingerprint: (transcript_id, user_id)
+            for fingerprint, transcript_id, user_id in Transcript.objects
+            .filter(fingerprint__in=set(fingerprints))
+            .values_list('fingerprint', 'id', 'user_id')
+        }
+
+        pending = []
+        for position, fingerprint in enumerate(fingerprints):
+            if fingerprint in seen:
+                results[position].update(status=STATUS_DUPLICATE, duplicate_of=seen[fingerprint])
+            elif fingerprint in existing:
+                seen[fingerprint] = batch[position][0]
+                results[position].update(BulkImportService._existing_result(existing[fingerprint], user))
+            else:
+                seen[fingerprint] = batch[position][0]
+                pending.append(position)
+
+        to_validate = [batch[position] for position in pending]
+        if settings.BULK_IMPORT_WORKERS > 1 and len(to_validate) >= PARALLEL_MIN_ITEMS:
+            try:
+                validated = list(BulkImportService._get_executor().map(validate_item, to_validate, chunksize=8))
+            except BrokenProcessPool as e:
+                logger.error(f"Bulk import worker crashed, {len(to_validate)} items not imported: {e}")
+                BulkImportService._reset_executor()
+                for position in pending:
+                    # Not imported: the same file can be imported again
+                    del seen[fingerprints[position]]
+                    results[position].update(status=STATUS_FAILED, error="Validation worker crashed, import again")
+                return results
+        else:
+            validated = [validate_item(item) for item in to_validate]
+
+        transcripts = {}
+        for position, (values, error) in zip(pending, validated):
+            if error:
+                results[position].update(status=STATUS_INVALID, error=error)
+                continue
+            transcripts[position] = Transcript(
+                user=user,
+                filename=os.path.basename(batch[position][0])[:255],
+                fingerprint=fingerprints[position],
+                **values
+            )
+
+        # Rows inserted concurrently by another request are skipped, then resolved below
+        Transcript.objects.bulk_create(transcripts.values(), ignore_conflicts=True)
+        inserted = set(
+            Transcript.objects
+            .filter(pk__in=[transcript.pk for transcript in transcripts.values()])
+            .values_list('pk', flat=True)
+        )
+
+        lost = {}
+        for position, transcript in transcripts.items():
+            if transcript.pk in inserted:
+                results[position].update(status=STATUS_CREATED, id=str(transcript.pk))
+            else:
+                lost[transcript.fingerprint] = position
+
+        if lost:
+            for fingerprint, transcript_id, user_id in (
+                Transcript.objects.filter(fingerprint__in=lost).values_list('fingerprint', 'id', 'user_id')
+            ):
+                results[lost[fingerprint]].update(BulkImportService._existing_result((transcript_id, user_id), user))
+
+        return results
+
+    @staticmethod
+    def _get_executor() -> ProcessPoolExecutor:
+        """
+        Return the validation process pool, creating it on first use.
+
+        Workers are spawned and set Django up once, then serve every import
+        of this process.
+        """
+        global _executor
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.BULK_IMPORT_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=django.setup,
+                )
+                atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+            return _executor
+
+    @staticmethod
+    def _reset_executor() -> None:
+        """Drop a broken process pool so the next batch starts a fresh one."""
+        global _executor
+        with _executor_lock:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+                _executor = None
+
+    @staticmethod
+    def _existing_result(existing: Tuple[Any, int], user: User) -> Dict[str, Any]:
+        """Result of an item whose fingerprint is already in the database."""
+        transcript_id, user_id = existing
+        if user_id != user.id:
+            return {'status': STATUS_CONFLICT, 'error': "Already uploaded by another user"}
+        return {'status': STATUS_EXISTS, 'id': str(transcript_id)}
+
+
+def validate_item(item: ImportItem) -> Tuple[Dict[str, Any], str]:
+    """
+    Parse and validate one transcript; runs in the import worker processes.
+
+    Phrases are returned already encoded for storage, which keeps the data
+    sent back to the parent process small.
+
+    Returns:
+        Tuple of (transcript field values, error message); the message is
+        empty when the transcript is valid
+    """
+    from .transcript_service import TranscriptService
+
+    name, raw = item
+    if not raw or len(raw) > settings.BULK_IMPORT_MAX_ITEM_BYTES:
+        return {}, f"File is empty or larger than {settings.BULK_IMPORT_MAX_ITEM_BYTES} bytes"
+
+    try:
+        values = TranscriptService.validate_file(ContentFile(raw, name=name))
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        return {}, f"Invalid JSON format: {e}"
+    except ValidationError as e:
+        return {}, _format_errors(e.detail)
+
+    values['phrase_data'], values['phrase_offsets'], values['phrase_durations'] = encode_phrases(values.pop('phrases'))
+    return values, ""
+
+
+def _format_errors(detail: Any) -> str:
+    """Flatten serializer errors into one line, e.g. "timestamp: This field is required." """
+    if isinstance(detail, dict):
+        return "; ".join(f"{field}: {_format_errors(errors)}" for field, errors in detail.items())
+    if isinstance(detail, list):
+        return " ".join(_format_errors(error) for error in detail)
+    return str(detail)
@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from typing import Dict, Iterable, List
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import Sum
+from django.utils import timezone
+from ..models import CachedClip, Transcript
+
+logger = logging.getLogger(__name__)
+
+# Read size used when hashing source videos
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Prefix of files being written, moved to their final name once complete
+PARTIAL_PREFIX = '.partial-'
+
+
+class ClipStoreService:
+    """Service for the content-addressed clip store shared across tutorials."""
+
+    @staticmethod
+    def get_source_hash(transcript: Transcript) -> str:
+        """
+        Return the SHA-256 of the transcript video, hashing the file on first use.
+
+        Args:
+            transcript: Transcript holding the video file
+
+        Returns:
+            Hex digest of the video file content
+        """
+        if not transcript.video_sha256:
+            digest = hashlib.sha256()
+            with open(transcript.video_file.path, 'rb') as video:
+                for chunk in iter(lambda: video.read(HASH_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+
+            transcript.video_sha256 = digest.hexdigest()
+            Transcript.objects.filter(pk=transcript.pk).update(video_sha256=transcript.video_sha256)
+
+        return transcript.video_sha256
+
+    @staticmethod
+    def make_key(source_hash: str, start: float, end: float, profile: str) -> str:
+        """Build the content address of a clip."""
+        return hashlib.sha256(f"{source_hash}:{start:.3f}:{end:.3f}:{profile}".encode()).hexdigest()
+
+    @staticmethod
+    def lookup(keys: Iterable[str]) -> Dict[str, CachedClip]:
+        """
+        Find stored clips for the given keys and mark them as recently used.
+
+        Args:
+            keys: Clip content addresses
+
+        Returns:
+            Mapping of key to CachedClip, for clips whose file is still on disk
+        """
+        found = {}
+        stale = []
+
+        for cached in CachedClip.objects.filter(key__in=list(keys)):
+            if os.path.exists(ClipStoreService._absolute_path(cached.path)):
+                found[cached.key] = cached
+            else:
+                stale.append(cached.pk)
+
+        if stale:
+            CachedClip.objects.filter(pk__in=stale).delete()
+        if found:
+            CachedClip.objects.filter(pk__in=[cached.pk for cached in found.values()]).update(last_used_at=timezone.now())
+
+        return found
+
+    @staticmethod
+    def link(source_path: str, target_path: str) -> None:
+        """
+        Make `target_path` point to the content of `source_path` without re-encoding.
+
+        Uses a hard link when possible, and falls back to a file copy when the
+        paths are on different filesystems. The link or copy is made under a
+        temporary name, then moved onto `target_path` in one step: readers
+        never see it missing, and an existing target (itself maybe a link to
+        a stored clip) is replaced rather than written through.
+        """
+        directory, filename = os.path.split(target_path)
+        partial_path = os.path.join(directory, f"{PARTIAL_PREFIX}{uuid.uuid4().hex[:8]}-{filename}")
+
+        try:
+            try:
+                os.link(source_path, partial_path)
+            except OSError:
+                shutil.copyfile(source_path, partial_path)
+            os.replace(partial_path, target_path)
+        except OSError:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+    @staticmethod
+    def restore(cached: CachedClip, target_path: str) -> None:
+        """Place a stored clip at `target_path` (a tutorial clips folder)."""
+        ClipStoreService.link(ClipStoreService._absolute_path(cached.path), target_path)
+
+    @staticmethod
+    def add(key: str, source_hash: str, start: float, end: float, profile: str, clip_path: str) -> None:
+        """
+        Add a freshly extracted clip to the store.
+
+        Args:
+            key: Clip content address from `make_key`
+            source_hash: SHA-256 of the source video
+            start: Clip start in seconds
+            end: Clip end in seconds
+            profile: Extraction profile used to produce the clip
+            clip_path: Path of the extracted clip
+        """
+        relative_path = os.path.join('clip_store', key[:2], f"{key}.mp4")
+        store_path = ClipStoreService._absolute_path(relative_path)
+        os.makedirs(os.path.dirname(store_path), exist_ok=True)
+        ClipStoreService.link(clip_path, store_path)
+
+        try:
+            CachedClip.objects.update_or_create(
+                key=key,
+                defaults={
+                    'source_sha256': source_hash,
+                    'start': start,
+                    'end': end,
+                    'profile': profile,
+                    'path': relative_path,
+                    'size_bytes': os.path.getsize(store_path),
+                    'last_used_at': timezone.now(),
+                },
+            )
+        except IntegrityError:
+            # Same clip stored concurrently by another worker: keep theirs
+            pass
+
+    @staticmethod
+    def evict() -> List[str]:
+        """
+        Delete least recently used clips until the store fits CLIP_STORE_MAX_BYTES.
+
+        Tutorial clips are hard links, so evicting a store entry never removes
+        a clip already used by a tutorial.
+
+        Returns:
+            Keys of the evicted clips
+        """
+        budget = settings.CLIP_STORE_MAX_BYTES
+        total = CachedClip.objects.aggregate(total=Sum('size_bytes'))['total'] or 0
+        evicted = []
+
+        if total <= budget:
+            return evicted
+
+        for cached in CachedClip.objects.order_by('last_used_at').iterator():
+            if total <= budget:
+                break
+
+            try:
+                os.remove(ClipStoreService._absolute_path(cached.path))
+            except FileNotFoundError:
+                pass
+
+            total -= cached.size_bytes
+            evicted.append(cached.key)
+            cached.delete()
+
+        logger.info(f"Evicted {len(evicted)} clips from the clip store")
+        return evicted
+
+    @staticmethod
+    def _absolute_path(relative_path: str) -> str:
+        """Resolve a store path relative to MEDIA_ROOT."""
+        return os.path.join(settings.MEDIA_ROOT, relative_path)
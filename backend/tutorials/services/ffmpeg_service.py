@@ -0,0 +1,161 @@
+"""
+Thin wrappers around the ffmpeg binary shipped with MoviePy.
+
+Used for operations MoviePy does not expose: keyframe listing and
+segment cutting by stream copy (no re-encode).
+"""
+import os
+import re
+import subprocess
+import tempfile
+from typing import Any, Dict, List
+from moviepy.config import FFMPEG_BINARY
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+PTS_TIME_PATTERN = re.compile(r'pts_time:(-?[0-9.]+)')
+AUDIO_CODEC_PATTERN = re.compile(r'Stream #\S+.*?: Audio: (\w+)')
+# Pixel format: first field after the codec description
+PIX_FMT_PATTERN = re.compile(r'Stream #\S+.*?: Video: [^,\n]*, (\w+)')
+# Format of segments written by `encode_segment`: only sources in this
+# format can be joined with copied segments
+ENCODED_VIDEO_CODEC = 'h264'
+ENCODED_VIDEO_PROFILE = 'High'
+ENCODED_PIX_FMT = 'yuv420p'
+ENCODED_AUDIO_CODEC = 'aac'
+# Decoder messages meaning the stream data is damaged or cut short
+CORRUPTION_MARKERS = ('Invalid data found when processing input', 'partial file', 'Truncating packet')
+
+
+class FFmpegService:
+    """Service for low-level ffmpeg operations on source videos."""
+
+    @staticmethod
+    def probe(path: str) -> Dict[str, Any]:
+        """
+        Read container and stream information of a video file.
+
+        Args:
+            path: Absolute path to the video file
+
+        Returns:
+            Dictionary of stream infos as parsed by MoviePy (duration, codecs, size, fps...)
+        """
+        return ffmpeg_parse_infos(path)
+
+    @staticmethod
+    def list_keyframes(path: str) -> List[float]:
+        """
+        List keyframe timestamps of the first video stream.
+
+        Args:
+            path: Absolute path to the video file
+
+        Returns:
+            Sorted list of keyframe timestamps in seconds
+        """
+        return FFmpegService.scan_keyframes(path)['keyframes']
+
+    @staticmethod
+    def scan_keyframes(path: str) -> Dict[str, Any]:
+        """
+        Scan the first video stream for keyframes.
+
+        Only keyframes are decoded, so this is much cheaper than a full decode.
+        The scan also reports the audio codec and pixel format, which MoviePy's
+        probe doesn't, and whether the decoder hit damaged or truncated data.
+
+        Args:
+            path: Absolute path to the video file
+
+        Returns:
+            Dictionary with sorted `keyframes` (seconds), `audio_codec` and
+            `pix_fmt` (or None) and `corrupted` (bool)
+        """
+        output = FFmpegService._run([
+            '-skip_frame', 'nokey', '-i', path,
+            '-map', '0:v:0', '-vf', 'showinfo', '-f', 'null', '-',
+        ])
+        audio_codec = AUDIO_CODEC_PATTERN.search(output)
+        pix_fmt = PIX_FMT_PATTERN.search(output)
+        return {
+            'keyframes': sorted({round(float(value), 3) for value in PTS_TIME_PATTERN.findall(output)}),
+            'audio_codec': audio_codec.group(1) if audio_codec else None,
+            'pix_fmt': pix_fmt.group(1) if pix_fmt else None,
+            'corrupted': any(marker in output for marker in CORRUPTION_MARKERS),
+        }
+
+    @staticmethod
+    def copy_segment(path: str, start: float, end: float, output: str) -> None:
+        """
+        Cut a segment without re-encoding; `start` must sit on a keyframe.
+
+        Args:
+            path: Source video path
+            start: Segment start in seconds (keyframe timestamp)
+            end: Segment end in seconds
+            output: Destination file path
+        """
+        FFmpegService._run([
+            '-ss', f'{start:.3f}', '-i', path, '-t', f'{end - start:.3f}',
+            '-map', '0:v:0', '-map', '0:a?', '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero', '-movflags', '+faststart', output,
+        ])
+
+    @staticmethod
+    def encode_segment(path: str, start: float, end: float, output: str) -> None:
+        """
+        Cut a segment with a frame-accurate H.264/AAC re-encode.
+
+        Args:
+            path: Source video path
+            start: Segment start in seconds
+            end: Segment end in seconds
+            output: Destination file path
+        """
+        FFmpegService._run([
+            '-ss', f'{start:.3f}', '-i', path, '-t', f'{end - start:.3f}',
+            '-map', '0:v:0', '-map', '0:a?', '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac', '-movflags', '+faststart', output,
+        ])
+
+    @staticmethod
+    def concat_segments(parts: List[str], output: str) -> None:
+        """
+        Join segments sharing the same codecs into one file without re-encoding.
+
+        Args:
+            parts: Ordered list of segment paths
+            output: Destination file path
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as listing:
+            for part in parts:
+                listing.write(f"file '{os.path.abspath(part)}'\n")
+
+        try:
+            FFmpegService._run([
+                '-f', 'concat', '-safe', '0', '-i', listing.name,
+                '-c', 'copy', '-movflags', '+faststart', output,
+            ])
+        finally:
+            os.remove(listing.name)
+
+    @staticmethod
+    def _run(args: List[str]) -> str:
+        """
+        Run ffmpeg with the given arguments.
+
+        Returns:
+            ffmpeg stderr output (where ffmpeg writes its logs)
+
+        Raises:
+            RuntimeError: If ffmpeg exits with a non-zero status
+        """
+        result = subprocess.run(
+            [FFMPEG_BINARY, '-hide_banner', '-nostdin', '-y', *args],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed ({result.returncode}): {result.stderr.strip()[-500:]}")
+        return result.stderr
@@ -0,0 +1,218 @@
+import logging
+import threading
+from datetime import timedelta
+from typing import Optional
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from ..models import GenerationJob, Transcript, Tutorial
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationJobService:
+    """Service for the database-backed tutorial generation queue."""
+
+    @staticmethod
+    def enqueue(transcript: Transcript, force: bool = False) -> GenerationJob:
+        """
+        Queue a tutorial generation for a transcript.
+
+        Args:
+            transcript: Source transcript for tutorial generation
+            force: Ask OpenAI again even if a cached completion exists
+
+        Returns:
+            Created GenerationJob in `queued` state
+        """
+        job = GenerationJob.objects.create(transcript=transcript, force=force)
+        logger.info(f"Queued generation job {job.id} for transcript {transcript.id}")
+        return job
+
+    @staticmethod
+    def enqueue_reclip(tutorial: Tutorial) -> GenerationJob:
+        """
+        Queue re-extraction of the clips of an edited tutorial.
+
+        A re-extraction reads the steps when it runs, so one already queued
+        for the tutorial covers this edit too and is returned instead.
+
+        Args:
+            tutorial: Tutorial whose step clip ranges changed
+
+        Returns:
+            GenerationJob in `queued` state
+        """
+        queued = GenerationJob.objects.filter(
+            kind=GenerationJob.KIND_RECLIP,
+            tutorial=tutorial,
+            status=GenerationJob.STATUS_QUEUED,
+        ).first()
+        if queued is not None:
+            return queued
+
+        job = GenerationJob.objects.create(
+            kind=GenerationJob.KIND_RECLIP,
+            transcript=tutorial.transcript,
+            tutorial=tutorial,
+        )
+        logger.info(f"Queued clip re-extraction job {job.id} for tutorial {tutorial.id}")
+        return job
+
+    @staticmethod
+    def enqueue_regenerate(tutorial: Tutorial, section: str, step_index: Optional[int] = None, force: bool = False) -> GenerationJob:
+        """
+        Queue the regeneration of one section of a tutorial.
+
+        Args:
+            tutorial: Tutorial to update
+            section: One of GenerationJob.SECTION_CHOICES
+            step_index: Index of the step to rewrite, for the step section
+            force: Ask OpenAI again even if a cached completion exists
+
+        Returns:
+            Created GenerationJob in `queued` state
+        """
+        job = GenerationJob.objects.create(
+            kind=GenerationJob.KIND_REGENERATE,
+            transcript=tutorial.transcript,
+            tutorial=tutorial,
+            section=section,
+            step_index=step_index,
+            force=force,
+        )
+        logger.info(f"Queued regeneration job {job.id} of {section} for tutorial {tutorial.id}")
+        return job
+
+    @staticmethod
+    def claim_next(worker: str) -> Optional[GenerationJob]:
+        """
+        Atomically take the oldest queued job.
+
+        The claim is a conditional UPDATE on the job status, so concurrent
+        workers never run the same job, on PostgreSQL as well as SQLite.
+        A clip re-extraction stays queued while another one of the same
+        tutorial runs (`one_running_reclip_per_tutorial` constraint).
+
+        Args:
+            worker: Identifier of the claiming worker
+
+        Returns:
+            Claimed GenerationJob in `running` state, or None if the queue is empty
+        """
+        candidates = (
+            GenerationJob.objects
+            .filter(status=GenerationJob.STATUS_QUEUED)
+            .order_by('created_at')
+            .values_list('pk', flat=True)[:10]
+        )
+
+        for pk in candidates:
+            now = timezone.now()
+            try:
+                with transaction.atomic():
+                    claimed = GenerationJob.objects.filter(pk=pk, status=GenerationJob.STATUS_QUEUED).update(
+                        status=GenerationJob.STATUS_RUNNING,
+                        worker=worker,
+                        started_at=now,
+                        heartbeat_at=now,
+                        attempts=F('attempts') + 1,
+                    )
+            except IntegrityError:
+                # Another re-extraction of the same tutorial is running
+                continue
+            if claimed:
+                return GenerationJob.objects.select_related('transcript', 'tutorial').get(pk=pk)
+
+        return None
+
+    @staticmethod
+    def run(job: GenerationJob) -> None:
+        """
+        Run a claimed job and record its outcome.
+
+        A heartbeat is refreshed in the background while the job runs so
+        that `requeue_stale` can tell slow jobs from dead workers.
+
+        Args:
+            job: Job in `running` state, claimed by this worker
+        """
+        from .tutorial_service import TutorialService
+        from .video_service import VideoClipService
+
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(
+            target=GenerationJobService._heartbeat,
+            args=(job.pk, stop_heartbeat),
+            daemon=True,
+        )
+        heartbeat.start()
+
+        try:
+            if job.kind in (GenerationJob.KIND_RECLIP, GenerationJob.KIND_REGENERATE) and job.tutorial is None:
+                raise ValueError("Tutorial was deleted")
+            if job.kind == GenerationJob.KIND_RECLIP:
+                tutorial = job.tutorial
+                VideoClipService.sync_clips(tutorial)
+            elif job.kind == GenerationJob.KIND_REGENERATE:
+                tutorial = TutorialService.regenerate_section(job.tutorial, job.section, job.step_index, force=job.force)
+            else:
+                tutorial = TutorialService.create_from_transcript(job.transcript, force=job.force)
+        except Exception as e:
+            logger.error(f"Generation job {job.id} failed: {e}")
+            GenerationJob.objects.filter(pk=job.pk).update(
+                status=GenerationJob.STATUS_FAILED,
+                error=str(e)[:1000],
+                finished_at=timezone.now(),
+            )
+        else:
+            logger.info(f"Generation job {job.id} ({job.kind}) done for tutorial {tutorial.id}")
+            GenerationJob.objects.filter(pk=job.pk).update(
+                status=GenerationJob.STATUS_SUCCEEDED,
+                tutorial=tutorial,
+                error="",
+                finished_at=timezone.now(),
+            )
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+
+    @staticmethod
+    def requeue_stale() -> int:
+        """
+        Recover jobs whose worker stopped sending heartbeats.
+
+        Jobs are queued again while they have attempts left
+        (`GENERATION_JOB_MAX_ATTEMPTS`), and marked failed otherwise.
+
+        Returns:
+            Number of recovered jobs
+        """
+        deadline = timezone.now() - timedelta(seconds=settings.GENERATION_JOB_STALE_SECONDS)
+        stale = GenerationJob.objects.filter(status=GenerationJob.STATUS_RUNNING, heartbeat_at__lt=deadline)
+
+        requeued = stale.filter(attempts__lt=settings.GENERATION_JOB_MAX_ATTEMPTS).update(
+            status=GenerationJob.STATUS_QUEUED,
+            worker="",
+        )
+        failed = stale.update(
+            status=GenerationJob.STATUS_FAILED,
+            error="Worker stopped responding",
+            finished_at=timezone.now(),
+        )
+
+        if requeued or failed:
+            logger.warning(f"Recovered stale generation jobs: {requeued} requeued, {failed} failed")
+        return requeued + failed
+
+    @staticmethod
+    def _heartbeat(job_pk, stop: threading.Event) -> None:
+        """Refresh the job heartbeat until `stop` is set."""
+        interval = settings.GENERATION_JOB_HEARTBEAT_SECONDS
+        try:
+            while not stop.wait(interval):
+                GenerationJob.objects.filter(pk=job_pk).update(heartbeat_at=timezone.now())
+        finally:
+            # The thread has its own database connection
+            connection.close()
@@ -1,13 +1,29 @@
-import json
 import hashlib
-from typing import Optional
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import UploadedFile
-from ..models import Transcript
+from django.db import IntegrityError, transaction
+from rest_framework.serializers import ValidationError
+from ..models import Transcript, VideoUpload
+from ..phrase_storage import PHRASE_OFFSET_KEYS, PHRASE_TEXT_KEYS
 from ..serializers import TranscriptSerializer
+from ..streaming_json import END, FIELD, ITEM, iter_object
+from .upload_service import ChunkedUploadService
+from .video_probe_service import VideoProbeService, VideoProbeError
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
+# Size of the pieces read from uploaded transcript files
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class TranscriptConflict(Exception):
+    """Raised when the uploaded transcript already belongs to another user."""
+
 
 class TranscriptService:
     """Service for handling transcript creation and processing."""
@@ -16,38 +32,274 @@ class TranscriptService:
     def create_from_file(
         user: User, 
         json_file: UploadedFile, 
-        video_file: Optional[UploadedFile] = None
-    ) -> Transcript:
+        video_file: Optional[UploadedFile] = None,
+        video_upload: Optional[VideoUpload] = None
+    ) -> Tuple[Transcript, bool]:
         """
         Create transcript from uploaded JSON file with optional video.
         
+        The file fingerprint is checked first: re-uploading a known transcript
+        returns the existing one without parsing or validating it again. A
+        video sent along is attached to it when it has none or a different one.
+        
         Args:
             user: User who owns the transcript
             json_file: JSON file containing transcript data
             video_file: Optional video file
+            video_upload: Optional completed chunked upload, moved to the transcript
             
         Returns:
-            Created Transcript instance
+            Tuple of (transcript, created), created is False for a re-upload
             
         Raises:
             json.JSONDecodeError: If JSON is malformed
-            ValidationError: If transcript data is invalid
+            ValidationError: If transcript data is invalid or the video is unreadable
+            TranscriptConflict: If another user already uploaded this transcript
         """
-        # Parse JSON and generate fingerprint
-        raw_data = json_file.read()
-        transcript_data = json.loads(raw_data)
-        fingerprint = hashlib.sha256(raw_data).hexdigest()
+        fingerprint = TranscriptService.compute_fingerprint(json_file)
+        existing = Transcript.objects.filter(fingerprint=fingerprint).first()
+        if existing is not None:
+            existing = TranscriptService._get_duplicate(existing, user)
+            TranscriptService._attach_to_existing(existing, video_file, video_upload)
+            return existing, False
         
-        # Validate data structure
-        serializer = TranscriptSerializer(data=transcript_data)
-        serializer.is_valid(raise_exception=True)
+        values = TranscriptService.validate_file(json_file)
         
         # Create transcript instance
-        transcript = serializer.save(
-            user=user,
-            filename=json_file.name,
-            fingerprint=fingerprint,
-            video_file=video_file
+        try:
+            with transaction.atomic():
+                transcript = Transcript.objects.create(
+                    user=user,
+                    filename=json_file.name,
+                    fingerprint=fingerprint,
+                    **values
+                )
+        except IntegrityError:
+            # Same file uploaded concurrently: the other request won
+            existing = Transcript.objects.filter(fingerprint=fingerprint).first()
+            if existing is None:
+                raise
+            existing = TranscriptService._get_duplicate(existing, user)
+            TranscriptService._attach_to_existing(existing, video_file, video_upload)
+            return existing, False
+        
+        if video_file is not None or video_upload is not None:
+            TranscriptService.attach_video(transcript, video_file, video_upload)
+        
+        return transcript, True
+    
+    @staticmethod
+    def attach_video(
+        transcript: Transcript,
+        video_file: Optional[UploadedFile] = None,
+        video_upload: Optional[VideoUpload] = None,
+        created: bool = True
+    ) -> None:
+        """
+        Store the transcript video, reusing an identical video already stored.
+        
+        Videos are identified by their SHA-256. A known video is neither
+        stored nor probed again: the transcript points to the existing file
+        and copies its index.
+        
+        Args:
+            transcript: Transcript receiving the video
+            video_file: Video file sent with the transcript
+            video_upload: Completed chunked upload, used instead of `video_file`
+            created: Whether the transcript was just created; an existing one
+                keeps its previous video if the new one is unreadable
+            
+        Raises:
+            ValidationError: If the video is unreadable; a new transcript is deleted
+        """
+        video_sha256 = video_upload.sha256 if video_upload is not None else TranscriptService.compute_fingerprint(video_file)
+        previous = (transcript.video_file.name, transcript.video_sha256, transcript.video_info)
+        
+        source = (
+            Transcript.objects
+            .filter(video_sha256=video_sha256, video_info__isnull=False)
+            .exclude(video_file='')
+            .exclude(pk=transcript.pk)
+            .first()
         )
+        if source is not None:
+            logger.info(f"Transcript {transcript.id} reuses the video of transcript {source.id}")
+            transcript.video_file.name = source.video_file.name
+            transcript.video_sha256 = video_sha256
+            transcript.video_info = source.video_info
+            transcript.save(update_fields=['video_file', 'video_sha256', 'video_info'])
+            if video_upload is not None:
+                ChunkedUploadService.discard(video_upload)
+            return
+        
+        if video_upload is not None:
+            ChunkedUploadService.attach(video_upload, transcript)
+        else:
+            transcript.video_file.save(video_file.name, video_file, save=False)
+            transcript.video_sha256 = video_sha256
+            transcript.save(update_fields=['video_file', 'video_sha256'])
+        
+        # Probe and index the video now so bad files are rejected at upload
+        try:
+            VideoProbeService.index(transcript)
+        except VideoProbeError as e:
+            transcript.video_file.delete(save=False)
+            if created:
+                transcript.delete()
+            else:
+                transcript.video_file.name, transcript.video_sha256, transcript.video_info = previous
+                transcript.save(update_fields=['video_file', 'video_sha256', 'video_info'])
+            raise ValidationError({'video_file': [str(e)]})
+    
+    @staticmethod
+    def compute_fingerprint(uploaded_file: UploadedFile) -> str:
+        """Return the SHA-256 of an uploaded file, read in chunks."""
+        hasher = hashlib.sha256()
+        for chunk in uploaded_file.chunks(READ_CHUNK_SIZE):
+            hasher.update(chunk)
+        return hasher.hexdigest()
+    
+    @staticmethod
+    def validate_file(json_file: UploadedFile) -> Dict[str, Any]:
+        """
+        Parse and validate a transcript file.
+        
+        Args:
+            json_file: JSON file containing transcript data
+            
+        Returns:
+            Transcript field values: validated fields, phrases and phrase statistics
+            
+        Raises:
+            json.JSONDecodeError: If JSON is malformed
+            ValidationError: If transcript data is invalid
+        """
+        # Parse JSON and validate phrases in one pass
+        transcript_data = TranscriptService.read_transcript_file(json_file)
+        phrases = transcript_data.pop('phrases', None)
+        
+        # Validate the other fields; phrases were checked one by one while parsing
+        serializer = TranscriptSerializer(data={
+            **transcript_data,
+            **({'phrases': []} if phrases is not None else {})
+        })
+        serializer.is_valid(raise_exception=True)
+        
+        return {
+            **serializer.validated_data,
+            'phrases': phrases,
+            **TranscriptService.summarize_phrases(phrases)
+        }
+    
+    @staticmethod
+    def read_transcript_file(json_file: UploadedFile) -> Dict[str, Any]:
+        """
+        Parse a transcript JSON file in bounded memory.
+        
+        The file is read and parsed in chunks, so the raw bytes are never
+        loaded whole, and each phrase is validated as soon as it is parsed,
+        so invalid files fail early.
+        
+        Args:
+            json_file: JSON file containing transcript data
+            
+        Returns:
+            Parsed transcript data
+            
+        Raises:
+            json.JSONDecodeError: If JSON is malformed
+            ValidationError: If a phrase is invalid
+        """
+        transcript_data = {}
+        phrases = []
         
-        return transcript 
\ No newline at end of file
+        for kind, key, value in iter_object(json_file.chunks(READ_CHUNK_SIZE), stream_keys=['phrases']):
+            if kind == ITEM:
+                phrases.append(TranscriptService.validate_phrase(value, len(phrases)))
+            elif kind == END:
+                transcript_data[key] = phrases
+            elif kind == FIELD:
+                transcript_data[key] = value
+        
+        return transcript_data
+    
+    @staticmethod
+    def validate_phrase(phrase: Any, index: int) -> Dict[str, Any]:
+        """
+        Check that a phrase has a start offset and a text.
+        
+        Args:
+            phrase: Parsed phrase
+            index: Position of the phrase, used in error messages
+            
+        Returns:
+            The phrase, unchanged
+            
+        Raises:
+            ValidationError: If the phrase is invalid
+        """
+        def invalid(reason: str):
+            return ValidationError({'phrases': [f"Phrase {index}: {reason}"]})
+        
+        if not isinstance(phrase, dict):
+            raise invalid("must be an object")
+        
+        offset = next((phrase[key] for key in PHRASE_OFFSET_KEYS if key in phrase), None)
+        if not isinstance(offset, (int, float)) or isinstance(offset, bool) or offset < 0:
+            raise invalid(f"{PHRASE_OFFSET_KEYS[0]} must be a non-negative number")
+        
+        text = next((phrase[key] for key in PHRASE_TEXT_KEYS if key in phrase), None)
+        if not isinstance(text, str):
+            raise invalid(f"{PHRASE_TEXT_KEYS[0]} must be a string")
+        
+        return phrase
+    
+    @staticmethod
+    def summarize_phrases(phrases: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Compute the phrase statistics stored on the transcript.
+        
+        Args:
+            phrases: Validated transcript phrases
+            
+        Returns:
+            Dictionary with phrase_count, language (most common locale) and average_confidence
+        """
+        locales = Counter(phrase['locale'] for phrase in phrases if phrase.get('locale'))
+        confidences = [
+            phrase['confidence'] for phrase in phrases
+            if isinstance(phrase.get('confidence'), (int, float))
+        ]
+        
+        return {
+            'phrase_count': len(phrases),
+            'language': locales.most_common(1)[0][0][:35] if locales else "",
+            'average_confidence': sum(confidences) / len(confidences) if confidences else None,
+        }
+    
+    @staticmethod
+    def _attach_to_existing(
+        transcript: Transcript,
+        video_file: Optional[UploadedFile],
+        video_upload: Optional[VideoUpload]
+    ) -> None:
+        """Attach a video re-uploaded with a known transcript, unless it is the one it already has."""
+        if video_file is None and video_upload is None:
+            return
+
+        video_sha256 = video_upload.sha256 if video_upload is not None else TranscriptService.compute_fingerprint(video_file)
+        if transcript.video_file and transcript.video_sha256 == video_sha256:
+            if video_upload is not None:
+                ChunkedUploadService.discard(video_upload)
+            return
+
+        logger.info(f"Attaching the video re-uploaded with transcript {transcript.id}")
+        TranscriptService.attach_video(transcript, video_file, video_upload, created=False)
+
+    @staticmethod
+    def _get_duplicate(existing: Transcript, user: User) -> Transcript:
+        """Return an already uploaded transcript if it belongs to `user`."""
+        if existing.user_id != user.id:
+            raise TranscriptConflict("This transcript was already uploaded by another user")
+        logger.info(f"Transcript {existing.id} re-uploaded by user {user.id}, skipping import")
+        return existing
@@ -1,11 +1,23 @@
+import asyncio
 import logging
+import math
 import os
-from typing import Dict, Any
-from django.db import transaction
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from ..models import Tutorial, Transcript
-from ..openai_client import generate_tutorial_from_transcript
+from django.db import transaction
+from ..models import GenerationJob, Tutorial, Transcript
+from ..openai_client import (
+    RESTART,
+    astream_tutorial_from_transcript,
+    generate_tutorial_from_transcript,
+    generate_tutorial_section,
+    stream_tutorial_from_transcript,
+)
+from ..prompt_builder import format_seconds
+from ..streaming_json import FIELD, ITEM
 from .video_service import VideoClipService
+from .video_probe_service import VideoProbeService
 from .html_service import HtmlService
 
 logger = logging.getLogger(__name__)
@@ -15,12 +27,16 @@ class TutorialService:
     """Service for tutorial generation and processing."""
     
     @staticmethod
-    def create_from_transcript(transcript: Transcript) -> Tutorial:
+    def create_from_transcript(transcript: Transcript, force: bool = False) -> Tutorial:
         """
-        Generate tutorial from transcript using OpenAI with atomic transaction.
+        Generate tutorial from transcript using OpenAI and extract its video clips.
+        
+        Clip extraction runs outside any database transaction; if it fails
+        the tutorial is deleted so no half-processed tutorial is left behind.
         
         Args:
             transcript: Source transcript for tutorial generation
+            force: Bypass the OpenAI response cache
             
         Returns:
             Created Tutorial instance with processed video clips
@@ -30,32 +46,321 @@ class TutorialService:
         """
         try:
             # Generate tutorial structure with OpenAI
-            tutorial_data = generate_tutorial_from_transcript(transcript.phrases)
+            tutorial_data = generate_tutorial_from_transcript(transcript.phrases, force=force)
+            return TutorialService.save_generated(transcript, tutorial_data)
             
-            # Create tutorial and extract clips atomically
-            with transaction.atomic():
-                tutorial = Tutorial.objects.create(
-                    transcript=transcript,
-                    title=tutorial_data['title'],
-                    introduction=tutorial_data['introduction'],
-                    steps=tutorial_data['steps'],
-                    tips=tutorial_data.get('tips', []),
-                    summary=tutorial_data['summary'],
-                    duration_estimate=tutorial_data['duration_estimate'],
-                    tags=tutorial_data['tags'],
-                )
-                
-                # Extract video clips if video is available
-                if transcript.video_file:
-                    VideoClipService.extract_clips(tutorial, transcript)
+        except Exception as e:
+            logger.error(f"Tutorial generation failed for transcript {transcript.id}: {e}")
+            raise 
+    
+    @staticmethod
+    def stream_from_transcript(transcript: Transcript, force: bool = False) -> Iterator[Tuple[str, Any]]:
+        """
+        Generate a tutorial like `create_from_transcript`, reporting its parts as they arrive.
+        
+        Each step is yielded as soon as the model finished writing it, and
+        its clip starts being cut into the clip store right away, while later
+        steps are still being generated. Once the tutorial is complete it is
+        saved and its clips are linked from the store.
+        
+        Args:
+            transcript: Source transcript for tutorial generation
+            force: Bypass the OpenAI response cache
+            
+        Yields:
+            (event, data) pairs:
+            - ('field', {'name', 'value'}) for each tutorial field except steps
+            - ('step', step) for each step, with its clip range clamped to the video
+            - ('clip', {'index', 'status'}) when the clip of a step is cut ('ready' or 'failed')
+            - ('restart', {'model'}) when the answer was unusable and `model` writes it again:
+              the fields and steps sent so far are to be dropped
+            - ('tutorial', Tutorial) once the tutorial and its clips are saved
+            
+        Raises:
+            Exception: If OpenAI generation or video processing fails
+        """
+        phrases, duration = TutorialService._load_generation_input(transcript)
+        tutorial_data = {}
+        steps = []
+        prefetches = []
+        
+        try:
+            for kind, name, value in stream_tutorial_from_transcript(phrases, force=force):
+                if kind == FIELD:
+                    tutorial_data[name] = value
+                    yield 'field', {'name': name, 'value': value}
+                elif kind == ITEM:
+                    step = value
+                    if duration is not None:
+                        step = VideoProbeService.clamp_clip_ranges([step], duration)[0]
+                    steps.append(step)
+                    yield 'step', step
+                    
+                    try:
+                        prefetch = VideoClipService.prefetch_clip(transcript, step)
+                    except Exception as e:
+                        # Only an optimization: the clip is cut with the others when saving
+                        logger.warning(f"Could not prefetch the clip of step {len(steps)}: {e}")
+                        prefetch = None
+                    if prefetch is not None:
+                        prefetches.append((step, prefetch))
+                elif kind == RESTART:
+                    TutorialService._restart(tutorial_data, steps, prefetches)
+                    yield 'restart', {'model': value}
                 
-                logger.info(f"Created tutorial {tutorial.id} for transcript {transcript.id}")
+                yield from TutorialService._finish_prefetches(prefetches, wait=False)
+            
+            yield from TutorialService._finish_prefetches(prefetches, wait=True)
+            tutorial = TutorialService.save_generated(transcript, {**tutorial_data, 'steps': steps})
+            
+        except Exception as e:
+            logger.error(f"Tutorial generation failed for transcript {transcript.id}: {e}")
+            raise
+        finally:
+            for _, prefetch in prefetches:
+                VideoClipService.cancel_prefetch(prefetch)
+        
+        yield 'tutorial', tutorial
+    
+    @staticmethod
+    async def astream_from_transcript(transcript: Transcript, force: bool = False) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Async version of `stream_from_transcript`, yielding the same events.
+        
+        The completion is streamed on the event loop. Database access, clip
+        cutting and saving are handed to threads and the clip process pool,
+        so the loop keeps serving other streams meanwhile.
+        """
+        phrases, duration = await sync_to_async(TutorialService._load_generation_input)(transcript)
+        tutorial_data = {}
+        steps = []
+        prefetches = []
+        
+        try:
+            async for kind, name, value in astream_tutorial_from_transcript(phrases, force=force):
+                if kind == FIELD:
+                    tutorial_data[name] = value
+                    yield 'field', {'name': name, 'value': value}
+                elif kind == ITEM:
+                    step = value
+                    if duration is not None:
+                        step = VideoProbeService.clamp_clip_ranges([step], duration)[0]
+                    steps.append(step)
+                    yield 'step', step
+                    
+                    try:
+                        prefetch = await sync_to_async(VideoClipService.prefetch_clip)(transcript, step)
+                    except Exception as e:
+                        # Only an optimization: the clip is cut with the others when saving
+                        logger.warning(f"Could not prefetch the clip of step {len(steps)}: {e}")
+                        prefetch = None
+                    if prefetch is not None:
+                        prefetches.append((step, prefetch))
+                elif kind == RESTART:
+                    TutorialService._restart(tutorial_data, steps, prefetches)
+                    yield 'restart', {'model': value}
                 
-            return tutorial
+                for event in await TutorialService._afinish_prefetches(prefetches, wait=False):
+                    yield event
+            
+            for event in await TutorialService._afinish_prefetches(prefetches, wait=True):
+                yield event
+            tutorial = await sync_to_async(TutorialService.save_generated)(transcript, {**tutorial_data, 'steps': steps})
             
         except Exception as e:
             logger.error(f"Tutorial generation failed for transcript {transcript.id}: {e}")
-            raise 
+            raise
+        finally:
+            for _, prefetch in prefetches:
+                VideoClipService.cancel_prefetch(prefetch)
+        
+        yield 'tutorial', tutorial
+    
+    @staticmethod
+    def save_generated(transcript: Transcript, tutorial_data: Dict[str, Any]) -> Tutorial:
+        """
+        Save a generated tutorial and extract its video clips.
+        
+        Args:
+            transcript: Source transcript of the tutorial
+            tutorial_data: Tutorial structure returned by the model
+            
+        Returns:
+            Created Tutorial instance with processed video clips
+        """
+        steps = tutorial_data['steps']
+        
+        # Validate clip ranges against the indexed video before any decoder starts
+        if transcript.video_file:
+            video_info = VideoProbeService.get_info(transcript)
+            steps = VideoProbeService.clamp_clip_ranges(steps, video_info['duration'])
+        
+        tutorial = Tutorial.objects.create(
+            transcript=transcript,
+            title=tutorial_data['title'],
+            introduction=tutorial_data['introduction'],
+            steps=steps,
+            tips=tutorial_data.get('tips', []),
+            summary=tutorial_data['summary'],
+            duration_estimate=tutorial_data['duration_estimate'],
+            tags=tutorial_data['tags'],
+            generation_model=tutorial_data.get('generation_model', ''),
+            generation_seconds=tutorial_data.get('generation_seconds'),
+        )
+        
+        # Extract video clips if video is available
+        if transcript.video_file:
+            try:
+                VideoClipService.extract_clips(tutorial, transcript)
+            except Exception:
+                tutorial.delete()
+                raise
+        
+        logger.info(f"Created tutorial {tutorial.id} for transcript {transcript.id}")
+        return tutorial
+    
+    @staticmethod
+    def regenerate_section(tutorial: Tutorial, section: str, step_index: Optional[int] = None, force: bool = False) -> Tutorial:
+        """
+        Rewrite one section of a tutorial, leaving the rest of it as it is.
+        
+        The model gets the current tutorial and only the phrases the section
+        is written from: those around the step for a step, those following
+        each step for the tips, none for the summary and the title. A
+        rewritten step keeps its index, and its clip when the range did not
+        change; otherwise only its clip is cut again.
+        
+        Args:
+            tutorial: Tutorial to update
+            section: One of GenerationJob.SECTION_CHOICES
+            step_index: Index of the step to rewrite, for the step section
+            force: Bypass the OpenAI response cache
+            
+        Returns:
+            Updated Tutorial instance
+            
+        Raises:
+            ValueError: If the step does not exist or the answer is invalid
+        """
+        transcript = tutorial.transcript
+        steps = tutorial.steps
+        window = settings.OPENAI_SECTION_WINDOW_SECONDS
+        details = {}
+        
+        if section == GenerationJob.SECTION_STEP:
+            position = TutorialService._find_step(steps, step_index)
+            timestamp = float(steps[position].get('timestamp') or 0)
+            # Between the neighbouring steps, at most `window` seconds away
+            start = max(float(steps[position - 1].get('timestamp') or 0) if position else 0.0, timestamp - window, 0.0)
+            end = min(float(steps[position + 1].get('timestamp') or 0) if position + 1 < len(steps) else math.inf, timestamp + window)
+            # Steps edited out of time order still get the phrases around them
+            start, end = min(start, timestamp), max(end, timestamp)
+            phrases = transcript.phrases_between(start, end)
+            details = {'index': step_index, 'start': format_seconds(start * 1000), 'end': format_seconds(end * 1000)}
+        elif section == GenerationJob.SECTION_TIPS:
+            # What is said from each step on, up to the next one or `window` seconds later
+            phrases, seen = [], set()
+            for position, step in enumerate(steps):
+                start = float(step.get('timestamp') or 0)
+                end = start + window
+                if position + 1 < len(steps):
+                    end = min(end, float(steps[position + 1].get('timestamp') or 0))
+                for phrase in transcript.phrases_between(start, max(start, end)):
+                    # Phrases are shared by the windows they overlap
+                    if id(phrase) not in seen:
+                        seen.add(id(phrase))
+                        phrases.append(phrase)
+        else:
+            phrases = []
+        
+        context = {
+            'title': tutorial.title,
+            'introduction': tutorial.introduction,
+            'steps': steps,
+            'tips': tutorial.tips,
+            'summary': tutorial.summary,
+            'tags': tutorial.tags,
+        }
+        fields = generate_tutorial_section(section, context, phrases, force=force, **details)
+        
+        if section == GenerationJob.SECTION_STEP:
+            step = {'index': step_index, **fields['step']}
+            if transcript.video_file and 'video_clip' in step:
+                step = VideoProbeService.clamp_clip_ranges([step], VideoProbeService.get_info(transcript)['duration'])[0]
+        
+        with transaction.atomic():
+            current = Tutorial.objects.select_for_update().get(pk=tutorial.pk)
+            if section == GenerationJob.SECTION_STEP:
+                # Looked up again: steps may have been edited while the model answered
+                position = TutorialService._find_step(current.steps, step_index)
+                previous = current.steps[position].get('video_clip')
+                if isinstance(previous, dict) and isinstance(step.get('video_clip'), dict) and (
+                    (previous.get('start'), previous.get('end')) == (step['video_clip']['start'], step['video_clip']['end'])
+                ):
+                    # Same range: keep the clip already cut
+                    step['video_clip'] = previous
+                current.steps[position] = step
+                fields = {'steps': current.steps}
+            for name, value in fields.items():
+                setattr(current, name, value)
+            current.save(update_fields=[*fields, 'updated_at'])
+        
+        if section == GenerationJob.SECTION_STEP:
+            # Cuts the new clip, if any, and removes the previous one
+            VideoClipService.sync_clips(current)
+        
+        logger.info(f"Regenerated {section} of tutorial {tutorial.id}")
+        return current
+    
+    @staticmethod
+    def _find_step(steps: List[Any], index: Optional[int]) -> int:
+        """Position of the step with `index` in `steps`."""
+        for position, step in enumerate(steps):
+            if isinstance(step, dict) and step.get('index') == index:
+                return position
+        raise ValueError(f"Tutorial has no step {index}")
+    
+    @staticmethod
+    def _load_generation_input(transcript: Transcript) -> Tuple[List[Dict[str, Any]], Optional[float]]:
+        """Return the phrases of a transcript and the duration of its video (None without video)."""
+        duration = VideoProbeService.get_info(transcript)['duration'] if transcript.video_file else None
+        return transcript.phrases, duration
+    
+    @staticmethod
+    async def _afinish_prefetches(prefetches: List[Tuple[Dict[str, Any], Dict[str, Any]]], wait: bool) -> List[Tuple[str, Any]]:
+        """Async version of `_finish_prefetches`, returning the 'clip' events."""
+        if wait and prefetches:
+            # Wait on the event loop rather than in a thread
+            await asyncio.gather(*(asyncio.wrap_future(prefetch['future']) for _, prefetch in prefetches), return_exceptions=True)
+        if not any(prefetch['future'].done() for _, prefetch in prefetches):
+            return []
+        return await sync_to_async(lambda: list(TutorialService._finish_prefetches(prefetches, wait=False)))()
+    
+    @staticmethod
+    def _restart(tutorial_data: Dict[str, Any], steps: List[Dict[str, Any]], prefetches: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> None:
+        """Forget a streamed tutorial the model answers again, and drop the clips cut for it."""
+        for _, prefetch in prefetches:
+            VideoClipService.cancel_prefetch(prefetch)
+        prefetches.clear()
+        tutorial_data.clear()
+        steps.clear()
+    
+    @staticmethod
+    def _finish_prefetches(prefetches: List[Tuple[Dict[str, Any], Dict[str, Any]]], wait: bool) -> Iterator[Tuple[str, Any]]:
+        """
+        Store the prefetched clips that are ready and report them as 'clip' events.
+        
+        Args:
+            prefetches: (step, prefetch) pairs still pending, finished ones are removed
+            wait: Wait for all of them instead of only taking those already done
+        """
+        for item in list(prefetches):
+            step, prefetch = item
+            if not wait and not prefetch['future'].done():
+                continue
+            prefetches.remove(item)
+            stored = VideoClipService.finish_prefetch(prefetch)
+            yield 'clip', {'index': step.get('index'), 'status': 'ready' if stored else 'failed'}
     
     @staticmethod
     def generate_html(tutorial: Tutorial) -> str:
@@ -0,0 +1,274 @@
+import glob
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import uuid
+from datetime import timedelta
+from typing import BinaryIO, Optional
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.serializers import ValidationError
+from ..models import Transcript, VideoUpload
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# Read size when streaming request bodies and re-hashing partial files
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Running SHA-256 of uploads handled by this process: {upload id: (offset, hash)}
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+class UploadConflict(Exception):
+    """Raised when a chunk doesn't start at the committed offset of its upload."""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class ChunkedUploadService:
+    """Service for chunked, resumable video uploads."""
+
+    @staticmethod
+    def start(user: User, filename: str, size: int) -> VideoUpload:
+        """
+        Start a new chunked upload.
+
+        Args:
+            user: User uploading the video
+            filename: Original filename of the video
+            size: Total size of the video in bytes
+
+        Returns:
+            Created VideoUpload at offset 0
+
+        Raises:
+            ValidationError: If the announced size is invalid
+        """
+        if size <= 0 or size > settings.CHUNKED_UPLOAD_MAX_BYTES:
+            raise ValidationError({'size': [f"Size must be between 1 and {settings.CHUNKED_UPLOAD_MAX_BYTES} bytes"]})
+
+        ChunkedUploadService.purge_expired()
+
+        upload = VideoUpload.objects.create(user=user, filename=os.path.basename(filename), size=size)
+        os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+        open(ChunkedUploadService.get_partial_path(upload), 'wb').close()
+        return upload
+
+    @staticmethod
+    def append(upload: VideoUpload, offset: int, stream: BinaryIO) -> VideoUpload:
+        """
+        Append a chunk streamed from the request body.
+
+        The chunk is streamed to a file of its own and hashed as it arrives,
+        outside any transaction, so a slow client holds no database lock.
+        The upload row is then locked just long enough to check that the
+        offset is still the committed one, append the chunk to the partial
+        file and commit the new offset. Of concurrent requests sending the
+        same chunk, the first to finish wins and the others get a conflict.
+
+        Args:
+            upload: Upload receiving the chunk
+            offset: Position of the chunk in the file, must equal the committed offset
+            stream: Request body stream
+
+        Returns:
+            Upload with its new committed offset
+
+        Raises:
+            UploadConflict: If `offset` isn't the committed offset
+            ValidationError: If the upload is complete or the chunk is too large
+        """
+        upload = VideoUpload.objects.get(pk=upload.pk)
+        ChunkedUploadService._check_offset(upload, offset)
+
+        # Copy: the cached hash state only moves forward with committed bytes
+        hasher = ChunkedUploadService._get_hasher(upload).copy()
+        max_chunk = min(settings.CHUNKED_UPLOAD_MAX_CHUNK_BYTES, upload.size - upload.offset)
+        chunk_path = os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{upload.id}.{uuid.uuid4().hex}.chunk")
+        written = 0
+
+        try:
+            with open(chunk_path, 'wb') as chunk:
+                while block := stream.read(STREAM_BLOCK_SIZE):
+                    written += len(block)
+                    if written > max_chunk:
+                        raise ValidationError({'detail': f"Chunk exceeds {max_chunk} bytes"})
+                    chunk.write(block)
+                    hasher.update(block)
+
+            with transaction.atomic():
+                upload = VideoUpload.objects.select_for_update().get(pk=upload.pk)
+                ChunkedUploadService._check_offset(upload, offset)
+
+                with open(ChunkedUploadService.get_partial_path(upload), 'r+b') as partial, open(chunk_path, 'rb') as chunk:
+                    # Bytes past the offset were left by an interrupted request
+                    partial.truncate(upload.offset)
+                    partial.seek(upload.offset)
+                    shutil.copyfileobj(chunk, partial, STREAM_BLOCK_SIZE)
+
+                upload.offset += written
+                upload.save(update_fields=['offset', 'updated_at'])
+
+                with _hashers_lock:
+                    _hashers[upload.pk] = (upload.offset, hasher)
+        finally:
+            if os.path.exists(chunk_path):
+                os.remove(chunk_path)
+
+        return upload
+
+    @staticmethod
+    def finalize(upload: VideoUpload, expected_sha256: Optional[str] = None) -> VideoUpload:
+        """
+        Mark an upload as complete once all bytes were received.
+
+        Args:
+            upload: Upload to finalize
+            expected_sha256: Optional hash computed by the client, checked against ours
+
+        Returns:
+            Completed upload with its SHA-256
+
+        Raises:
+            ValidationError: If bytes are missing or the hash doesn't match
+        """
+        if upload.status == VideoUpload.STATUS_COMPLETE:
+            return upload
+        if upload.offset != upload.size:
+            raise ValidationError({'detail': f"Upload incomplete: {upload.offset}/{upload.size} bytes received"})
+
+        sha256 = ChunkedUploadService._get_hasher(upload).hexdigest()
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            raise ValidationError({'sha256': ["Checksum mismatch"]})
+
+        upload.sha256 = sha256
+        upload.status = VideoUpload.STATUS_COMPLETE
+        upload.save(update_fields=['sha256', 'status', 'updated_at'])
+        ChunkedUploadService._forget_hasher(upload)
+
+        logger.info(f"Upload {upload.id} complete: {upload.size} bytes, sha256 {sha256}")
+        return upload
+
+    @staticmethod
+    def attach(upload: VideoUpload, transcript: Transcript) -> None:
+        """
+        Move a completed upload into the transcript videos folder and link it.
+
+        The partial file is renamed in place, so the video is never copied.
+
+        Args:
+            upload: Completed upload
+            transcript: Transcript receiving the video
+        """
+        name = default_storage.get_available_name(os.path.join('transcript_videos', upload.filename))
+        os.makedirs(os.path.dirname(default_storage.path(name)), exist_ok=True)
+        os.replace(ChunkedUploadService.get_partial_path(upload), default_storage.path(name))
+
+        transcript.video_file.name = name
+        transcript.video_sha256 = upload.sha256
+        transcript.save(update_fields=['video_file', 'video_sha256'])
+        upload.delete()
+
+    @staticmethod
+    def get_completed(user: User, upload_id) -> VideoUpload:
+        """
+        Fetch a completed upload of the user, ready to be attached.
+
+        Raises:
+            ValidationError: If the upload doesn't exist or isn't finalized
+        """
+        try:
+            return VideoUpload.objects.get(pk=upload_id, user=user, status=VideoUpload.STATUS_COMPLETE)
+        except (VideoUpload.DoesNotExist, DjangoValidationError):
+            raise ValidationError({'video_upload': ["Unknown or unfinished upload"]})
+
+    @staticmethod
+    def discard(upload: VideoUpload) -> None:
+        """Delete an upload, its partial file and chunks left by interrupted requests."""
+        leftovers = glob.glob(os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{upload.id}.*.chunk"))
+        for path in [ChunkedUploadService.get_partial_path(upload), *leftovers]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        ChunkedUploadService._forget_hasher(upload)
+        upload.delete()
+
+    @staticmethod
+    def purge_expired() -> int:
+        """
+        Delete uploads not touched for CHUNKED_UPLOAD_EXPIRE_HOURS.
+
+        Returns:
+            Number of deleted uploads
+        """
+        deadline = timezone.now() - timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRE_HOURS)
+        expired = list(VideoUpload.objects.filter(updated_at__lt=deadline))
+        for upload in expired:
+            ChunkedUploadService.discard(upload)
+
+        if expired:
+            logger.info(f"Purged {len(expired)} expired uploads")
+        return len(expired)
+
+    @staticmethod
+    def get_partial_path(upload: VideoUpload) -> str:
+        """Return the path of the file receiving the upload bytes."""
+        return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{upload.id}.part")
+
+    @staticmethod
+    def _check_offset(upload: VideoUpload, offset: int) -> None:
+        """
+        Check that a chunk can be appended at `offset`.
+
+        Raises:
+            UploadConflict: If `offset` isn't the committed offset
+            ValidationError: If the upload is complete
+        """
+        if upload.status != VideoUpload.STATUS_UPLOADING:
+            raise ValidationError({'detail': "Upload is already complete"})
+        if offset != upload.offset:
+            raise UploadConflict(upload.offset)
+
+    @staticmethod
+    def _get_hasher(upload: VideoUpload):
+        """
+        Return the running SHA-256 of the committed bytes.
+
+        Hash objects can't be stored in the database, so each process keeps
+        its own. When another process received the previous chunks, the
+        committed part of the file is hashed once to catch up.
+        """
+        with _hashers_lock:
+            offset, hasher = _hashers.get(upload.pk, (None, None))
+
+        if offset == upload.offset:
+            return hasher
+
+        hasher = hashlib.sha256()
+        remaining = upload.offset
+        with open(ChunkedUploadService.get_partial_path(upload), 'rb') as partial:
+            while remaining > 0:
+                block = partial.read(min(STREAM_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        return hasher
+
+    @staticmethod
+    def _forget_hasher(upload: VideoUpload) -> None:
+        """Drop the cached hash state of an upload."""
+        with _hashers_lock:
+            _hashers.pop(upload.pk, None)
@@ -0,0 +1,139 @@
+import bisect
+import logging
+from typing import Any, Dict, List, Optional
+from ..models import Transcript
+from .ffmpeg_service import FFmpegService
+
+logger = logging.getLogger(__name__)
+
+# Clips shorter than this (seconds) after clamping are dropped
+MIN_CLIP_DURATION = 0.5
+
+
+class VideoProbeError(Exception):
+    """Raised when a video file can't be read or is damaged."""
+
+
+class VideoProbeService:
+    """Service for inspecting and indexing transcript videos."""
+
+    @staticmethod
+    def probe(path: str) -> Dict[str, Any]:
+        """
+        Inspect a video file and build its index.
+
+        Args:
+            path: Absolute path to the video file
+
+        Returns:
+            Dictionary with duration (seconds), video_codec, video_profile,
+            pix_fmt, audio_codec, width, height, fps and sorted keyframe timestamps
+
+        Raises:
+            VideoProbeError: If the file has no readable video stream or is truncated
+        """
+        try:
+            infos = FFmpegService.probe(path)
+            scan = FFmpegService.scan_keyframes(path)
+        except (OSError, RuntimeError, IndexError, ValueError) as e:
+            raise VideoProbeError(f"Unreadable video file: {e}")
+
+        if not infos.get('video_found') or not infos.get('duration'):
+            raise VideoProbeError("No video stream found")
+        if scan['corrupted'] or not scan['keyframes']:
+            raise VideoProbeError("Video file is damaged or truncated")
+
+        width, height = infos.get('video_size') or (None, None)
+        return {
+            'duration': infos['duration'],
+            'video_codec': infos.get('video_codec_name'),
+            # MoviePy keeps the parentheses: "(High)"
+            'video_profile': (infos.get('video_profile') or '').strip('()') or None,
+            'pix_fmt': scan['pix_fmt'],
+            'audio_codec': scan['audio_codec'],
+            'width': width,
+            'height': height,
+            'fps': infos.get('video_fps'),
+            'keyframes': scan['keyframes'],
+        }
+
+    @staticmethod
+    def index(transcript: Transcript) -> Dict[str, Any]:
+        """
+        Probe the transcript video and store the result on the transcript.
+
+        Args:
+            transcript: Transcript with a video file
+
+        Returns:
+            The stored video information
+
+        Raises:
+            VideoProbeError: If the video can't be read
+        """
+        transcript.video_info = VideoProbeService.probe(transcript.video_file.path)
+        Transcript.objects.filter(pk=transcript.pk).update(video_info=transcript.video_info)
+        logger.info(
+            f"Indexed video of transcript {transcript.id}: {transcript.video_info['duration']}s, "
+            f"{len(transcript.video_info['keyframes'])} keyframes"
+        )
+        return transcript.video_info
+
+    @staticmethod
+    def get_info(transcript: Transcript) -> Dict[str, Any]:
+        """Return stored video information, probing videos not indexed yet or indexed before the pixel format was recorded."""
+        if transcript.video_info and 'pix_fmt' in transcript.video_info:
+            return transcript.video_info
+        return VideoProbeService.index(transcript)
+
+    @staticmethod
+    def clamp_clip_ranges(steps: List[Any], duration: float) -> List[Any]:
+        """
+        Validate step `video_clip` ranges against the video duration.
+
+        Ranges are clamped to [0, duration]; clips that are malformed or
+        shorter than MIN_CLIP_DURATION once clamped are removed from their step.
+
+        Args:
+            steps: Tutorial steps as returned by the model
+            duration: Video duration in seconds
+
+        Returns:
+            New list of steps with valid clip ranges only
+        """
+        clamped = []
+
+        for step in steps:
+            video_clip = step.get('video_clip') if isinstance(step, dict) else None
+            if video_clip is None:
+                clamped.append(step)
+                continue
+
+            step = dict(step)
+            try:
+                start = max(0.0, float(video_clip['start']))
+                end = min(float(video_clip['end']), duration)
+            except (KeyError, TypeError, ValueError):
+                start, end = 0.0, 0.0
+
+            if end - start < MIN_CLIP_DURATION:
+                logger.info(f"Dropping invalid clip range {video_clip} of step {step.get('index')}")
+                step.pop('video_clip')
+            else:
+                if (start, end) != (video_clip['start'], video_clip['end']):
+                    logger.info(f"Clamped clip range {video_clip['start']}-{video_clip['end']}s of step {step.get('index')} to {start}-{end}s")
+                step['video_clip'] = {**video_clip, 'start': start, 'end': end}
+
+            clamped.append(step)
+
+        return clamped
+
+    @staticmethod
+    def nearest_keyframe(keyframes: List[float], time: float) -> Optional[float]:
+        """Return the keyframe closest to `time`, or None without keyframes."""
+        if not keyframes:
+            return None
+
+        position = bisect.bisect_left(keyframes, time)
+        candidates = keyframes[max(0, position - 1):position + 1]
+        return min(candidates, key=lambda keyframe: abs(keyframe - time))
@@ -1,48 +1,726 @@
+import atexit
+import bisect
+import logging
+import multiprocessing
 import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Set
+import django
 from django.conf import settings
+from django.db import transaction
 from moviepy import VideoFileClip
 from ..models import Tutorial, Transcript
+from .clip_store import PARTIAL_PREFIX, ClipStoreService
+from .ffmpeg_service import (
+    ENCODED_AUDIO_CODEC,
+    ENCODED_PIX_FMT,
+    ENCODED_VIDEO_CODEC,
+    ENCODED_VIDEO_PROFILE,
+    FFmpegService,
+)
+from .video_probe_service import VideoProbeService
+
+logger = logging.getLogger(__name__)
+
+# Extraction modes (settings.VIDEO_CLIP_MODE)
+CLIP_MODE_REENCODE = 'reencode'
+CLIP_MODE_COPY = 'copy'
+
+# Extraction paths recorded on each clip
+EXTRACTION_COPY = 'copy'
+EXTRACTION_SMART = 'smart'
+EXTRACTION_REENCODE = 'reencode'
+EXTRACTION_CACHED = 'cache'
+EXTRACTION_FAILED = 'failed'
+
+# Process pool shared by all extractions of this process, created on first use
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
 
 
 class VideoClipService:
-    """Service for extracting video clips from tutorials - SIMPLE VERSION THAT WORKS."""
-    
+    """Service for extracting video clips from tutorial steps."""
+
     @staticmethod
     def extract_clips(tutorial: Tutorial, transcript: Transcript) -> None:
-        """Extract video clips exactly like the original working code."""
+        """
+        Extract one video clip per step that defines a `video_clip` range.
+
+        Clips are planned in time order and split into contiguous batches,
+        one per worker of a bounded process pool (`VIDEO_CLIP_WORKERS`).
+        Each batch opens the source video once and writes all its clips from
+        that single reader, so the decoder only ever seeks forward.
+
+        With `VIDEO_CLIP_MODE = 'copy'`, clips are cut by stream copy from
+        keyframes and only re-encoded when copying isn't possible. Each clip
+        records the path it took (`extraction`) and its duration; a clip that
+        fails is marked `failed` with its error and doesn't stop the others.
+
+        Clips already produced from the same video, range and profile are
+        taken from the shared clip store (`CLIP_STORE_ENABLED`) instead of
+        being encoded again, and new clips are added to it.
+
+        Args:
+            tutorial: Tutorial whose steps reference clip ranges
+            transcript: Source transcript holding the video file
+        """
         if not transcript.video_file:
             return
-            
-        # Create clips directory using centralized path method
-        from .tutorial_service import TutorialService
-        tutorial_media_path = TutorialService.get_media_path(tutorial)
-        clips_dir = os.path.join(tutorial_media_path, 'clips')
+
+        clips_dir = VideoClipService.get_clips_dir(tutorial)
         os.makedirs(clips_dir, exist_ok=True)
-        
-        updated_steps = []
-        
-        for step in tutorial.steps:
-            step = step.copy()  # Copy to avoid mutations
-            
-            if video_clip := step.get('video_clip'):
-                start, end = video_clip['start'], video_clip['end']
+
+        # Copy steps to avoid mutating the instance until everything is written
+        steps = [VideoClipService._copy_step(step) for step in tutorial.steps]
+        plan = VideoClipService.plan_clips(steps)
+
+        if plan:
+            results = VideoClipService._extract_plan(transcript, clips_dir, plan)
+            VideoClipService._apply_results(tutorial, transcript, steps, results)
+
+        tutorial.steps = steps
+        tutorial.save()
+
+    @staticmethod
+    def sync_clips(tutorial: Tutorial) -> None:
+        """
+        Reconcile clip files with the current step ranges after an edit.
+
+        Only steps whose clip is missing or doesn't match their `video_clip`
+        range are re-cut (through the clip store, so a range that moved to
+        another step is linked rather than re-encoded). Existing files are
+        reused and clip files no step references anymore are deleted.
+
+        Steps are merged into the freshly loaded tutorial, so edits saved
+        while clips were being cut are kept.
+
+        Args:
+            tutorial: Tutorial whose steps were edited
+        """
+        transcript = tutorial.transcript
+        if not transcript.video_file:
+            return
+
+        clips_dir = VideoClipService.get_clips_dir(tutorial)
+        os.makedirs(clips_dir, exist_ok=True)
+
+        steps = [VideoClipService._copy_step(step) for step in tutorial.steps]
+        plan = VideoClipService.plan_clips(steps)
+        stale = VideoClipService.find_stale_clips(tutorial)
+        pending = [job for job in plan if job['position'] in stale]
+
+        if pending:
+            results = VideoClipService._extract_plan(transcript, clips_dir, pending)
+            VideoClipService._apply_results(tutorial, transcript, steps, results)
+        logger.info(f"Re-cut {len(pending)} of {len(plan)} clips of tutorial {tutorial.id}")
+
+        with transaction.atomic():
+            current = Tutorial.objects.select_for_update().get(pk=tutorial.pk)
+            current.steps = VideoClipService._merge_clips(current.steps, steps)
+            current.save(update_fields=['steps', 'updated_at'])
+
+        tutorial.steps = current.steps
+
+        # Remove clip files no step references anymore
+        for filename in VideoClipService.find_orphan_clips(tutorial):
+            try:
+                os.remove(os.path.join(clips_dir, filename))
+            except FileNotFoundError:
+                continue
+            logger.info(f"Removed orphaned clip {filename} of tutorial {tutorial.id}")
+
+    @staticmethod
+    def prefetch_clip(transcript: Transcript, step: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Start cutting the clip of one step into the clip store, in the background.
+
+        Used while a tutorial is still being generated: each clip is cut by
+        the process pool as soon as its step is known, and `extract_clips`
+        later finds it in the store and only links it. Does nothing when the
+        clip store is disabled or already holds the clip.
+
+        Args:
+            transcript: Source transcript holding the video file
+            step: Tutorial step, its `video_clip` range already clamped to the video
+
+        Returns:
+            Pending prefetch for `finish_prefetch` or `cancel_prefetch`, or None
+        """
+        if not settings.CLIP_STORE_ENABLED or not transcript.video_file:
+            return None
+
+        plan = VideoClipService.plan_clips([step])
+        if not plan:
+            return None
+
+        job = plan[0]
+        options = VideoClipService._get_options(transcript)
+        source_hash = ClipStoreService.get_source_hash(transcript)
+        profile = VideoClipService._get_profile(options)
+        key = ClipStoreService.make_key(source_hash, job['start'], job['end'], profile)
+        if ClipStoreService.lookup([key]):
+            return None
+
+        # Next to the store so that the clip is added by hard link
+        store_dir = os.path.join(settings.MEDIA_ROOT, 'clip_store')
+        os.makedirs(store_dir, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix='prefetch-', dir=store_dir)
+
+        future = VideoClipService._get_executor().submit(
+            extract_clip_batch, transcript.video_file.path, staging_dir, [job], options
+        )
+        return {
+            'future': future,
+            'job': job,
+            'key': key,
+            'source_hash': source_hash,
+            'profile': profile,
+            'staging_dir': staging_dir,
+        }
+
+    @staticmethod
+    def finish_prefetch(prefetch: Dict[str, Any]) -> bool:
+        """
+        Wait for a prefetched clip and add it to the clip store.
+
+        Args:
+            prefetch: Pending prefetch from `prefetch_clip`
+
+        Returns:
+            True if the clip is now in the store, False if it could not be cut
+        """
+        job = prefetch['job']
+        try:
+            try:
+                result = prefetch['future'].result()[0]
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    VideoClipService._reset_executor()
+                result = _failed_result(job, str(e), 0.0)
+
+            if result['method'] == EXTRACTION_FAILED:
+                logger.warning(f"Prefetching clip {job['filename']} failed: {result['error']}")
+                return False
+
+            ClipStoreService.add(
+                prefetch['key'], prefetch['source_hash'], job['start'], job['end'], prefetch['profile'],
+                os.path.join(prefetch['staging_dir'], job['filename']),
+            )
+            ClipStoreService.evict()
+            return True
+        except OSError as e:
+            logger.warning(f"Could not add prefetched clip {job['filename']} to the clip store: {e}")
+            return False
+        finally:
+            shutil.rmtree(prefetch['staging_dir'], ignore_errors=True)
+
+    @staticmethod
+    def cancel_prefetch(prefetch: Dict[str, Any]) -> None:
+        """Drop a prefetch that is no longer needed, once its worker is done with the staging directory."""
+        prefetch['future'].cancel()
+        prefetch['future'].add_done_callback(lambda _: shutil.rmtree(prefetch['staging_dir'], ignore_errors=True))
+
+    @staticmethod
+    def find_stale_clips(tutorial: Tutorial) -> Set[int]:
+        """
+        Find steps whose clip file doesn't match their current `video_clip` range.
+
+        Ranges are compared with the one the clip was cut for (`cut_range`),
+        since filenames round them to 0.1s; clips cut before it was recorded
+        are compared by filename.
+
+        Args:
+            tutorial: Tutorial to check
+
+        Returns:
+            Positions (in `tutorial.steps`) of steps needing a new clip
+        """
+        clips_dir = VideoClipService.get_clips_dir(tutorial)
+        stale = set()
+
+        for job in VideoClipService.plan_clips(tutorial.steps):
+            video_clip = tutorial.steps[job['position']]['video_clip']
+            file_url = video_clip.get('file_url') or ''
+            cut_range = video_clip.get('cut_range')
+            if (
+                os.path.basename(file_url) != job['filename']
+                or (cut_range is not None and cut_range != [job['start'], job['end']])
+                or not os.path.exists(os.path.join(clips_dir, job['filename']))
+            ):
+                stale.add(job['position'])
+
+        return stale
+
+    @staticmethod
+    def find_orphan_clips(tutorial: Tutorial) -> List[str]:
+        """
+        Find clip files of a tutorial that no step references anymore.
+
+        Only complete clip files are considered: partial files and work
+        directories of cuts in progress are left alone.
+
+        Args:
+            tutorial: Tutorial to check
+
+        Returns:
+            Filenames in the tutorial clips directory
+        """
+        clips_dir = VideoClipService.get_clips_dir(tutorial)
+        if not os.path.isdir(clips_dir):
+            return []
+
+        referenced = {job['filename'] for job in VideoClipService.plan_clips(tutorial.steps)}
+        return [
+            filename for filename in os.listdir(clips_dir)
+            if filename not in referenced
+            and not filename.startswith(PARTIAL_PREFIX)
+            and os.path.isfile(os.path.join(clips_dir, filename))
+        ]
+
+    @staticmethod
+    def get_clips_dir(tutorial: Tutorial) -> str:
+        """Return the clips directory of a tutorial."""
+        # Centralized media path method
+        from .tutorial_service import TutorialService
+        return os.path.join(TutorialService.get_media_path(tutorial), 'clips')
+
+    @staticmethod
+    def _extract_plan(transcript: Transcript, clips_dir: str, plan: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Produce the clips of a plan, from the clip store or by extraction.
+
+        Args:
+            transcript: Source transcript holding the video file
+            clips_dir: Directory where clips are written
+            plan: Clip jobs from `plan_clips`
+
+        Returns:
+            One result per job, sorted by step position
+        """
+        source_path = transcript.video_file.path
+        options = VideoClipService._get_options(transcript)
+        results, pending, keys = [], plan, {}
+
+        if settings.CLIP_STORE_ENABLED:
+            # Reuse clips already encoded from the same video, range and profile
+            source_hash = ClipStoreService.get_source_hash(transcript)
+            profile = VideoClipService._get_profile(options)
+            keys = {
+                job['position']: ClipStoreService.make_key(source_hash, job['start'], job['end'], profile)
+                for job in plan
+            }
+            cached_clips = ClipStoreService.lookup(keys.values())
+            pending = []
+
+            for job in plan:
+                cached = cached_clips.get(keys[job['position']])
+                if cached is None:
+                    pending.append(job)
+                    continue
+
+                try:
+                    ClipStoreService.restore(cached, os.path.join(clips_dir, job['filename']))
+                except OSError as e:
+                    logger.warning(f"Could not reuse stored clip {cached.key}: {e}")
+                    pending.append(job)
+                    continue
+
+                results.append({
+                    'position': job['position'],
+                    'filename': job['filename'],
+                    'method': EXTRACTION_CACHED,
+                    'seconds': 0.0,
+                    'error': None,
+                })
+
+        if pending:
+            extracted = VideoClipService._run_plan(source_path, clips_dir, pending, options)
+            results.extend(extracted)
+
+            if settings.CLIP_STORE_ENABLED:
+                jobs = {job['position']: job for job in pending}
+                for result in extracted:
+                    if result['method'] == EXTRACTION_FAILED:
+                        continue
+                    job = jobs[result['position']]
+                    try:
+                        ClipStoreService.add(
+                            keys[job['position']], source_hash, job['start'], job['end'], profile,
+                            os.path.join(clips_dir, job['filename']),
+                        )
+                    except OSError as e:
+                        logger.warning(f"Could not add clip {job['filename']} to the clip store: {e}")
+                ClipStoreService.evict()
+
+        return sorted(results, key=lambda result: result['position'])
+
+    @staticmethod
+    def _apply_results(
+        tutorial: Tutorial,
+        transcript: Transcript,
+        steps: List[Dict[str, Any]],
+        results: List[Dict[str, Any]],
+    ) -> None:
+        """Record clip URLs, extraction paths and errors on the steps."""
+        for result in results:
+            step = steps[result['position']]
+            video_clip = step['video_clip']
+
+            if result['method'] == EXTRACTION_FAILED:
+                logger.warning(f"Clip extraction failed for step {step.get('index')} of tutorial {tutorial.id}: {result['error']}")
+                video_clip.pop('file_url', None)
+                video_clip.pop('cut_range', None)
+                video_clip['error'] = result['error']
+            else:
+                # URL with structure
+                video_clip['file_url'] = f"/media/tutorials/{transcript.id}/{tutorial.id}/clips/{result['filename']}"
+                # Exact range of the file, for `find_stale_clips`
+                video_clip['cut_range'] = [float(video_clip['start']), float(video_clip['end'])]
+                video_clip.pop('error', None)
+
+            video_clip['extraction'] = result['method']
+            video_clip['extraction_seconds'] = result['seconds']
+
+    @staticmethod
+    def _merge_clips(current_steps: List[Any], updated_steps: List[Any]) -> List[Any]:
+        """
+        Copy clip results onto the latest steps, for steps whose range didn't change meanwhile.
+
+        Args:
+            current_steps: Steps as currently stored
+            updated_steps: Steps carrying the new clip results
+
+        Returns:
+            Current steps with the clip results applied
+        """
+        merged = [VideoClipService._copy_step(step) for step in current_steps]
+        updated_clips = {
+            (step.get('index'), step['video_clip'].get('start'), step['video_clip'].get('end')): step['video_clip']
+            for step in updated_steps
+            if isinstance(step, dict) and isinstance(step.get('video_clip'), dict)
+        }
+
+        for step in merged:
+            if not isinstance(step, dict) or not isinstance(step.get('video_clip'), dict):
+                continue
+            key = (step.get('index'), step['video_clip'].get('start'), step['video_clip'].get('end'))
+            if key in updated_clips:
+                step['video_clip'] = dict(updated_clips[key])
+
+        return merged
+
+    @staticmethod
+    def _run_plan(
+        source_path: str,
+        clips_dir: str,
+        plan: List[Dict[str, Any]],
+        options: Dict[str, Any],
+    ) -> List[Dict[str, Any]]:
+        """
+        Dispatch clip jobs to the process pool and gather results in step order.
+
+        Args:
+            source_path: Source video path
+            clips_dir: Directory where clips are written
+            plan: Time-ordered clip jobs from `plan_clips`
+            options: Extraction options from `_get_options`
+
+        Returns:
+            One result per job, sorted by step position
+        """
+        workers = max(1, min(settings.VIDEO_CLIP_WORKERS, len(plan)))
+        batch_size = -(-len(plan) // workers)
+        batches = [plan[i:i + batch_size] for i in range(0, len(plan), batch_size)]
+
+        if len(batches) == 1:
+            results = extract_clip_batch(source_path, clips_dir, plan, options)
+        else:
+            executor = VideoClipService._get_executor()
+            futures = [
+                (batch, executor.submit(extract_clip_batch, source_path, clips_dir, batch, options))
+                for batch in batches
+            ]
+            results = []
+            for batch, future in futures:
+                try:
+                    results.extend(future.result())
+                except Exception as e:
+                    # Whole batch lost (e.g. worker crashed): report each of its steps
+                    if isinstance(e, BrokenProcessPool):
+                        VideoClipService._reset_executor()
+                    results.extend(_failed_result(job, str(e), 0.0) for job in batch)
+
+        return sorted(results, key=lambda result: result['position'])
+
+    @staticmethod
+    def _get_options(transcript: Transcript) -> Dict[str, Any]:
+        """Collect the indexed video information and settings needed by clip workers."""
+        video_info = VideoProbeService.get_info(transcript)
+        mode = VideoClipService._get_mode()
+        return {
+            'mode': mode,
+            'duration': video_info['duration'],
+            'keyframes': video_info['keyframes'] if mode == CLIP_MODE_COPY else [],
+            'tolerance': settings.VIDEO_CLIP_KEYFRAME_TOLERANCE,
+            'smart_cut': VideoClipService._can_smart_cut(video_info),
+        }
+
+    @staticmethod
+    def _can_smart_cut(video_info: Dict[str, Any]) -> bool:
+        """
+        Whether a re-encoded lead-in can be joined with segments copied from this video.
+
+        Concatenation by stream copy needs every part in the same format, so
+        the source must already be what `FFmpegService.encode_segment` writes.
+        """
+        return (
+            video_info.get('video_codec') == ENCODED_VIDEO_CODEC
+            and video_info.get('video_profile') == ENCODED_VIDEO_PROFILE
+            and video_info.get('pix_fmt') == ENCODED_PIX_FMT
+            and video_info.get('audio_codec') in (ENCODED_AUDIO_CODEC, None)
+        )
+
+    @staticmethod
+    def _get_profile(options: Dict[str, Any]) -> str:
+        """Describe the settings that change clip content, used in clip store keys."""
+        if options['mode'] == CLIP_MODE_COPY:
+            # Clips of other sources are re-encoded rather than smart cut
+            suffix = '' if options['smart_cut'] else ':nosmart'
+            return f"{CLIP_MODE_COPY}:{options['tolerance']}{suffix}"
+        return f"{CLIP_MODE_REENCODE}:aac"
+
+    @staticmethod
+    def _get_executor() -> ProcessPoolExecutor:
+        """
+        Return the process pool, creating it on first use.
+
+        Workers are spawned (not forked) so they never share the parent's
+        database connections, and set Django up before running any job.
+        """
+        global _executor
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.VIDEO_CLIP_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=django.setup,
+                )
+                atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+            return _executor
+
+    @staticmethod
+    def _reset_executor() -> None:
+        """Drop a broken process pool so the next extraction starts a fresh one."""
+        global _executor
+        with _executor_lock:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+                _executor = None
+
+    @staticmethod
+    def plan_clips(steps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Build the ordered list of clips to extract from tutorial steps.
+
+        Args:
+            steps: Tutorial steps, some of them holding a `video_clip` range
+
+        Steps whose clip range or index is malformed are skipped with a warning.
+
+        Returns:
+            Clip jobs sorted by start time, each with the step position,
+            start/end in seconds and the target filename
+        """
+        plan = []
+
+        for position, step in enumerate(steps):
+            video_clip = step.get('video_clip') if isinstance(step, dict) else None
+            if not video_clip:
+                continue
+
+            try:
+                start, end = float(video_clip['start']), float(video_clip['end'])
                 # Descriptive filename with timing
                 filename = f"step_{step['index']:02d}_{start:.1f}s-{end:.1f}s.mp4"
-                filepath = os.path.join(clips_dir, filename)
-                
-                try:
-                    # Extract video segment using MoviePy - EXACTLY like original
-                    clip = VideoFileClip(transcript.video_file.path).subclipped(start, end)
-                    clip.write_videofile(filepath, audio_codec='aac')  # Simple, no extra params
-                    clip.close()
-                    
-                    # URL with structure
-                    step['video_clip']['file_url'] = f"/media/tutorials/{transcript.id}/{tutorial.id}/clips/{filename}"
-                except:
-                    # Silent fail like original - just skip this clip
-                    pass
-            
-            updated_steps.append(step)
-        
-        tutorial.steps = updated_steps
-        tutorial.save() 
\ No newline at end of file
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping malformed clip {video_clip} of step at position {position}: {e!r}")
+                continue
+
+            plan.append({
+                'position': position,
+                'start': start,
+                'end': end,
+                'filename': filename,
+            })
+
+        return sorted(plan, key=lambda job: (job['start'], job['end']))
+
+    @staticmethod
+    def _cut_with_stream_copy(
+        source_path: str,
+        start: float,
+        end: float,
+        filepath: str,
+        keyframes: List[float],
+        tolerance: float,
+        smart_cut: bool,
+    ) -> Optional[str]:
+        """
+        Cut a clip by stream copy, re-encoding at most the lead-in GOP.
+
+        - `start` within tolerance of a keyframe: the whole clip is copied from the nearest keyframe.
+        - Otherwise, with `smart_cut`, the lead-in up to the next keyframe is re-encoded
+          and the rest is copied, then both parts are joined without re-encoding.
+
+        Args:
+            source_path: Source video path
+            start: Requested clip start in seconds
+            end: Clip end in seconds
+            filepath: Destination file path
+            keyframes: Sorted keyframe timestamps of the source video
+            tolerance: Max distance in seconds between `start` and a keyframe to copy from it
+            smart_cut: Whether the source format matches re-encoded segments (see `_can_smart_cut`)
+
+        Returns:
+            Extraction path taken (`copy` or `smart`), or None when the
+            clip has to be fully re-encoded
+        """
+        nearest_keyframe = VideoProbeService.nearest_keyframe(keyframes, start)
+        position = bisect.bisect_right(keyframes, start)
+        next_keyframe = keyframes[position] if position < len(keyframes) else None
+
+        try:
+            if nearest_keyframe is not None and abs(start - nearest_keyframe) <= tolerance and nearest_keyframe < end:
+                # Snap the seek to the keyframe
+                FFmpegService.copy_segment(source_path, nearest_keyframe, end, filepath)
+                return EXTRACTION_COPY
+
+            if not smart_cut:
+                # Joining a re-encoded lead-in would mix formats
+                return None
+
+            if next_keyframe is None or next_keyframe >= end:
+                # No keyframe inside the clip: nothing can be copied
+                return None
+
+            # Re-encode only the lead-in GOP, copy everything after the next keyframe
+            with tempfile.TemporaryDirectory(dir=os.path.dirname(filepath)) as work_dir:
+                lead_in = os.path.join(work_dir, 'lead_in.mp4')
+                body = os.path.join(work_dir, 'body.mp4')
+                FFmpegService.encode_segment(source_path, start, next_keyframe, lead_in)
+                FFmpegService.copy_segment(source_path, next_keyframe, end, body)
+                FFmpegService.concat_segments([lead_in, body], filepath)
+            return EXTRACTION_SMART
+        except RuntimeError as e:
+            logger.info(f"Stream copy not possible for {start}-{end}s, falling back to re-encode: {e}")
+            return None
+
+    @staticmethod
+    def _get_mode() -> str:
+        """Return the configured extraction mode, defaulting to full re-encode."""
+        mode = settings.VIDEO_CLIP_MODE
+        if mode not in (CLIP_MODE_REENCODE, CLIP_MODE_COPY):
+            logger.warning(f"Unknown VIDEO_CLIP_MODE '{mode}', using '{CLIP_MODE_REENCODE}'")
+            return CLIP_MODE_REENCODE
+        return mode
+
+    @staticmethod
+    def _copy_step(step: Any) -> Any:
+        """Copy a step and its video_clip so updates don't leak into the original."""
+        if not isinstance(step, dict):
+            return step
+
+        step = step.copy()
+        if isinstance(step.get('video_clip'), dict):
+            step['video_clip'] = step['video_clip'].copy()
+        return step
+
+
+def extract_clip_batch(
+    source_path: str,
+    clips_dir: str,
+    jobs: List[Dict[str, Any]],
+    options: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """
+    Extract a time-ordered batch of clips from a single source reader.
+
+    Runs inside process pool workers, so it only touches the filesystem and
+    returns plain dictionaries; the caller updates the tutorial.
+
+    Args:
+        source_path: Source video path
+        clips_dir: Directory where clips are written
+        jobs: Clip jobs from `VideoClipService.plan_clips`
+        options: Extraction options from `VideoClipService._get_options`
+
+    Returns:
+        One result per job with position, filename, method, seconds and error
+    """
+    results = []
+    source = None
+
+    try:
+        for job in jobs:
+            start = job['start']
+            end = min(job['end'], options['duration'])
+            filepath = os.path.join(clips_dir, job['filename'])
+            # Written aside, then moved in place: an existing clip is a hard link
+            # into the clip store, which writing through it would overwrite
+            partial_path = os.path.join(clips_dir, f"{PARTIAL_PREFIX}{uuid.uuid4().hex[:8]}-{job['filename']}")
+            started_at = time.monotonic()
+
+            if end <= start:
+                results.append(_failed_result(job, f"range {start}-{job['end']}s is outside the video", 0.0))
+                continue
+
+            try:
+                method = None
+                if options['mode'] == CLIP_MODE_COPY:
+                    method = VideoClipService._cut_with_stream_copy(
+                        source_path, start, end, partial_path, options['keyframes'], options['tolerance'],
+                        options['smart_cut'],
+                    )
+
+                if method is None:
+                    # Single shared reader, opened only when a re-encode is needed
+                    if source is None:
+                        source = VideoFileClip(source_path)
+                    source.subclipped(start, end).write_videofile(partial_path, audio_codec='aac', logger=None)
+                    method = EXTRACTION_REENCODE
+
+                os.replace(partial_path, filepath)
+
+                results.append({
+                    'position': job['position'],
+                    'filename': job['filename'],
+                    'method': method,
+                    'seconds': round(time.monotonic() - started_at, 3),
+                    'error': None,
+                })
+            except Exception as e:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                results.append(_failed_result(job, str(e), round(time.monotonic() - started_at, 3)))
+    finally:
+        if source is not None:
+            source.close()
+
+    return results
+
+
+def _failed_result(job: Dict[str, Any], error: str, seconds: float) -> Dict[str, Any]:
+    """Build the result of a clip job that could not be extracted."""
+    return {
+        'position': job['position'],
+        'filename': job['filename'],
+        'method': EXTRACTION_FAILED,
+        'seconds': seconds,
+        'error': error,
+    }
@@ -0,0 +1,291 @@
+"""
+Incremental parser for a top-level JSON object.
+
+Data is pushed in pieces with `feed()` and members come out as soon as they
+are complete. Members listed in `stream_keys` must be arrays; their items
+are emitted one by one instead of as a whole list, so large arrays never
+need to be held in a single buffer.
+
+Values are decoded by the standard library decoder; the parser only tracks
+structure (strings, nesting) to find the end of values split across pieces.
+"""
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+# Event kinds returned by `feed()` and `close()`
+FIELD = 'field'  # (FIELD, key, value) for a regular member
+ITEM = 'item'    # (ITEM, key, value) for each item of a streamed array
+END = 'end'      # (END, key, None) when a streamed array is closed
+
+Event = Tuple[str, str, Any]
+
+# Characters that matter when looking for the end of a string, object or array
+STRUCTURE_PATTERN = re.compile(r'["\\{}\[\]]')
+# First character after a number or literal (true, false, null)
+SCALAR_END_PATTERN = re.compile(r'[\s,\]}]')
+WHITESPACE_PATTERN = re.compile(r'[ \t\n\r]*')
+
+# Drop consumed text from the buffer once it is larger than this
+COMPACT_THRESHOLD = 64 * 1024
+
+# Parser states: what the next token must be
+EXPECT_OBJECT = 'object'          # opening '{'
+EXPECT_FIRST_KEY = 'first_key'    # key or '}' right after '{'
+EXPECT_KEY = 'key'
+EXPECT_COLON = 'colon'
+EXPECT_VALUE = 'value'
+EXPECT_MEMBER_END = 'member_end'  # ',' or '}'
+EXPECT_FIRST_ITEM = 'first_item'  # item or ']' right after '['
+EXPECT_ITEM = 'item'
+EXPECT_ITEM_END = 'item_end'      # ',' or ']'
+EXPECT_EOF = 'eof'
+
+
+class StreamingObjectParser:
+    """Push-style parser emitting the members of a JSON object as they complete."""
+
+    def __init__(self, stream_keys: Iterable[str] = ()):
+        """
+        Args:
+            stream_keys: Names of array members whose items are emitted one by one
+        """
+        self.stream_keys = frozenset(stream_keys)
+        # Shares key strings between decoded objects (phrases repeat the same keys)
+        self._keys = {}
+        self._decoder = json.JSONDecoder(
+            object_pairs_hook=lambda pairs: {self._keys.setdefault(k, k): v for k, v in pairs}
+        )
+        self._buffer = ""
+        self._pos = 0
+        self._state = EXPECT_OBJECT
+        self._key = None
+        self._closed = False
+        # Progress of the search for the end of the pending value: (position, depth, in string)
+        self._scan = None
+
+    @property
+    def done(self) -> bool:
+        """Whether the closing '}' of the object was parsed."""
+        return self._state == EXPECT_EOF
+
+    def feed(self, text: str) -> List[Event]:
+        """
+        Add text and return the events it completes.
+
+        Raises:
+            json.JSONDecodeError: If the text isn't valid JSON
+        """
+        if self._pos > COMPACT_THRESHOLD:
+            self._compact()
+        self._buffer += text
+        return self._parse()
+
+    def close(self) -> List[Event]:
+        """
+        Signal the end of input and return the remaining events.
+
+        Raises:
+            json.JSONDecodeError: If the input stopped before the object was complete
+        """
+        self._closed = True
+        events = self._parse()
+        if self._state != EXPECT_EOF:
+            self._fail("Unexpected end of JSON input")
+        return events
+
+    def _parse(self) -> List[Event]:
+        """Consume as much of the buffer as possible."""
+        events = []
+
+        while True:
+            self._pos = WHITESPACE_PATTERN.match(self._buffer, self._pos).end()
+            if self._pos >= len(self._buffer):
+                return events
+
+            char = self._buffer[self._pos]
+            state = self._state
+
+            if state == EXPECT_OBJECT:
+                self._expect(char, '{')
+                self._state = EXPECT_FIRST_KEY
+
+            elif state in (EXPECT_FIRST_KEY, EXPECT_KEY):
+                if char == '}' and state == EXPECT_FIRST_KEY:
+                    self._pos += 1
+                    self._state = EXPECT_EOF
+                    continue
+                self._expect(char, '"', advance=False)
+                key = self._read_value()
+                if key is None:
+                    return events
+                self._key = key[0]
+                self._state = EXPECT_COLON
+
+            elif state == EXPECT_COLON:
+                self._expect(char, ':')
+                self._state = EXPECT_VALUE
+
+            elif state == EXPECT_VALUE:
+                if self._key in self.stream_keys:
+                    self._expect(char, '[')
+                    self._state = EXPECT_FIRST_ITEM
+                    continue
+                value = self._read_value()
+                if value is None:
+                    return events
+                events.append((FIELD, self._key, value[0]))
+                self._state = EXPECT_MEMBER_END
+
+            elif state == EXPECT_MEMBER_END:
+                if char == '}':
+                    self._state = EXPECT_EOF
+                else:
+                    self._expect(char, ',', advance=False)
+                    self._state = EXPECT_KEY
+                self._pos += 1
+
+            elif state in (EXPECT_FIRST_ITEM, EXPECT_ITEM):
+                if char == ']' and state == EXPECT_FIRST_ITEM:
+                    self._pos += 1
+                    events.append((END, self._key, None))
+                    self._state = EXPECT_MEMBER_END
+                    continue
+                value = self._read_value()
+                if value is None:
+                    return events
+                events.append((ITEM, self._key, value[0]))
+                self._state = EXPECT_ITEM_END
+
+            elif state == EXPECT_ITEM_END:
+                if char == ']':
+                    events.append((END, self._key, None))
+                    self._state = EXPECT_MEMBER_END
+                else:
+                    self._expect(char, ',', advance=False)
+                    self._state = EXPECT_ITEM
+                self._pos += 1
+
+            else:
+                self._fail("Extra data after JSON object")
+
+    def _read_value(self) -> Optional[Tuple[Any]]:
+        """
+        Decode the value starting at the current position.
+
+        Strings, objects and arrays are first decoded directly, which succeeds
+        whenever they are complete. Only those cut by the end of the buffer go
+        through `_find_value_end`, which resumes where it stopped on each feed
+        so that long values are not decoded again and again.
+
+        Returns:
+            1-tuple with the value, or None if more input is needed
+        """
+        if self._scan is None and self._buffer[self._pos] in '"{[':
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                pass
+            else:
+                self._pos = end
+                return (value,)
+
+        end = self._find_value_end()
+        if end is None:
+            return None
+
+        value, decoded_end = self._decoder.raw_decode(self._buffer, self._pos)
+        if decoded_end != end:
+            self._fail("Invalid JSON value", decoded_end)
+
+        self._pos = end
+        self._scan = None
+        return (value,)
+
+    def _find_value_end(self) -> Optional[int]:
+        """
+        Return the position right after the value starting at the current position.
+
+        Strings, objects and arrays end on their closing character. Numbers and
+        literals have no closing character, so one ending exactly at the end of
+        the buffer is only complete once the input is closed.
+        """
+        buffer = self._buffer
+        start = self._pos
+
+        if buffer[start] not in '"{[':
+            match = SCALAR_END_PATTERN.search(buffer, start)
+            if match:
+                return match.start()
+            return len(buffer) if self._closed else None
+
+        position, depth, in_string = self._scan or (start, 0, False)
+
+        while True:
+            match = STRUCTURE_PATTERN.search(buffer, position)
+            if match is None:
+                self._scan = (len(buffer), depth, in_string)
+                return None
+
+            char = match.group()
+            position = match.end()
+
+            if char == '\\':
+                if position >= len(buffer):
+                    # Escaped character not received yet: resume on the backslash
+                    self._scan = (position - 1, depth, in_string)
+                    return None
+                position += 1
+            elif char == '"':
+                in_string = not in_string
+                if not in_string and depth == 0:
+                    return position
+            elif in_string:
+                continue
+            elif char in '{[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return position
+
+    def _expect(self, char: str, expected: str, advance: bool = True) -> None:
+        """Check the current character, then step over it."""
+        if char != expected:
+            self._fail(f"Expecting '{expected}'")
+        if advance:
+            self._pos += 1
+
+    def _compact(self) -> None:
+        """Drop the consumed part of the buffer."""
+        shift = self._pos
+        self._buffer = self._buffer[shift:]
+        self._pos = 0
+        if self._scan is not None:
+            position, depth, in_string = self._scan
+            self._scan = (position - shift, depth, in_string)
+
+    def _fail(self, message: str, position: Optional[int] = None) -> None:
+        raise json.JSONDecodeError(message, self._buffer, self._pos if position is None else position)
+
+
+def iter_object(chunks: Iterable[bytes], stream_keys: Iterable[str] = ()) -> Iterator[Event]:
+    """
+    Parse a JSON object from byte chunks, yielding events as they complete.
+
+    Args:
+        chunks: UTF-8 encoded JSON, in pieces of any size
+        stream_keys: Names of array members whose items are yielded one by one
+
+    Raises:
+        json.JSONDecodeError: If the input isn't a valid JSON object
+    """
+    parser = StreamingObjectParser(stream_keys)
+    # utf-8-sig drops a leading BOM, like json.loads does for bytes
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+
+    for chunk in chunks:
+        yield from parser.feed(decoder.decode(chunk))
+    yield from parser.feed(decoder.decode(b'', final=True))
+    yield from parser.close()
@@ -0,0 +1,294 @@
+"""
+Structured output of the model: response schemas and local repair.
+
+Requests carry the JSON schema of the expected answer
+(`response_format`), so models supporting structured outputs always
+answer with JSON of that shape. Answers are still checked locally, since
+older models, other backends and cached completions do not follow it:
+`parse_json` fixes the common syntax defects (markdown fences, text
+around the object, trailing commas, raw newlines in strings) and
+`validate_tutorial` the common content defects (numbers written as
+strings, missing lists, step numbering, reversed or negative clip ranges).
+
+Both return the list of what they changed, so that repaired answers are
+reported, and raise ValueError only when the answer cannot be used:
+that is when the call is worth paying for again.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from django.conf import settings
+
+# Answer wrapped in a markdown code block
+FENCE_PATTERN = re.compile(r'^```[\w-]*\s*\n?(.*?)\n?\s*```$', re.DOTALL)
+
+# Most tags kept in a tutorial
+MAX_TAGS = 5
+
+
+def _object(properties: Dict[str, Any]) -> Dict[str, Any]:
+    """Strict object schema: every property required, no other one allowed."""
+    return {
+        'type': 'object',
+        'properties': properties,
+        'required': list(properties),
+        'additionalProperties': False,
+    }
+
+
+_STRINGS = {'type': 'array', 'items': {'type': 'string'}}
+
+_CLIP_SCHEMA = _object({'start': {'type': 'number'}, 'end': {'type': 'number'}})
+
+# Strict schemas cannot leave a property out: steps without a clip have a null one
+_STEP_PROPERTIES = {
+    'text': {'type': 'string'},
+    'timestamp': {'type': 'number'},
+    'video_clip': {'anyOf': [_CLIP_SCHEMA, {'type': 'null'}]},
+}
+
+_TEXT_PROPERTIES = {
+    'title': {'type': 'string'},
+    'introduction': {'type': 'string'},
+    'tips': _STRINGS,
+    'summary': {'type': 'string'},
+    'duration_estimate': {'type': 'string'},
+    'tags': _STRINGS,
+}
+
+# Single-pass tutorial
+TUTORIAL_SCHEMA = _object({
+    **_TEXT_PROPERTIES,
+    'steps': {'type': 'array', 'items': _object({'index': {'type': 'integer'}, **_STEP_PROPERTIES})},
+})
+
+# Map step: candidate steps of one window
+MAP_SCHEMA = _object({'steps': {'type': 'array', 'items': _object(_STEP_PROPERTIES)}})
+
+# Reduce step: tutorial text around the merged steps
+REDUCE_SCHEMA = _object(_TEXT_PROPERTIES)
+
+# Section regeneration, per section
+SECTION_SCHEMAS = {
+    'step': _object({'step': _object(_STEP_PROPERTIES)}),
+    'tips': _object({'tips': _STRINGS}),
+    'summary': _object({'summary': {'type': 'string'}}),
+    'title': _object({'title': {'type': 'string'}, 'tags': _STRINGS}),
+}
+
+
+def response_format(name: str, schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Value of the `response_format` request parameter for `schema`.
+
+    Returns:
+        A strict json_schema response format, or None when
+        OPENAI_STRUCTURED_OUTPUT is off (models without structured outputs)
+    """
+    if not settings.OPENAI_STRUCTURED_OUTPUT:
+        return None
+    return {'type': 'json_schema', 'json_schema': {'name': name, 'strict': True, 'schema': schema}}
+
+
+def parse_json(content: str) -> Tuple[Any, List[str]]:
+    """
+    Parse a JSON answer, fixing the syntax defects models commonly make.
+
+    Returns:
+        Tuple of (parsed value, list of the fixes applied)
+
+    Raises:
+        ValueError: If the answer is not valid JSON even once repaired
+    """
+    try:
+        return json.loads(content), []
+    except json.JSONDecodeError as e:
+        error = e
+
+    fixes = []
+    text = content.strip()
+
+    match = FENCE_PATTERN.match(text)
+    if match:
+        text = match.group(1).strip()
+        fixes.append("removed markdown fences")
+
+    start, end = text.find('{'), text.rfind('}')
+    if start != -1 and end > start and (start > 0 or end < len(text) - 1):
+        text = text[start:end + 1]
+        fixes.append("removed text around the JSON object")
+
+    text, removed = _remove_trailing_commas(text)
+    if removed:
+        fixes.append(f"removed {removed} trailing comma{'s' if removed > 1 else ''}")
+
+    try:
+        return json.loads(text), fixes
+    except json.JSONDecodeError as e:
+        error = e
+
+    try:
+        # Accepts raw newlines and tabs inside strings
+        data = json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        raise ValueError(f"OpenAI response is not valid JSON: {error}")
+    return data, [*fixes, "escaped control characters in strings"]
+
+
+def validate_tutorial(data: Any) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Check a generated tutorial and fix what can be fixed locally.
+
+    Text fields must be strings and lists lists of strings; steps are
+    repaired with `repair_step`, unusable ones dropped, and numbered from 1
+    when their indexes are not. Tags are cut to MAX_TAGS.
+
+    Returns:
+        Tuple of (tutorial, list of the fixes applied)
+
+    Raises:
+        ValueError: If the tutorial has no title or no usable step
+    """
+    if not isinstance(data, dict):
+        raise ValueError("OpenAI response is not a JSON object")
+    if not isinstance(data.get('title'), str) or not data['title'].strip():
+        raise ValueError("OpenAI response has no title")
+    if not isinstance(data.get('steps'), list):
+        raise ValueError("OpenAI response has no steps")
+
+    fixes = []
+    tutorial = dict(data)
+    tutorial['title'] = data['title'].strip()
+
+    for name in ('introduction', 'summary', 'duration_estimate'):
+        if not isinstance(tutorial.get(name), str):
+            tutorial[name] = "" if tutorial.get(name) is None else str(tutorial[name])
+            fixes.append(f"set missing {name}")
+
+    for name in ('tips', 'tags'):
+        values = tutorial.get(name)
+        if not isinstance(values, list):
+            values = []
+            fixes.append(f"set missing {name}")
+        kept = [value.strip() for value in values if isinstance(value, str) and value.strip()]
+        if len(kept) < len(values):
+            fixes.append(f"dropped {len(values) - len(kept)} empty {name}")
+        tutorial[name] = kept
+
+    if len(tutorial['tags']) > MAX_TAGS:
+        fixes.append(f"kept the first {MAX_TAGS} of {len(tutorial['tags'])} tags")
+        tutorial['tags'] = tutorial['tags'][:MAX_TAGS]
+
+    steps = []
+    for position, step in enumerate(data['steps'], 1):
+        step = repair_step(step, fixes, label=f"step {position}")
+        if step is not None:
+            steps.append(step)
+    if not steps:
+        raise ValueError("OpenAI response has no usable step")
+
+    if [step.get('index') for step in steps] != list(range(1, len(steps) + 1)):
+        fixes.append("renumbered steps from 1")
+        steps = [{**step, 'index': number} for number, step in enumerate(steps, 1)]
+    tutorial['steps'] = steps
+
+    return tutorial, fixes
+
+
+def repair_step(step: Any, fixes: List[str], label: str = "step") -> Optional[Dict[str, Any]]:
+    """
+    Fix one step: strip its text, read numbers written as strings, order its clip range.
+
+    A null `video_clip` (how strict schemas leave it out) is removed. Clip
+    ranges are only made well-formed here; they are clamped to the video
+    duration when the tutorial is saved.
+
+    Args:
+        step: Step as answered
+        fixes: List the applied fixes are appended to
+        label: Name of the step in the fixes
+
+    Returns:
+        Repaired step, or None if it has no text or no timestamp
+    """
+    if not isinstance(step, dict) or not isinstance(step.get('text'), str) or not step['text'].strip():
+        fixes.append(f"dropped {label} without text")
+        return None
+
+    step = {**step, 'text': step['text'].strip()}
+
+    timestamp = _to_seconds(step.get('timestamp'))
+    if timestamp is None:
+        fixes.append(f"dropped {label} without timestamp")
+        return None
+    if timestamp != step['timestamp']:
+        fixes.append(f"read the timestamp of {label} as a number")
+    step['timestamp'] = timestamp
+
+    if 'index' in step and not isinstance(step['index'], int):
+        step.pop('index')
+
+    video_clip = step.get('video_clip')
+    if video_clip is None:
+        step.pop('video_clip', None)
+        return step
+
+    start = _to_seconds(video_clip.get('start')) if isinstance(video_clip, dict) else None
+    end = _to_seconds(video_clip.get('end')) if isinstance(video_clip, dict) else None
+    if start is None or end is None:
+        fixes.append(f"removed the malformed clip of {label}")
+        step.pop('video_clip')
+        return step
+
+    if end < start:
+        start, end = end, start
+        fixes.append(f"swapped the clip start and end of {label}")
+    if start < 0:
+        start = 0.0
+        fixes.append(f"moved the clip start of {label} to 0")
+    step['video_clip'] = {**video_clip, 'start': start, 'end': end}
+    return step
+
+
+def _to_seconds(value: Any) -> Optional[float]:
+    """Read a number of seconds, also when written as a string ("12.5", "12.5s")."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip().rstrip('s'))
+        except ValueError:
+            return None
+    return None
+
+
+def _remove_trailing_commas(text: str) -> Tuple[str, int]:
+    """Remove commas directly followed by `}` or `]`, outside strings."""
+    result = []
+    removed = 0
+    in_string = False
+    escaped = False
+
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '}]':
+            # Drop the comma before this bracket, keeping the whitespace between them
+            position = len(result) - 1
+            while position >= 0 and result[position].isspace():
+                position -= 1
+            if position >= 0 and result[position] == ',':
+                del result[position]
+                removed += 1
+        result.append(char)
+
+    return "".join(result), removed
@@ -0,0 +1,1167 @@
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from array import array
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.serializers import ValidationError
+from rest_framework.test import APIClient
+from . import completion_cache, openai_client, rate_limiter
+from .models import CachedClip, CachedCompletion, GenerationJob, RateLimitBucket, RateLimitTicket, Transcript, Tutorial, VideoUpload, _to_milliseconds
+from .llm_backends import ChunkStream, _build_chunks, _build_completion
+from .phrase_index import PhraseIndex
+from .phrase_storage import decode_column, decode_phrases, encode_phrases
+from .prompt_builder import build_tutorial_messages
+from .structured_output import TUTORIAL_SCHEMA, parse_json, repair_step, response_format, validate_tutorial
+from .streaming_json import END, FIELD, ITEM, StreamingObjectParser, iter_object
+from .services import bulk_import_service
+from .services.bulk_import_service import BulkImportService
+from .services.clip_store import ClipStoreService
+from .services.ffmpeg_service import FFmpegService
+from .services.job_service import GenerationJobService
+from .services.transcript_service import TranscriptService
+from .services.tutorial_service import TutorialService
+from .services.upload_service import ChunkedUploadService, UploadConflict, _hashers
+from .services.video_probe_service import VideoProbeError, VideoProbeService
+from .services.video_service import EXTRACTION_CACHED, EXTRACTION_FAILED, EXTRACTION_REENCODE, VideoClipService
+
+# Transcript line of the compact prompt: `<seconds>|<text>`
+LINE_PATTERN = re.compile(r'^(\d+(?:\.\d+)?)\|(.+)$', re.MULTILINE)
+
+
+def create_transcript(username='tester', phrases=None, **fields):
+    """Create a transcript owned by a new user, one phrase every 3 seconds by default."""
+    user, _ = get_user_model().objects.get_or_create(username=username)
+    transcript = Transcript(
+        user=user,
+        timestamp='2024-01-01T00:00:00Z',
+        duration_in_ticks=60 * 10_000_000,
+        filename='test.json',
+        fingerprint=uuid.uuid4().hex,
+        **fields
+    )
+    transcript.phrases = phrases if phrases is not None else [
+        {'offset_milliseconds': index * 3000, 'duration_milliseconds': 2500, 'display': f"Do action {index}."}
+        for index in range(20)
+    ]
+    transcript.save()
+    return transcript
+
+
+def make_video(path, seconds=12):
+    """Write a small H.264/AAC test video with a keyframe every second."""
+    FFmpegService._run([
+        '-f', 'lavfi', '-i', f'testsrc=size=160x120:rate=25:duration={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-g', '25', '-c:a', 'aac', '-shortest', path,
+    ])
+
+
+class MediaTestCase(TestCase):
+    """Test case writing media files to a temporary MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media_root, CHUNKED_UPLOAD_DIR=os.path.join(media_root, 'chunked_uploads'))
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def create_video_transcript(self, seconds=12, **fields):
+        """Create a transcript with a generated video stored under MEDIA_ROOT."""
+        name = f'transcript_videos/{uuid.uuid4().hex}.mp4'
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, 'transcript_videos'), exist_ok=True)
+        make_video(os.path.join(settings.MEDIA_ROOT, name), seconds)
+        transcript = create_transcript(**fields)
+        transcript.video_file.name = name
+        transcript.save(update_fields=['video_file'])
+        return transcript
+
+
+class PromptTimestampTests(TestCase):
+    """Step timestamps copied from the compact prompt must lead back to their phrase."""
+
+    OFFSETS = [0, 1005, 3332, 12500, 61010, 3599999]
+
+    def setUp(self):
+        user = get_user_model().objects.create(username='prompt-test')
+        self.transcript = Transcript(
+            user=user,
+            timestamp='2024-01-01T00:00:00Z',
+            duration_in_ticks=3600 * 10_000_000,
+            filename='prompt-test.json',
+            fingerprint=uuid.uuid4().hex,
+        )
+        self.transcript.phrases = [
+            {
+                'offset_milliseconds': offset,
+                'duration_milliseconds': 900,
+                'display': f"Phrase {position}  spoken\tlater",
+                'locale': 'en-US',
+                'confidence': 0.9,
+            }
+            for position, offset in enumerate(self.OFFSETS)
+        ]
+        self.transcript.save()
+
+    def _prompt_lines(self):
+        messages, _ = build_tutorial_messages(self.transcript.phrases, settings.LLM_MODEL)
+        return LINE_PATTERN.findall(messages[-1]['content'])
+
+    def test_every_phrase_has_one_line(self):
+        lines = self._prompt_lines()
+        self.assertEqual([text for _, text in lines], [f"Phrase {position} spoken later" for position in range(len(self.OFFSETS))])
+
+    def test_line_seconds_convert_back_to_offsets(self):
+        for (seconds, _), phrase in zip(self._prompt_lines(), self.transcript.phrases):
+            with self.subTest(seconds=seconds):
+                self.assertEqual(_to_milliseconds(float(seconds)), phrase['offset_milliseconds'])
+
+    def test_line_seconds_find_their_phrase(self):
+        for (seconds, _), phrase in zip(self._prompt_lines(), self.transcript.phrases):
+            with self.subTest(seconds=seconds):
+                timestamp = float(seconds)
+                self.assertIn(phrase, self.transcript.phrases_between(timestamp, timestamp))
+                self.assertEqual(self.transcript.nearest_phrase(timestamp), phrase)
+
+    def test_rounding_sensitive_timestamp(self):
+        # 3.332 * 1000 is 3331.9999999999995 in floating point
+        lines = dict((text, seconds) for seconds, text in self._prompt_lines())
+        seconds = lines["Phrase 2 spoken later"]
+        self.assertEqual(seconds, "3.332")
+
+        transcript = Transcript.objects.get(pk=self.transcript.pk)
+        self.assertEqual(transcript.nearest_phrase(float(seconds))['offset_milliseconds'], 3332)
+        self.assertEqual(
+            [phrase['offset_milliseconds'] for phrase in transcript.phrases_between(3.332, 3.332)],
+            [3332],
+        )
+
+
+@override_settings(CLIP_STORE_ENABLED=False, VIDEO_CLIP_MODE='reencode')
+class ClipExtractionTests(MediaTestCase):
+    """Clips are cut in parallel batches and recorded on their steps in step order."""
+
+    def extract(self, steps):
+        transcript = self.create_video_transcript()
+        tutorial = Tutorial.objects.create(transcript=transcript, title="Test", steps=steps)
+        VideoClipService.extract_clips(tutorial, transcript)
+        tutorial.refresh_from_db()
+        return tutorial
+
+    def test_every_clip_is_written_in_parallel_batches(self):
+        steps = [
+            {'index': 1, 'text': "One", 'timestamp': 6.0, 'video_clip': {'start': 6.0, 'end': 8.0}},
+            {'index': 2, 'text': "Two", 'timestamp': 0.0, 'video_clip': {'start': 0.0, 'end': 2.0}},
+            {'index': 3, 'text': "Three", 'timestamp': 3.0},
+            {'index': 4, 'text': "Four", 'timestamp': 9.0, 'video_clip': {'start': 9.0, 'end': 11.0}},
+        ]
+        with override_settings(VIDEO_CLIP_WORKERS=2):
+            tutorial = self.extract(steps)
+
+        clips_dir = VideoClipService.get_clips_dir(tutorial)
+        self.assertNotIn('video_clip', tutorial.steps[2])
+        for step in (tutorial.steps[0], tutorial.steps[1], tutorial.steps[3]):
+            video_clip = step['video_clip']
+            self.assertEqual(video_clip['extraction'], EXTRACTION_REENCODE)
+            self.assertEqual(video_clip['cut_range'], [video_clip['start'], video_clip['end']])
+            self.assertTrue(os.path.isfile(os.path.join(clips_dir, os.path.basename(video_clip['file_url']))))
+        self.assertEqual(sorted(os.listdir(clips_dir)), [
+            'step_01_6.0s-8.0s.mp4', 'step_02_0.0s-2.0s.mp4', 'step_04_9.0s-11.0s.mp4',
+        ])
+
+    def test_failed_clip_does_not_stop_the_others(self):
+        steps = [
+            {'index': 1, 'text': "One", 'timestamp': 1.0, 'video_clip': {'start': 1.0, 'end': 3.0}},
+            {'index': 2, 'text': "Two", 'timestamp': 30.0, 'video_clip': {'start': 30.0, 'end': 40.0}},
+        ]
+        with override_settings(VIDEO_CLIP_WORKERS=1):
+            tutorial = self.extract(steps)
+
+        self.assertEqual(tutorial.steps[0]['video_clip']['extraction'], EXTRACTION_REENCODE)
+        self.assertEqual(tutorial.steps[1]['video_clip']['extraction'], EXTRACTION_FAILED)
+        self.assertIn('outside the video', tutorial.steps[1]['video_clip']['error'])
+        self.assertNotIn('file_url', tutorial.steps[1]['video_clip'])
+
+    def test_plan_is_sorted_by_time_and_skips_malformed_steps(self):
+        plan = VideoClipService.plan_clips([
+            {'index': 1, 'video_clip': {'start': 5, 'end': 6}},
+            {'index': 2, 'video_clip': {'start': 'soon', 'end': 6}},
+            {'index': 3, 'video_clip': {'start': 1, 'end': 2}},
+            {'video_clip': {'start': 1, 'end': 2}},
+        ])
+        self.assertEqual([job['position'] for job in plan], [2, 0])
+        self.assertEqual(plan[0]['filename'], 'step_03_1.0s-2.0s.mp4')
+
+
+class ClipStoreTests(MediaTestCase):
+    """Stored clips are shared by hard link, replaced atomically and evicted least recently used first."""
+
+    def write_clip(self, name, content):
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        with open(path, 'wb') as clip:
+            clip.write(content)
+        return path
+
+    def add(self, key, content, start=0.0):
+        ClipStoreService.add(key, 'source', start, start + 1, 'reencode:aac', self.write_clip(f'{key}.mp4', content))
+        return CachedClip.objects.get(key=key)
+
+    def test_restore_links_the_stored_clip(self):
+        cached = self.add('a' * 64, b'clip')
+        target = os.path.join(settings.MEDIA_ROOT, 'restored.mp4')
+
+        ClipStoreService.restore(cached, target)
+
+        store_path = os.path.join(settings.MEDIA_ROOT, cached.path)
+        self.assertTrue(os.path.samefile(store_path, target))
+        self.assertEqual(cached.size_bytes, 4)
+
+    def test_link_replaces_a_target_without_writing_through(self):
+        cached = self.add('b' * 64, b'stored')
+        target = os.path.join(settings.MEDIA_ROOT, 'clip.mp4')
+        ClipStoreService.restore(cached, target)
+
+        ClipStoreService.link(self.write_clip('other.mp4', b'new content'), target)
+
+        with open(os.path.join(settings.MEDIA_ROOT, cached.path), 'rb') as stored:
+            self.assertEqual(stored.read(), b'stored')
+        with open(target, 'rb') as clip:
+            self.assertEqual(clip.read(), b'new content')
+        self.assertFalse([name for name in os.listdir(settings.MEDIA_ROOT) if name.startswith('.partial-')])
+
+    def test_lookup_drops_entries_whose_file_is_gone(self):
+        kept, lost = self.add('c' * 64, b'kept'), self.add('d' * 64, b'lost')
+        os.remove(os.path.join(settings.MEDIA_ROOT, lost.path))
+
+        found = ClipStoreService.lookup([kept.key, lost.key])
+
+        self.assertEqual(list(found), [kept.key])
+        self.assertFalse(CachedClip.objects.filter(key=lost.key).exists())
+
+    @override_settings(CLIP_STORE_MAX_BYTES=12)
+    def test_evict_removes_least_recently_used_clips(self):
+        old, recent = self.add('e' * 64, b'old clip'), self.add('f' * 64, b'recent clip')
+        CachedClip.objects.filter(key=old.key).update(last_used_at=timezone.now() - timedelta(days=1))
+        tutorial_clip = os.path.join(settings.MEDIA_ROOT, 'tutorial_clip.mp4')
+        ClipStoreService.restore(old, tutorial_clip)
+
+        evicted = ClipStoreService.evict()
+
+        self.assertEqual(evicted, [old.key])
+        self.assertEqual(list(CachedClip.objects.values_list('key', flat=True)), [recent.key])
+        # Tutorials keep their own link to the evicted clip
+        with open(tutorial_clip, 'rb') as clip:
+            self.assertEqual(clip.read(), b'old clip')
+
+    @override_settings(CLIP_STORE_ENABLED=True, VIDEO_CLIP_MODE='reencode', VIDEO_CLIP_WORKERS=1)
+    def test_same_range_of_the_same_video_is_not_cut_again(self):
+        transcript = self.create_video_transcript(seconds=4)
+        steps = [{'index': 1, 'text': "One", 'timestamp': 1.0, 'video_clip': {'start': 1.0, 'end': 3.0}}]
+        first = Tutorial.objects.create(transcript=transcript, title="First", steps=steps)
+        second = Tutorial.objects.create(transcript=transcript, title="Second", steps=steps)
+
+        VideoClipService.extract_clips(first, transcript)
+        VideoClipService.extract_clips(second, transcript)
+
+        self.assertEqual(first.steps[0]['video_clip']['extraction'], EXTRACTION_REENCODE)
+        self.assertEqual(second.steps[0]['video_clip']['extraction'], EXTRACTION_CACHED)
+        filename = 'step_01_1.0s-3.0s.mp4'
+        self.assertTrue(os.path.samefile(
+            os.path.join(VideoClipService.get_clips_dir(first), filename),
+            os.path.join(VideoClipService.get_clips_dir(second), filename),
+        ))
+
+
+@override_settings(LLM_BACKEND='fake', LLM_FAKE_LATENCY_SECONDS=0, LLM_FAKE_FAILURE_RATE=0, GENERATION_JOB_HEARTBEAT_SECONDS=60)
+class GenerationJobQueueTests(TestCase):
+    """Jobs are claimed once, oldest first, and recovered when their worker dies."""
+
+    def setUp(self):
+        self.transcript = create_transcript()
+
+    def test_claim_takes_the_oldest_queued_job(self):
+        first = GenerationJobService.enqueue(self.transcript)
+        second = GenerationJobService.enqueue(self.transcript)
+
+        claimed = GenerationJobService.claim_next('worker-1')
+
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(claimed.status, GenerationJob.STATUS_RUNNING)
+        self.assertEqual(claimed.worker, 'worker-1')
+        self.assertEqual(claimed.attempts, 1)
+        self.assertEqual(GenerationJobService.claim_next('worker-2').pk, second.pk)
+        self.assertIsNone(GenerationJobService.claim_next('worker-3'))
+
+    def test_reclips_of_a_tutorial_are_queued_once_and_run_one_at_a_time(self):
+        tutorial = Tutorial.objects.create(transcript=self.transcript, title="Tutorial", steps=[])
+        running = GenerationJobService.enqueue_reclip(tutorial)
+        self.assertEqual(GenerationJobService.claim_next('worker-1').pk, running.pk)
+
+        queued = GenerationJobService.enqueue_reclip(tutorial)
+
+        self.assertEqual(GenerationJobService.enqueue_reclip(tutorial).pk, queued.pk)
+        self.assertIsNone(GenerationJobService.claim_next('worker-2'))
+        GenerationJob.objects.filter(pk=running.pk).update(status=GenerationJob.STATUS_SUCCEEDED)
+        self.assertEqual(GenerationJobService.claim_next('worker-2').pk, queued.pk)
+
+    def test_run_records_the_generated_tutorial(self):
+        GenerationJobService.enqueue(self.transcript)
+        job = GenerationJobService.claim_next('worker-1')
+
+        GenerationJobService.run(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_SUCCEEDED)
+        self.assertEqual(job.tutorial.transcript, self.transcript)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_run_records_the_failure(self):
+        tutorial = Tutorial.objects.create(transcript=self.transcript, title="Tutorial", steps=[])
+        GenerationJobService.enqueue_reclip(tutorial)
+        tutorial.delete()
+        job = GenerationJobService.claim_next('worker-1')
+
+        GenerationJobService.run(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, GenerationJob.STATUS_FAILED)
+        self.assertEqual(job.error, "Tutorial was deleted")
+
+    @override_settings(GENERATION_JOB_STALE_SECONDS=60, GENERATION_JOB_MAX_ATTEMPTS=2)
+    def test_requeue_stale_jobs_until_attempts_run_out(self):
+        for _ in range(3):
+            GenerationJobService.enqueue(self.transcript)
+        retried, exhausted, alive = [GenerationJobService.claim_next('worker-1') for _ in range(3)]
+        stale = timezone.now() - timedelta(minutes=5)
+        GenerationJob.objects.filter(pk__in=[retried.pk, exhausted.pk]).update(heartbeat_at=stale)
+        GenerationJob.objects.filter(pk=exhausted.pk).update(attempts=2)
+
+        self.assertEqual(GenerationJobService.requeue_stale(), 2)
+
+        statuses = dict(GenerationJob.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[retried.pk], GenerationJob.STATUS_QUEUED)
+        self.assertEqual(statuses[exhausted.pk], GenerationJob.STATUS_FAILED)
+        self.assertEqual(statuses[alive.pk], GenerationJob.STATUS_RUNNING)
+
+
+class GenerationJobHeartbeatTests(TransactionTestCase):
+    """The heartbeat thread keeps a running job from looking stale."""
+
+    @override_settings(GENERATION_JOB_HEARTBEAT_SECONDS=0.05)
+    def test_heartbeat_is_refreshed_until_stopped(self):
+        GenerationJobService.enqueue(create_transcript())
+        job = GenerationJobService.claim_next('worker-1')
+        GenerationJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=GenerationJobService._heartbeat, args=(job.pk, stop))
+
+        heartbeat.start()
+        time.sleep(0.3)
+        stop.set()
+        heartbeat.join()
+
+        job.refresh_from_db()
+        self.assertGreater(job.heartbeat_at, timezone.now() - timedelta(minutes=1))
+
+
+class VideoProbeTests(MediaTestCase):
+    """Videos are indexed once on upload and clip ranges are checked against them."""
+
+    def test_probe_indexes_the_video(self):
+        transcript = self.create_video_transcript(seconds=4)
+
+        info = VideoProbeService.index(transcript)
+
+        self.assertAlmostEqual(info['duration'], 4.0, delta=0.1)
+        self.assertEqual((info['video_codec'], info['pix_fmt'], info['audio_codec']), ('h264', 'yuv420p', 'aac'))
+        self.assertEqual((info['width'], info['height']), (160, 120))
+        self.assertEqual([round(keyframe, 1) for keyframe in info['keyframes']], [0.0, 1.0, 2.0, 3.0])
+        transcript.refresh_from_db()
+        self.assertEqual(transcript.video_info, info)
+
+    def test_truncated_video_is_rejected(self):
+        path = os.path.join(settings.MEDIA_ROOT, 'truncated.mp4')
+        make_video(path, seconds=4)
+        with open(path, 'r+b') as video:
+            video.truncate(os.path.getsize(path) // 2)
+
+        with self.assertRaises(VideoProbeError):
+            VideoProbeService.probe(path)
+
+    def test_file_that_is_not_a_video_is_rejected(self):
+        path = os.path.join(settings.MEDIA_ROOT, 'notes.mp4')
+        with open(path, 'w') as notes:
+            notes.write("not a video")
+
+        with self.assertRaises(VideoProbeError):
+            VideoProbeService.probe(path)
+
+    def test_clip_ranges_are_clamped_to_the_video(self):
+        steps = [
+            {'index': 1, 'text': "Before", 'video_clip': {'start': -2.0, 'end': 3.0}},
+            {'index': 2, 'text': "After", 'video_clip': {'start': 8.0, 'end': 15.0}},
+            {'index': 3, 'text': "Outside", 'video_clip': {'start': 11.0, 'end': 20.0}},
+            {'index': 4, 'text': "Malformed", 'video_clip': {'start': "soon"}},
+            {'index': 5, 'text': "No clip"},
+        ]
+
+        clamped = VideoProbeService.clamp_clip_ranges(steps, duration=10.0)
+
+        self.assertEqual(clamped[0]['video_clip'], {'start': 0.0, 'end': 3.0})
+        self.assertEqual(clamped[1]['video_clip'], {'start': 8.0, 'end': 10.0})
+        self.assertNotIn('video_clip', clamped[2])
+        self.assertNotIn('video_clip', clamped[3])
+        self.assertEqual(clamped[4], steps[4])
+        # The steps of the model answer are left untouched
+        self.assertEqual(steps[0]['video_clip'], {'start': -2.0, 'end': 3.0})
+
+    def test_nearest_keyframe(self):
+        self.assertEqual(VideoProbeService.nearest_keyframe([0.0, 2.0, 4.0], 2.9), 2.0)
+        self.assertEqual(VideoProbeService.nearest_keyframe([0.0, 2.0, 4.0], 3.1), 4.0)
+        self.assertEqual(VideoProbeService.nearest_keyframe([0.0, 2.0, 4.0], 9.0), 4.0)
+        self.assertIsNone(VideoProbeService.nearest_keyframe([], 1.0))
+
+
+@override_settings(CHUNKED_UPLOAD_MAX_CHUNK_BYTES=4)
+class ChunkedUploadTests(MediaTestCase):
+    """Chunks are appended at the committed offset and hashed as they arrive."""
+
+    content = b'0123456789'
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create(username='uploader')
+        self.upload = ChunkedUploadService.start(self.user, 'video.mp4', len(self.content))
+
+    def send(self, offset, size=4):
+        return ChunkedUploadService.append(self.upload, offset, io.BytesIO(self.content[offset:offset + size]))
+
+    def test_chunks_are_assembled_and_hashed(self):
+        for offset in range(0, len(self.content), 4):
+            self.upload = self.send(offset)
+
+        upload = ChunkedUploadService.finalize(self.upload, hashlib.sha256(self.content).hexdigest().upper())
+
+        self.assertEqual(upload.status, upload.STATUS_COMPLETE)
+        self.assertEqual(upload.sha256, hashlib.sha256(self.content).hexdigest())
+        with open(ChunkedUploadService.get_partial_path(upload), 'rb') as partial:
+            self.assertEqual(partial.read(), self.content)
+        self.assertEqual(os.listdir(settings.CHUNKED_UPLOAD_DIR), [f"{upload.id}.part"])
+
+    def test_chunk_at_a_stale_offset_conflicts(self):
+        self.send(0)
+
+        with self.assertRaises(UploadConflict) as conflict:
+            self.send(0)
+
+        self.assertEqual(conflict.exception.offset, 4)
+        self.assertEqual(os.path.getsize(ChunkedUploadService.get_partial_path(self.upload)), 4)
+
+    def test_oversized_chunk_is_rejected_and_not_committed(self):
+        with self.assertRaises(ValidationError):
+            self.send(0, size=5)
+
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.offset, 0)
+        self.assertEqual(self.send(0).offset, 4)
+
+    def test_hash_is_rebuilt_from_the_partial_file(self):
+        self.upload = self.send(0)
+        # Next chunks handled by another process, without the running hash
+        _hashers.clear()
+        self.upload = self.send(4)
+        _hashers.clear()
+        self.upload = self.send(8)
+        _hashers.clear()
+
+        upload = ChunkedUploadService.finalize(self.upload)
+
+        self.assertEqual(upload.sha256, hashlib.sha256(self.content).hexdigest())
+
+    def test_checksum_mismatch_and_missing_bytes_are_rejected(self):
+        self.upload = self.send(0)
+        with self.assertRaises(ValidationError):
+            ChunkedUploadService.finalize(self.upload)
+
+        for offset in (4, 8):
+            self.upload = self.send(offset)
+        with self.assertRaises(ValidationError):
+            ChunkedUploadService.finalize(self.upload, hashlib.sha256(b'other').hexdigest())
+
+    def test_discard_removes_the_partial_file(self):
+        self.send(0)
+
+        ChunkedUploadService.discard(self.upload)
+
+        self.assertEqual(os.listdir(settings.CHUNKED_UPLOAD_DIR), [])
+        self.assertFalse(VideoUpload.objects.filter(pk=self.upload.pk).exists())
+
+
+class TranscriptListTests(TestCase):
+    """Lists return phrase statistics and never load the phrases."""
+
+    def setUp(self):
+        phrases = [
+            {'offset_milliseconds': 0, 'duration_milliseconds': 1000, 'display': "Hello.", 'locale': 'fr-FR', 'confidence': 0.9},
+            {'offset_milliseconds': 1000, 'duration_milliseconds': 1000, 'display': "Open.", 'locale': 'fr-FR', 'confidence': 0.7},
+            {'offset_milliseconds': 2000, 'duration_milliseconds': 1000, 'display': "Close.", 'locale': 'en-US'},
+        ]
+        self.transcript = create_transcript(phrases=phrases, **TranscriptService.summarize_phrases(phrases))
+        Tutorial.objects.create(transcript=self.transcript, title="Tutorial", steps=[])
+        self.client = APIClient()
+        self.client.force_authenticate(self.transcript.user)
+
+    def test_phrase_statistics(self):
+        self.assertEqual(self.transcript.phrase_count, 3)
+        self.assertEqual(self.transcript.language, 'fr-FR')
+        self.assertAlmostEqual(self.transcript.average_confidence, 0.8)
+        self.assertEqual(
+            TranscriptService.summarize_phrases([]),
+            {'phrase_count': 0, 'language': "", 'average_confidence': None},
+        )
+
+    def test_transcript_list_has_statistics_without_phrases(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/transcripts/')
+
+        self.assertEqual(response.status_code, 200)
+        transcript = response.json()[0]
+        self.assertNotIn('phrases', transcript)
+        self.assertEqual((transcript['phrase_count'], transcript['language']), (3, 'fr-FR'))
+        self.assertFalse([query for query in queries if 'phrase_data' in query['sql']])
+
+    def test_tutorial_list_nests_the_transcript_without_phrases(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/tutorials/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('phrases', response.json()[0]['transcript'])
+        self.assertFalse([query for query in queries if 'phrase_data' in query['sql']])
+
+    def test_phrases_are_returned_by_the_detail_and_phrases_endpoints(self):
+        detail = self.client.get(f'/api/transcripts/{self.transcript.id}/').json()
+        phrases = self.client.get(f'/api/transcripts/{self.transcript.id}/phrases/').json()
+
+        self.assertEqual([phrase['display'] for phrase in detail['phrases']], ["Hello.", "Open.", "Close."])
+        self.assertEqual(phrases, detail['phrases'])
+
+
+class PhraseStorageTests(TestCase):
+    """Phrases survive the compact columns unchanged and timings are readable on their own."""
+
+    phrases = [
+        {'offset_milliseconds': 1500, 'duration_milliseconds': 800, 'display': "Ouvrez le menu « Fichier ».", 'speaker': 2},
+        {'offsetMilliseconds': 3000.5, 'durationMilliseconds': 1200, 'text': "camelCase keys"},
+        {'offset_milliseconds': True, 'display': "No usable timing"},
+    ]
+
+    def test_columns_round_trip(self):
+        data, offsets, durations = encode_phrases(self.phrases)
+
+        self.assertEqual(decode_phrases(data), self.phrases)
+        self.assertEqual(list(decode_column(durations)), [800.0, 1200.0, 0.0])
+        decoded_offsets = decode_column(offsets)
+        self.assertEqual(list(decoded_offsets[:2]), [1500.0, 3000.5])
+        self.assertTrue(math.isnan(decoded_offsets[2]))
+
+    def test_empty_columns(self):
+        self.assertEqual(decode_phrases(None), [])
+        self.assertEqual(list(decode_column(b'')), [])
+        self.assertEqual(decode_phrases(encode_phrases([])[0]), [])
+
+    def test_transcript_timings_load_without_phrases(self):
+        transcript = create_transcript(phrases=self.phrases)
+
+        deferred = Transcript.objects.defer('phrase_data').get(pk=transcript.pk)
+
+        self.assertEqual(list(deferred.get_phrase_durations()), [800.0, 1200.0, 0.0])
+        self.assertNotIn('phrase_data', deferred.__dict__)
+        self.assertEqual(Transcript.objects.get(pk=transcript.pk).phrases, self.phrases)
+
+
+class BulkImportTests(TestCase):
+    """Each imported item is created once and every other outcome is reported per item."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='importer')
+
+    def transcript_json(self, text):
+        return json.dumps({
+            'timestamp': '2024-01-01T00:00:00Z',
+            'duration_in_ticks': 600000000,
+            'phrases': [{'offset_milliseconds': 0, 'duration_milliseconds': 2500, 'display': text, 'locale': 'en-US'}],
+        }).encode()
+
+    def test_ndjson_items_are_deduplicated_and_validated(self):
+        taken = self.transcript_json("Taken")
+        BulkImportService.import_items(get_user_model().objects.create(username='other'), [('taken.json', taken)])
+        lines = [
+            self.transcript_json("First"),
+            self.transcript_json("Second"),
+            self.transcript_json("First"),
+            taken,
+            b'{"timestamp": ',
+            json.dumps({'duration_in_ticks': 1, 'phrases': []}).encode(),
+        ]
+
+        with override_settings(BULK_IMPORT_BATCH_SIZE=2):
+            results = BulkImportService.import_file(self.user, io.BytesIO(b'\n'.join(lines) + b'\n\n'))
+
+        self.assertEqual(
+            [result['status'] for result in results],
+            ['created', 'created', 'duplicate', 'conflict', 'invalid', 'invalid'],
+        )
+        self.assertEqual(results[2]['duplicate_of'], 'import.ndjson line 1')
+        self.assertIn("timestamp", results[5]['error'])
+        created = Transcript.objects.get(pk=results[0]['id'])
+        self.assertEqual((created.phrase_count, created.language), (1, 'en-US'))
+        self.assertEqual(created.phrases[0]['display'], "First")
+
+        again = BulkImportService.import_items(self.user, [('again.json', lines[0])])
+        self.assertEqual(again[0], {'name': 'again.json', 'status': 'exists', 'id': results[0]['id']})
+
+    def test_zip_archive_json_members_are_imported(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zip_file:
+            zip_file.writestr('calls/one.json', self.transcript_json("One"))
+            zip_file.writestr('__MACOSX/calls/._one.json', b'resource fork')
+            zip_file.writestr('calls/readme.txt', b'not a transcript')
+
+        results = BulkImportService.import_file(self.user, archive)
+
+        self.assertEqual(results, [{'name': 'calls/one.json', 'status': 'created', 'id': results[0]['id']}])
+        self.assertEqual(Transcript.objects.get(pk=results[0]['id']).filename, 'one.json')
+
+    @override_settings(BULK_IMPORT_WORKERS=2)
+    def test_large_batches_are_validated_by_the_shared_pool(self):
+        items = [(f'{number}.json', self.transcript_json(f"Item {number}")) for number in range(16)]
+        self.addCleanup(BulkImportService._reset_executor)
+
+        first = BulkImportService.import_items(self.user, items[:8] + [('bad.json', b'[')] * 8)
+        executor = bulk_import_service._executor
+        second = BulkImportService.import_items(self.user, items[8:])
+
+        self.assertEqual(BulkImportService.summarize(first), {'created': 8, 'invalid': 1, 'duplicate': 7})
+        self.assertEqual(BulkImportService.summarize(second), {'created': 8})
+        self.assertIsNotNone(executor)
+        self.assertIs(bulk_import_service._executor, executor)
+
+    @override_settings(BULK_IMPORT_WORKERS=2)
+    def test_items_of_a_crashed_worker_can_be_imported_again(self):
+        items = [(f'{number}.json', self.transcript_json(f"Item {number}")) for number in range(8)]
+        broken = mock.Mock()
+        broken.map.side_effect = BrokenProcessPool("worker died")
+
+        with mock.patch.object(BulkImportService, '_get_executor', return_value=broken):
+            failed = BulkImportService.import_items(self.user, items)
+        with override_settings(BULK_IMPORT_WORKERS=1):
+            retried = BulkImportService.import_items(self.user, items)
+
+        self.assertEqual(BulkImportService.summarize(failed), {'failed': 8})
+        self.assertEqual(BulkImportService.summarize(retried), {'created': 8})
+
+
+class PhraseIndexTests(TestCase):
+    """Time queries return the same phrases as a scan of every phrase would."""
+
+    def build(self, timings):
+        return PhraseIndex(array('d', [offset for offset, _ in timings]), array('d', [duration for _, duration in timings]))
+
+    def test_between_finds_overlapping_phrases_in_start_order(self):
+        # Unsorted, with a long phrase overlapping later ones and one without offset
+        index = self.build([(5000, 1000), (0, 10000), (2000, 500), (math.nan, 1000), (12000, 1000)])
+
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.between(2600, 4000), [1])
+        self.assertEqual(index.between(2500, 5000), [1, 2, 0])
+        self.assertEqual(index.between(10500, 11500), [])
+        self.assertEqual(index.between(13000, 20000), [4])
+
+    def test_between_matches_a_full_scan(self):
+        timings = [((number * 7919) % 5000, (number * 104729) % 1500) for number in range(300)]
+        index = self.build(timings)
+
+        for start, end in [(0, 0), (100, 900), (2500, 2600), (4999, 7000), (-10, 10)]:
+            expected = [position for position, (offset, duration) in enumerate(timings) if offset <= end and offset + duration >= start]
+            self.assertEqual(sorted(index.between(start, end)), expected)
+
+    def test_nearest_prefers_the_phrase_being_spoken(self):
+        index = self.build([(0, 1000), (3000, 1000), (3500, 200)])
+
+        self.assertEqual(index.nearest(3600), 1)
+        self.assertEqual(index.nearest(1400), 0)
+        self.assertEqual(index.nearest(2600), 1)
+        self.assertEqual(index.nearest(-500), 0)
+        self.assertIsNone(self.build([]).nearest(0))
+
+    def test_transcript_queries_use_seconds(self):
+        transcript = create_transcript()
+
+        self.assertEqual([phrase['display'] for phrase in transcript.phrases_between(3.1, 6.2)], ["Do action 1.", "Do action 2."])
+        self.assertEqual(transcript.nearest_phrase(8.9)['display'], "Do action 3.")
+
+
+@override_settings(LLM_BACKEND='fake', LLM_FAKE_LATENCY_SECONDS=0, LLM_FAKE_FAILURE_RATE=0, LLM_CACHE_ENABLED=True)
+class CompletionCacheTests(TestCase):
+    """Completions are served again for identical requests only, and the cache stays within its budget."""
+
+    params = {
+        'model': 'gpt-4o',
+        'temperature': 0.3,
+        'messages': [{'role': 'system', 'content': "Write a tutorial."}, {'role': 'user', 'content': "0|Open the app.\n3|Sign in."}],
+    }
+
+    def test_key_depends_on_every_parameter_but_not_their_order(self):
+        key = completion_cache.make_key(self.params)
+
+        self.assertEqual(completion_cache.make_key(dict(reversed(list(self.params.items())))), key)
+        self.assertNotEqual(completion_cache.make_key({**self.params, 'temperature': 0.2}), key)
+        self.assertNotEqual(completion_cache.make_key({**self.params, 'messages': self.params['messages'][:1]}), key)
+
+    def test_lookup_counts_hits_and_ignores_expired_entries(self):
+        completion_cache.store('fresh', self.params, '{"title": "Fresh"}')
+        completion_cache.store('old', self.params, '{"title": "Old"}')
+        CachedCompletion.objects.filter(key='old').update(created_at=timezone.now() - timedelta(hours=settings.LLM_CACHE_TTL_HOURS + 1))
+
+        self.assertEqual(completion_cache.lookup('fresh'), '{"title": "Fresh"}')
+        self.assertIsNone(completion_cache.lookup('old'))
+        self.assertIsNone(completion_cache.lookup('missing'))
+        self.assertEqual(CachedCompletion.objects.get(key='fresh').hits, 1)
+
+    @override_settings(LLM_CACHE_MAX_BYTES=40)
+    def test_least_recently_used_entries_are_evicted(self):
+        completion_cache.store('first', self.params, '{"title": "First"}')
+        completion_cache.store('second', self.params, '{"title": "Two"}')
+        CachedCompletion.objects.filter(key='second').update(last_used_at=timezone.now() - timedelta(hours=1))
+        completion_cache.lookup('first')
+
+        completion_cache.store('third', self.params, '{"title": "Three"}')
+
+        self.assertEqual(set(CachedCompletion.objects.values_list('key', flat=True)), {'first', 'third'})
+
+    def test_complete_json_reuses_the_cached_completion(self):
+        with mock.patch.object(openai_client, 'create_chat_completion', wraps=openai_client.create_chat_completion) as create:
+            first = openai_client.complete_json(self.params)
+            second = openai_client.complete_json(self.params)
+            forced = openai_client.complete_json(self.params, force=True)
+
+        self.assertEqual(first, second)
+        self.assertEqual(forced, first)
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(first['steps'][0]['timestamp'], 0.0)
+
+    def test_complete_json_skips_a_cached_completion_that_fails_validation(self):
+        key = completion_cache.make_key(self.params)
+        completion_cache.store(key, self.params, '{"title": ""}')
+
+        def validate(data):
+            if not data.get('title'):
+                raise ValueError("Missing title")
+            return data, []
+
+        data = openai_client.complete_json(self.params, validate=validate)
+
+        self.assertTrue(data['title'])
+        self.assertEqual(json.loads(CachedCompletion.objects.get(key=key).content)['title'], data['title'])
+
+
+class StreamingJSONTests(TestCase):
+    """Members come out as soon as they are complete, wherever the input is cut."""
+
+    document = '{"title": "Braces {[ and \\"quotes\\"", "steps": [{"text": "One\\u00e9"}, {"text": "Two", "tags": ["a]"]}], "count": 12, "done": true, "empty": []}'
+
+    expected = [
+        (FIELD, 'title', 'Braces {[ and "quotes"'),
+        (ITEM, 'steps', {'text': "Oneé"}),
+        (ITEM, 'steps', {'text': "Two", 'tags': ["a]"]}),
+        (END, 'steps', None),
+        (FIELD, 'count', 12),
+        (FIELD, 'done', True),
+        (END, 'empty', None),
+    ]
+
+    def parse(self, pieces):
+        parser = StreamingObjectParser(stream_keys=['steps', 'empty'])
+        events = [event for piece in pieces for event in parser.feed(piece)]
+        return events + parser.close()
+
+    def test_events_are_the_same_for_any_split(self):
+        self.assertEqual(self.parse([self.document]), self.expected)
+        self.assertEqual(self.parse(list(self.document)), self.expected)
+        for size in (2, 3, 7, 16):
+            pieces = [self.document[start:start + size] for start in range(0, len(self.document), size)]
+            self.assertEqual(self.parse(pieces), self.expected)
+
+    def test_items_are_emitted_before_the_array_closes(self):
+        parser = StreamingObjectParser(stream_keys=['steps'])
+
+        self.assertEqual(parser.feed('{"steps": [{"text": "One"}, {"te'), [(ITEM, 'steps', {'text': "One"})])
+        self.assertEqual(parser.feed('xt": "Two"}'), [(ITEM, 'steps', {'text': "Two"})])
+        self.assertFalse(parser.done)
+
+    def test_number_at_the_end_of_the_input_waits_for_more(self):
+        parser = StreamingObjectParser()
+
+        self.assertEqual(parser.feed('{"count": 12'), [])
+        self.assertEqual(parser.feed('3}'), [(FIELD, 'count', 123)])
+        self.assertTrue(parser.done)
+
+    def test_invalid_input_is_rejected(self):
+        for document in ('["not an object"]', '{"a": 1} {}', '{"a": tru}', '{"a" 1}', '{"steps": {}}'):
+            with self.subTest(document=document), self.assertRaises(json.JSONDecodeError):
+                self.parse([document])
+
+        parser = StreamingObjectParser()
+        parser.feed('{"a": [1, 2')
+        with self.assertRaises(json.JSONDecodeError):
+            parser.close()
+
+    def test_iter_object_decodes_utf8_split_across_chunks(self):
+        raw = '\ufeff{"title": "Café"}'.encode('utf-8')
+        chunks = [raw[position:position + 1] for position in range(len(raw))]
+
+        self.assertEqual(list(iter_object(chunks)), [(FIELD, 'title', "Café")])
+
+
+@override_settings(LLM_BACKEND='fake', LLM_FAKE_LATENCY_SECONDS=0, LLM_FAKE_FAILURE_RATE=0, LLM_CACHE_ENABLED=True)
+class StreamCompletionTests(TestCase):
+    """Streamed answers are validated before caching, and replayed from the cache through the same parser."""
+
+    params = CompletionCacheTests.params
+
+    def test_streamed_answer_is_cached_and_replayed(self):
+        streamed = list(openai_client.stream_json(self.params, stream_keys=['steps']))
+
+        with mock.patch.object(openai_client, 'create_chat_completion') as create:
+            replayed = list(openai_client.stream_json(self.params, stream_keys=['steps']))
+
+        create.assert_not_called()
+        self.assertEqual(replayed, streamed)
+        self.assertIn((END, 'steps', None), streamed)
+        self.assertEqual([event[0] for event in streamed].count(ITEM), 2)
+
+    def test_answer_failing_validation_is_not_cached(self):
+        def validate(data):
+            raise ValueError("Rejected")
+
+        with self.assertRaises(ValueError):
+            list(openai_client.stream_json(self.params, validate=validate))
+
+        self.assertFalse(CachedCompletion.objects.exists())
+
+    def test_invalid_cached_answer_is_not_replayed(self):
+        key = completion_cache.make_key(self.params)
+        completion_cache.store(key, self.params, '{"title": "Cut')
+
+        events = list(openai_client.stream_json(self.params, stream_keys=['steps']))
+
+        self.assertEqual(events[0][:2], (FIELD, 'title'))
+        json.loads(CachedCompletion.objects.get(key=key).content)
+
+
+@override_settings(OPENAI_RPM_LIMIT=60, OPENAI_TPM_LIMIT=1000, OPENAI_RATE_LIMIT_POLL_SECONDS=1.0)
+class RateLimiterTests(TestCase):
+    """Calls share one token bucket and are admitted in arrival order."""
+
+    def bucket(self):
+        return RateLimitBucket.objects.get(name=rate_limiter.BUCKET)
+
+    def test_acquire_takes_a_request_and_its_tokens(self):
+        self.assertLess(rate_limiter.acquire(300), 1.0)
+
+        bucket = self.bucket()
+        self.assertAlmostEqual(bucket.requests, 59, delta=0.5)
+        self.assertAlmostEqual(bucket.tokens, 700, delta=10)
+        self.assertFalse(RateLimitTicket.objects.exists())
+
+    def test_budget_refills_up_to_one_minute(self):
+        rate_limiter.acquire(1000)
+        RateLimitBucket.objects.update(refilled_at=timezone.now() - timedelta(seconds=30))
+
+        self.assertAlmostEqual(rate_limiter.status()['tokens_available'], 500, delta=10)
+
+        RateLimitBucket.objects.update(refilled_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(rate_limiter.status()['tokens_available'], 1000)
+
+    def test_waiting_calls_keep_their_place(self):
+        rate_limiter.acquire(500)
+        large = rate_limiter._take_ticket(800)
+        small = rate_limiter._take_ticket(100)
+
+        # The small call fits the budget but would delay the large one ahead of it
+        self.assertIsNotNone(rate_limiter._try_admit(large))
+        self.assertIsNotNone(rate_limiter._try_admit(small))
+        self.assertEqual(rate_limiter.status()['queue_depth'], 2)
+
+        RateLimitBucket.objects.update(refilled_at=timezone.now() - timedelta(minutes=1))
+        self.assertIsNone(rate_limiter._try_admit(large))
+        self.assertIsNone(rate_limiter._try_admit(small))
+        self.assertEqual(rate_limiter.status()['queue_depth'], 0)
+
+    def test_stale_tickets_leave_the_queue(self):
+        rate_limiter.acquire(1000)
+        abandoned = rate_limiter._take_ticket(100)
+        RateLimitTicket.objects.filter(pk=abandoned.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=1))
+        waiting = rate_limiter._take_ticket(100)
+        RateLimitBucket.objects.update(refilled_at=timezone.now() - timedelta(seconds=9))
+
+        self.assertIsNone(rate_limiter._try_admit(waiting))
+        self.assertFalse(RateLimitTicket.objects.exists())
+
+    def test_hold_back_empties_the_budgets(self):
+        rate_limiter.hold_back(2.0)
+
+        bucket = self.bucket()
+        self.assertLessEqual(bucket.tokens, 0)
+        self.assertAlmostEqual(bucket.requests, -1, delta=0.1)
+        self.assertGreater(rate_limiter._try_admit(rate_limiter._take_ticket(10)), 0)
+
+    def test_calls_larger_than_the_limit_are_capped(self):
+        self.assertEqual(rate_limiter._take_ticket(5000).tokens, 1000)
+
+    @override_settings(OPENAI_RPM_LIMIT=0)
+    def test_disabled_limiter(self):
+        self.assertEqual(rate_limiter.acquire(10 ** 6), 0.0)
+        self.assertEqual(rate_limiter.status(), {'enabled': False})
+        self.assertFalse(RateLimitBucket.objects.exists())
+
+
+@override_settings(LLM_BACKEND='fake', LLM_FAKE_LATENCY_SECONDS=0, LLM_FAKE_FAILURE_RATE=0, OPENAI_SECTION_WINDOW_SECONDS=6)
+class SectionRegenerationTests(TestCase):
+    """One section is rewritten from the phrases it is about, the rest of the tutorial is kept."""
+
+    def setUp(self):
+        self.tutorial = Tutorial.objects.create(
+            transcript=create_transcript(),
+            title="Original title",
+            summary="Original summary.",
+            tips=["Original tip."],
+            tags=['original'],
+            steps=[
+                {'index': 1, 'text': "First", 'timestamp': 0.0},
+                {'index': 2, 'text': "Second", 'timestamp': 30.0, 'video_clip': {'start': 30.0, 'end': 40.0, 'file': 'clip.mp4'}},
+                {'index': 3, 'text': "Third", 'timestamp': 60.0},
+            ],
+        )
+
+    def regenerate(self, section, step_index=None):
+        """Regenerate a section, returning the tutorial and the prompt timestamps sent to the model."""
+        with mock.patch.object(openai_client, 'create_chat_completion', wraps=openai_client.create_chat_completion) as create:
+            tutorial = TutorialService.regenerate_section(self.tutorial, section, step_index, force=True)
+        prompt = create.call_args.kwargs['messages'][-1]['content']
+        return tutorial, [float(seconds) for seconds, _ in LINE_PATTERN.findall(prompt)]
+
+    def test_step_is_rewritten_from_the_phrases_around_it(self):
+        tutorial, seconds = self.regenerate(GenerationJob.SECTION_STEP, 2)
+
+        self.assertEqual(seconds, [24.0, 27.0, 30.0, 33.0, 36.0])
+        step = tutorial.steps[1]
+        self.assertEqual(step['index'], 2)
+        self.assertIn("Do action 10.", step['text'])
+        # Same clip range as before: the clip already cut is kept
+        self.assertEqual(step['video_clip'], {'start': 30.0, 'end': 40.0, 'file': 'clip.mp4'})
+        self.assertEqual([tutorial.steps[0], tutorial.steps[2]], [self.tutorial.steps[0], self.tutorial.steps[2]])
+        self.assertEqual((tutorial.title, tutorial.summary), ("Original title", "Original summary."))
+
+    def test_tips_are_written_from_what_follows_each_step(self):
+        tutorial, seconds = self.regenerate(GenerationJob.SECTION_TIPS)
+
+        self.assertEqual(seconds, [0.0, 3.0, 6.0, 30.0, 33.0, 36.0])
+        self.assertEqual(tutorial.tips, [f"Listen to what is said at {value:g}s." for value in (0, 3, 6)])
+        self.assertEqual(tutorial.steps, self.tutorial.steps)
+
+    def test_title_is_written_without_phrases(self):
+        tutorial, seconds = self.regenerate(GenerationJob.SECTION_TITLE)
+
+        self.assertEqual(seconds, [])
+        self.assertNotEqual(tutorial.title, "Original title")
+        self.assertEqual(tutorial.summary, "Original summary.")
+
+    def test_unknown_step_is_rejected(self):
+        with self.assertRaises(ValueError):
+            TutorialService.regenerate_section(self.tutorial, GenerationJob.SECTION_STEP, 9)
+
+    def test_regenerate_endpoint_queues_a_job(self):
+        client = APIClient()
+        client.force_authenticate(self.tutorial.transcript.user)
+        url = f'/api/tutorials/{self.tutorial.id}/regenerate/'
+
+        self.assertEqual(client.post(url, {'section': 'intro'}, format='json').status_code, 400)
+        self.assertEqual(client.post(url, {'section': 'step', 'step': 9}, format='json').status_code, 400)
+        response = client.post(url, {'section': 'summary'}, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        job = GenerationJobService.claim_next('worker-1')
+        self.assertEqual((str(job.pk), job.section), (response.json()['id'], GenerationJob.SECTION_SUMMARY))
+        GenerationJobService.run(job)
+        self.tutorial.refresh_from_db()
+        self.assertNotEqual(self.tutorial.summary, "Original summary.")
+        self.assertEqual(self.tutorial.title, "Original title")
+
+
+class StructuredOutputTests(TestCase):
+    """Common defects of model answers are repaired locally instead of asking again."""
+
+    def test_valid_json_needs_no_fix(self):
+        self.assertEqual(parse_json('{"title": "A, }"}'), ({'title': "A, }"}, []))
+
+    def test_syntax_defects_are_repaired(self):
+        content = 'Here is the tutorial:\n```json\n{"title": "Line one\nline two", "tags": ["a", "b",], "note": "x,]",}\n```'
+
+        data, fixes = parse_json(content)
+
+        self.assertEqual(data, {'title': "Line one\nline two", 'tags': ["a", "b"], 'note': "x,]"})
+        self.assertEqual(fixes, [
+            "removed text around the JSON object",
+            "removed 2 trailing commas",
+            "escaped control characters in strings",
+        ])
+        self.assertEqual(parse_json('```json\n{"a": 1,}\n```')[1], ["removed markdown fences", "removed 1 trailing comma"])
+
+    def test_unrepairable_json_is_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_json('{"title": "Cut')
+
+    def test_steps_are_repaired_dropped_and_renumbered(self):
+        data = {
+            'title': " Title ",
+            'summary': None,
+            'tips': ["Tip", "", 3],
+            'tags': ["a", "b", "c", "d", "e", "f"],
+            'steps': [
+                {'index': 4, 'text': " Open ", 'timestamp': "12.5s", 'video_clip': {'start': 20, 'end': -3}},
+                {'index': 5, 'text': "", 'timestamp': 1},
+                {'index': 6, 'text': "Close", 'timestamp': "soon"},
+                {'index': 7, 'text': "Save", 'timestamp': 30, 'video_clip': None},
+            ],
+        }
+
+        tutorial, fixes = validate_tutorial(data)
+
+        self.assertEqual(tutorial['title'], "Title")
+        self.assertEqual((tutorial['summary'], tutorial['introduction']), ("", ""))
+        self.assertEqual(tutorial['tips'], ["Tip"])
+        self.assertEqual(tutorial['tags'], ["a", "b", "c", "d", "e"])
+        self.assertEqual(tutorial['steps'], [
+            {'index': 1, 'text': "Open", 'timestamp': 12.5, 'video_clip': {'start': 0.0, 'end': 20.0}},
+            {'index': 2, 'text': "Save", 'timestamp': 30.0},
+        ])
+        for fix in ("dropped step 2 without text", "dropped step 3 without timestamp", "swapped the clip start and end of step 1", "renumbered steps from 1"):
+            self.assertIn(fix, fixes)
+
+    def test_unusable_tutorials_are_rejected(self):
+        for data in ([], {'title': " ", 'steps': []}, {'title': "Title"}, {'title': "Title", 'steps': [{'text': "No time"}]}):
+            with self.subTest(data=data), self.assertRaises(ValueError):
+                validate_tutorial(data)
+
+    def test_malformed_clip_is_removed(self):
+        fixes = []
+
+        step = repair_step({'text': "Open", 'timestamp': 3, 'video_clip': {'start': "later"}}, fixes)
+
+        self.assertEqual(step, {'text': "Open", 'timestamp': 3.0})
+        self.assertEqual(fixes, ["removed the malformed clip of step"])
+
+    def test_response_format_follows_the_setting(self):
+        self.assertEqual(response_format('tutorial', TUTORIAL_SCHEMA)['json_schema']['strict'], True)
+        with override_settings(OPENAI_STRUCTURED_OUTPUT=False):
+            self.assertIsNone(response_format('tutorial', TUTORIAL_SCHEMA))
+
+    @override_settings(LLM_CACHE_ENABLED=True, OPENAI_INVALID_RESPONSE_RETRIES=1)
+    def test_only_unrepairable_answers_are_asked_again(self):
+        params = {'model': 'gpt-4o', 'messages': [{'role': 'user', 'content': "Tutorial"}]}
+        answers = ['{"title": "Cut', '```json\n{"title": "Fixed",}\n```']
+        with mock.patch.object(openai_client, 'create_chat_completion', side_effect=[
+            _build_completion(params, answer, 'stop', None) for answer in answers
+        ]) as create:
+            data = openai_client.complete_json(params)
+
+        self.assertEqual(data, {'title': "Fixed"})
+        self.assertEqual(create.call_count, 2)
+        # Cached with its syntax repaired
+        self.assertEqual(completion_cache.lookup(completion_cache.make_key(params)), '{"title": "Fixed"}')
+
+
+@override_settings(
+    LLM_BACKEND='fake', LLM_FAKE_LATENCY_SECONDS=0, LLM_FAKE_FAILURE_RATE=0, LLM_CACHE_ENABLED=False,
+    LLM_MODEL='large-model', LLM_SMALL_MODEL='small-model',
+    LLM_SMALL_MAX_PROMPT_TOKENS=3000, LLM_SMALL_MAX_MINUTES=10.0, LLM_SMALL_MAX_TOKENS=2048,
+)
+class ModelRoutingTests(TestCase):
+    """Small transcripts go to the small model first, and to the large one when its answer is unusable."""
+
+    phrases = [{'offset_milliseconds': index * 3000, 'display': f"Do action {index}."} for index in range(20)]
+
+    def small_model_answers(self, content):
+        """Patch completions so that the small model answers `content` and the large one the fake tutorial."""
+        create = openai_client.create_chat_completion
+
+        def answer(**params):
+            if params['model'] != 'small-model':
+                return create(**params)
+            if params.get('stream'):
+                return ChunkStream(_build_chunks(params, content, 'stop', None))
+            return _build_completion(params, content, 'stop', None)
+
+        return mock.patch.object(openai_client, 'create_chat_completion', side_effect=answer)
+
+    def test_small_transcripts_try_the_small_model_first(self):
+        routes = openai_client.route_tutorial(self.phrases, {'prompt_tokens': 500})
+
+        self.assertEqual(routes, [
+            {'model': 'small-model', 'max_tokens': 2048},
+            {'model': 'large-model', 'max_tokens': openai_client.TUTORIAL_MAX_TOKENS},
+        ])
+
+    def test_large_or_long_transcripts_go_to_the_large_model(self):
+        long_phrases = [*self.phrases, {'offset_milliseconds': 11 * 60 * 1000, 'display': "Much later."}]
+
+        for phrases, prompt_tokens in ((self.phrases, 3001), (long_phrases, 500)):
+            routes = openai_client.route_tutorial(phrases, {'prompt_tokens': prompt_tokens})
+            self.assertEqual([route['model'] for route in routes], ['large-model'])
+
+        for small_model in ('', 'large-model'):
+            with self.subTest(small_model=small_model), override_settings(LLM_SMALL_MODEL=small_model):
+                routes = openai_client.route_tutorial(self.phrases, {'prompt_tokens': 500})
+                self.assertEqual([route['model'] for route in routes], ['large-model'])
+
+    def test_usable_small_model_answer_is_kept(self):
+        tutorial = openai_client.generate_tutorial_from_transcript(self.phrases)
+
+        self.assertEqual(tutorial['generation_model'], 'small-model')
+        self.assertTrue(tutorial['steps'])
+
+    def test_unusable_small_model_answer_escalates(self):
+        with self.small_model_answers('{"title": "No steps", "steps": []}') as create:
+            tutorial = openai_client.generate_tutorial_from_transcript(self.phrases)
+
+        self.assertEqual(tutorial['generation_model'], 'large-model')
+        # The small model is not asked again
+        self.assertEqual([call.kwargs['model'] for call in create.call_args_list], ['small-model', 'large-model'])
+
+    def test_streamed_escalation_restarts_the_tutorial(self):
+        with self.small_model_answers('{"title": "No steps", "steps": [{"text": ""}]}'):
+            events = list(openai_client.stream_tutorial_from_transcript(self.phrases))
+
+        restart = events.index((openai_client.RESTART, 'tutorial', 'large-model'))
+        self.assertEqual(events[0], (FIELD, 'title', "No steps"))
+        self.assertIn((FIELD, 'generation_model', 'large-model'), events[restart:])
+        self.assertTrue([event for event in events[restart:] if event[0] == ITEM])
@@ -1,20 +1,26 @@
 import json
 import logging
+import math
 import zipfile
 import io
 import os
+from asgiref.sync import sync_to_async
 from django.shortcuts import redirect
-from django.http import JsonResponse, HttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.contrib.auth import logout
 from django.conf import settings
-from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import action
+from rest_framework import viewsets, permissions, status, mixins
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser
-from rest_framework.serializers import ValidationError
-from .models import Transcript, Tutorial
-from .serializers import TranscriptSerializer, TutorialSerializer
-from .services import TranscriptService, TutorialService
+from rest_framework.parsers import MultiPartParser, JSONParser
+from rest_framework.serializers import BooleanField, IntegerField, ValidationError
+from . import metrics, rate_limiter
+from .models import Transcript, Tutorial, GenerationJob, VideoUpload
+from .serializers import TranscriptSerializer, TranscriptListSerializer, TutorialSerializer, GenerationJobSerializer, VideoUploadSerializer
+from .services import TranscriptService, TutorialService, GenerationJobService, VideoClipService, ChunkedUploadService, BulkImportService
+from .services.transcript_service import TranscriptConflict
+from .services.upload_service import UploadConflict
 
 logger = logging.getLogger(__name__)
 
@@ -43,20 +49,40 @@ def logout_view(request):
     return JsonResponse({'success': True, 'message': 'Logged out successfully'})
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def metrics_view(request):
+    """Counters and latency histograms added up over all web and worker processes, and the live OpenAI rate limit queue (staff only)."""
+    return Response({**metrics.collect(), 'rate_limit': rate_limiter.status()})
+
+
 class TranscriptViewSet(viewsets.ModelViewSet):
     """
     API endpoints for transcript management:
     - GET /api/transcripts/ - List user's transcripts
-    - POST /api/transcripts/ - Upload transcript with optional video
-    - POST /api/transcripts/{id}/generate/ - Generate tutorial from transcript
+    - POST /api/transcripts/ - Upload transcript with optional video (file or finished chunked upload)
+    - POST /api/transcripts/import/ - Import many transcripts from a ZIP or NDJSON file
+    - GET /api/transcripts/{id}/ - Transcript with its phrases
+    - GET /api/transcripts/{id}/phrases/?from=&to= - Phrases only, optionally within a time range (seconds)
+    - POST /api/transcripts/{id}/generate/ - Queue tutorial generation from transcript
+    - GET /api/transcripts/{id}/generate/stream/ - Generate in the request, streamed as server-sent events
     """
     serializer_class = TranscriptSerializer
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser]
 
     def get_queryset(self):
-        """Filter transcripts to current user only."""
-        return Transcript.objects.filter(user=self.request.user)
+        """Filter transcripts to current user only, loading phrases only where they are returned."""
+        queryset = Transcript.objects.filter(user=self.request.user).select_related('user')
+        if self.action not in ('retrieve', 'phrases'):
+            queryset = queryset.defer(*Transcript.PHRASE_FIELDS)
+        return queryset
+
+    def get_serializer_class(self):
+        """Use the slim representation everywhere except the detail view."""
+        if self.action == 'retrieve':
+            return TranscriptSerializer
+        return TranscriptListSerializer
 
     def create(self, request, *args, **kwargs):
         """Upload JSON transcript file with optional video file."""
@@ -65,42 +91,218 @@ class TranscriptViewSet(viewsets.ModelViewSet):
         
         json_file = request.FILES['file']
         video_file = request.FILES.get('video_file')
+        video_upload_id = request.data.get('video_upload')
+        
+        if video_file and video_upload_id:
+            return Response({"detail": "Send either video_file or video_upload, not both"}, status=400)
         
         try:
-            transcript = TranscriptService.create_from_file(
+            video_upload = ChunkedUploadService.get_completed(request.user, video_upload_id) if video_upload_id else None
+            transcript, created = TranscriptService.create_from_file(
                 user=request.user,
                 json_file=json_file,
-                video_file=video_file
+                video_file=video_file,
+                video_upload=video_upload
             )
             
             serializer = self.get_serializer(transcript)
-            logger.info(f"Transcript {transcript.id} uploaded by user {request.user.id}")
+            if created:
+                logger.info(f"Transcript {transcript.id} uploaded by user {request.user.id}")
             
-            return Response(serializer.data, status=201)
+            # Re-uploads of a known transcript return it, with the video sent along if any
+            return Response(serializer.data, status=201 if created else 200)
             
         except json.JSONDecodeError:
             return Response({"detail": "Invalid JSON format"}, status=400)
+        except TranscriptConflict as e:
+            return Response({"detail": str(e)}, status=409)
         except ValidationError as e:
             return Response({"detail": str(e)}, status=400)
         except Exception as e:
             logger.error(f"Transcript upload failed for user {request.user.id}: {e}")
             return Response({"detail": "Upload failed"}, status=500)
 
-    @action(detail=True, methods=['post'])
-    def generate(self, request, pk=None):
-        """Generate tutorial from transcript using OpenAI and extract video clips."""
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        """Import transcripts from a ZIP of JSON files or an NDJSON file, reporting each item."""
+        if 'file' not in request.FILES:
+            return Response({"detail": "ZIP or NDJSON file is required"}, status=400)
+        
+        try:
+            results = BulkImportService.import_file(request.user, request.FILES['file'])
+        except zipfile.BadZipFile:
+            return Response({"detail": "Invalid ZIP file"}, status=400)
+        
+        return Response({"summary": BulkImportService.summarize(results), "results": results})
+
+    @action(detail=True, methods=['get'])
+    def phrases(self, request, pk=None):
+        """Return the phrases of a transcript, optionally only those overlapping ?from=&to= (seconds)."""
         transcript = self.get_object()
+        if 'from' not in request.query_params and 'to' not in request.query_params:
+            return Response(transcript.phrases)
         
         try:
-            tutorial = TutorialService.create_from_transcript(transcript)
-            serializer = TutorialSerializer(tutorial)
-            
-            logger.info(f"Tutorial {tutorial.id} generated for transcript {transcript.id}")
-            return Response(serializer.data, status=201)
-            
+            start = float(request.query_params.get('from', 0))
+            end = float(request.query_params.get('to', 'inf'))
+        except ValueError:
+            return Response({"detail": "from and to must be numbers of seconds"}, status=400)
+        if math.isnan(start) or math.isnan(end):
+            return Response({"detail": "from and to must be numbers of seconds"}, status=400)
+        if start > end:
+            return Response({"detail": "from must not be after to"}, status=400)
+        
+        return Response(transcript.phrases_between(start, end))
+
+    @action(detail=True, methods=['post'], parser_classes=[JSONParser, MultiPartParser])
+    def generate(self, request, pk=None):
+        """
+        Queue tutorial generation; poll GET /api/jobs/{id}/ for the result.
+
+        `{"force": true}` bypasses the OpenAI response cache.
+        """
+        transcript = self.get_object()
+        try:
+            force = BooleanField().to_internal_value(request.data.get('force', False))
+        except ValidationError as e:
+            raise ValidationError({'force': e.detail})
+        job = GenerationJobService.enqueue(transcript, force=force)
+        return Response(GenerationJobSerializer(job).data, status=202)
+
+    @action(detail=True, methods=['get'], url_path='generate/stream')
+    def generate_stream(self, request, pk=None):
+        """
+        Generate a tutorial in this request, streaming its parts as server-sent events.
+
+        Events: `field` ({name, value}) for each tutorial field, `step` for
+        each step as soon as it is complete, `clip` ({index, status}) when
+        the clip of a step is cut, then `tutorial` with the saved tutorial,
+        or `error` ({detail}). `?force=true` bypasses the OpenAI response cache.
+        """
+        transcript = self.get_object()
+        try:
+            force = BooleanField().to_internal_value(request.query_params.get('force', False))
+        except ValidationError as e:
+            raise ValidationError({'force': e.detail})
+
+        # Under ASGI the stream runs on the event loop and holds no thread while the model writes
+        if _is_asgi(request):
+            events = self._astream_events(transcript, force)
+        else:
+            events = self._stream_events(transcript, force)
+
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Stop reverse proxies from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _stream_events(self, transcript: Transcript, force: bool):
+        """Format the generation events of `TutorialService.stream_from_transcript` as SSE messages."""
+        # Sent first so that clients see the stream open before the model answers
+        yield ": generating\n\n"
+        try:
+            for event, data in TutorialService.stream_from_transcript(transcript, force=force):
+                if event == 'tutorial':
+                    data = TutorialSerializer(data).data
+                yield _format_event(event, data)
+        except Exception as e:
+            yield _format_event('error', {'detail': str(e)})
+
+    async def _astream_events(self, transcript: Transcript, force: bool):
+        """Async version of `_stream_events`, over `TutorialService.astream_from_transcript`."""
+        yield ": generating\n\n"
+        try:
+            async for event, data in TutorialService.astream_from_transcript(transcript, force=force):
+                if event == 'tutorial':
+                    data = await sync_to_async(lambda tutorial: TutorialSerializer(tutorial).data)(data)
+                yield _format_event(event, data)
         except Exception as e:
-            logger.error(f"Tutorial generation failed for transcript {transcript.id}: {e}")
-            return Response({"detail": "Generation failed"}, status=502)
+            yield _format_event('error', {'detail': str(e)})
+
+
+def _is_asgi(request) -> bool:
+    """Whether the request is served by an ASGI server; WSGI servers always set `wsgi.version`."""
+    return 'wsgi.version' not in request.META
+
+
+def _format_event(event: str, data) -> str:
+    """Format a server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+class VideoUploadViewSet(mixins.CreateModelMixin,
+                         mixins.RetrieveModelMixin,
+                         mixins.DestroyModelMixin,
+                         viewsets.GenericViewSet):
+    """
+    API endpoints for chunked, resumable video uploads:
+    - POST /api/uploads/ - Start an upload ({"filename", "size"})
+    - GET /api/uploads/{id}/ - Get the committed offset to resume from
+    - PUT /api/uploads/{id}/chunk/?offset=N - Append raw bytes at offset N
+    - POST /api/uploads/{id}/finalize/ - Complete the upload (optional {"sha256"})
+    - DELETE /api/uploads/{id}/ - Abort the upload
+    
+    A finalized upload is attached with POST /api/transcripts/ (`video_upload` field).
+    """
+    serializer_class = VideoUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser]
+
+    def get_queryset(self):
+        """Filter uploads to current user only."""
+        return VideoUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        """Create the upload and its empty partial file."""
+        serializer.instance = ChunkedUploadService.start(
+            user=self.request.user,
+            filename=serializer.validated_data['filename'],
+            size=serializer.validated_data['size'],
+        )
+
+    def perform_destroy(self, instance):
+        """Delete the upload and its partial file."""
+        ChunkedUploadService.discard(instance)
+
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, pk=None):
+        """Stream the request body to disk at the given offset."""
+        upload = self.get_object()
+
+        try:
+            offset = int(request.query_params.get('offset', ''))
+        except ValueError:
+            return Response({"detail": "offset query parameter is required"}, status=400)
+
+        try:
+            upload = ChunkedUploadService.append(upload, offset, request.stream)
+        except UploadConflict as e:
+            # Client is out of sync: tell it where to resume
+            return Response({"detail": str(e), "offset": e.offset}, status=409)
+
+        return Response(self.get_serializer(upload).data)
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """Check that every byte arrived and record the file hash."""
+        upload = ChunkedUploadService.finalize(self.get_object(), request.data.get('sha256'))
+        logger.info(f"Video upload {upload.id} finalized by user {request.user.id}")
+        return Response(self.get_serializer(upload).data)
+
+
+class GenerationJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoints for generation job status:
+    - GET /api/jobs/ - List user's generation jobs
+    - GET /api/jobs/{id}/ - Poll a generation job
+    """
+    serializer_class = GenerationJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        """Filter jobs to current user only."""
+        return GenerationJob.objects.filter(transcript__user=self.request.user)
 
 
 
@@ -110,8 +312,64 @@ class TutorialViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        """Filter tutorials to current user only."""
-        return Tutorial.objects.filter(transcript__user=self.request.user)
+        """Filter tutorials to current user only, without transcript phrases."""
+        return (
+            Tutorial.objects
+            .filter(transcript__user=self.request.user)
+            .select_related('transcript__user')
+            .defer(*(f'transcript__{field}' for field in Transcript.PHRASE_FIELDS))
+        )
+
+    def perform_update(self, serializer):
+        """Save edits and queue re-extraction of clips whose range changed."""
+        tutorial = serializer.save()
+
+        if 'steps' not in serializer.validated_data or not tutorial.transcript.video_file:
+            return
+
+        stale = VideoClipService.find_stale_clips(tutorial)
+
+        if stale:
+            # Don't point edited steps to clips of their previous range
+            for position in stale:
+                tutorial.steps[position]['video_clip'].pop('file_url', None)
+            tutorial.save(update_fields=['steps', 'updated_at'])
+
+        if stale or VideoClipService.find_orphan_clips(tutorial):
+            GenerationJobService.enqueue_reclip(tutorial)
+
+    @action(detail=True, methods=['post'])
+    def regenerate(self, request, pk=None):
+        """
+        Queue the regeneration of one section; poll GET /api/jobs/{id}/ for the result.
+
+        `{"section": "step", "step": 3}` rewrites step 3; `section` may also be
+        `tips`, `summary` or `title` (title and tags). The rest of the
+        tutorial, and the clips of other steps, are left as they are.
+        `{"force": true}` bypasses the OpenAI response cache.
+        """
+        tutorial = self.get_object()
+        section = request.data.get('section')
+        if section not in dict(GenerationJob.SECTION_CHOICES):
+            choices = ", ".join(dict(GenerationJob.SECTION_CHOICES))
+            return Response({"section": [f"Must be one of: {choices}"]}, status=400)
+
+        step_index = None
+        if section == GenerationJob.SECTION_STEP:
+            try:
+                step_index = IntegerField().to_internal_value(request.data.get('step'))
+            except ValidationError as e:
+                raise ValidationError({'step': e.detail})
+            if not any(isinstance(step, dict) and step.get('index') == step_index for step in tutorial.steps):
+                return Response({"step": [f"Tutorial has no step {step_index}"]}, status=400)
+
+        try:
+            force = BooleanField().to_internal_value(request.data.get('force', False))
+        except ValidationError as e:
+            raise ValidationError({'force': e.detail})
+
+        job = GenerationJobService.enqueue_regenerate(tutorial, section, step_index, force=force)
+        return Response(GenerationJobSerializer(job).data, status=202)
 
     @action(detail=True, methods=['get'])
     def export_zip(self, request, pk=None):
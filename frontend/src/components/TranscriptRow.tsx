@@ -2,7 +2,7 @@ import React from 'react';
 import { Block } from 'jsxstyle';
 import { Loader2, Play } from 'lucide-react';
 import { Transcript } from '../types';
-import { formatDateTime, formatDuration, getLanguage, getAverageConfidence } from '../utils/formatters';
+import { formatDateTime, formatDuration } from '../utils/formatters';
 
 interface TranscriptRowProps {
   transcript: Transcript;
@@ -50,15 +50,15 @@ export const TranscriptRow: React.FC<TranscriptRowProps> = ({
     </Block>
     
     <Block color="#586069" textAlign="center">
-      {transcript.phrases.length}
+      {transcript.phrase_count}
     </Block>
     
     <Block color="#586069" textAlign="center">
-      {getLanguage(transcript.phrases)}
+      {transcript.language || 'N/A'}
     </Block>
     
     <Block color="#586069" textAlign="center">
-      {getAverageConfidence(transcript.phrases).toFixed(2)}
+      {(transcript.average_confidence ?? 0).toFixed(2)}
     </Block>
     
     <Block textAlign="center">
@@ -16,14 +16,20 @@ export interface User {
 }
 
 // Transcript interface representing uploaded conversation files
+// Lists only carry phrase statistics; phrases come from the detail or /phrases/ endpoints
 export interface Transcript {
   id: string;
   user: User;
   filename: string;
   video_file?: string;  // Optional video file URL associated with the transcript
+  has_video: boolean;
   timestamp: string;  // ISO datetime string from the original conversation
   duration_in_ticks: number;  // Duration in system ticks (10,000,000 = 1 second)
-  phrases: any[];  // Array of conversation phrases with text and metadata
+  duration_seconds: number;
+  phrase_count: number;
+  language: string;  // Most common phrase locale, empty if unknown
+  average_confidence: number | null;  // Mean phrase confidence (0-1), null if unknown
+  phrases?: any[];  // Array of conversation phrases with text and metadata (detail only)
   created_at: string;  // ISO datetime string when uploaded to our system
 }
 
@@ -55,9 +61,37 @@ export interface Tutorial {
   summary: string;  // AI-generated summary paragraph
   duration_estimate: string;  // Estimated completion time (e.g., "5 minutes")
   tags: string[];  // Array of relevant keywords/tags
+  generation_model: string;  // Language model that generated the tutorial
+  generation_seconds: number | null;  // Time the model took to generate it
   updated_at: string;  // ISO datetime string when last modified
 }
 
+// Generation job interface for queued tutorial generation
+export interface GenerationJob {
+  id: string;
+  transcript: string;  // Source transcript ID
+  tutorial: string | null;  // Generated tutorial ID, set once the job succeeded
+  force: boolean;  // Generated without the OpenAI response cache
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  error: string;  // Error message when the job failed
+  attempts: number;
+  created_at: string;
+  started_at: string | null;
+  finished_at: string | null;
+}
+
+// Chunked, resumable video upload
+export interface VideoUpload {
+  id: string;
+  filename: string;
+  size: number;  // Total size in bytes
+  offset: number;  // Bytes received so far, where the next chunk starts
+  sha256: string;  // Set once the upload is finalized
+  status: 'uploading' | 'complete';
+  created_at: string;
+  updated_at: string;
+}
+
 // API response interface for Django authentication endpoint
 export interface AuthResponse {
   authenticated: boolean;
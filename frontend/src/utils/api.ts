@@ -1,9 +1,16 @@
-import { AuthResponse, Transcript, Tutorial } from '../types';
+import { AuthResponse, GenerationJob, Transcript, Tutorial, VideoUpload } from '../types';
 import { getCsrfToken } from './csrf';
 
 // Configuration de base de l'API
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
+// Delay between two polls of a generation job
+const JOB_POLL_INTERVAL_MS = 2000;
+
+// Videos are sent in chunks of this size, each one can be retried on its own
+const UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024;
+const UPLOAD_MAX_RETRIES = 5;
+
 // Base fetch with common options
 const apiFetch = async (endpoint: string, options: RequestInit = {}) => {
   // On isole headers de toutes les autres options
@@ -72,9 +79,10 @@ export const api = {
     const formData = new FormData();
     formData.append('file', file);
     
-    // Add video file if provided
+    // Videos go through the resumable upload endpoint first
     if (videoFile) {
-      formData.append('video_file', videoFile);
+      const upload = await api.uploadVideo(videoFile);
+      formData.append('video_upload', upload.id);
     }
     
     await apiFetch('/api/transcripts/', {
@@ -83,10 +91,65 @@ export const api = {
     });
   },
 
-  async generateTutorial(transcriptId: string): Promise<void> {
-    await apiFetch(`/api/transcripts/${transcriptId}/generate/`, {
+  async uploadVideo(videoFile: File): Promise<VideoUpload> {
+    const response = await apiFetch('/api/uploads/', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ filename: videoFile.name, size: videoFile.size }),
+    });
+    let upload: VideoUpload = await response.json();
+    let retries = 0;
+
+    while (upload.offset < upload.size) {
+      const chunk = videoFile.slice(upload.offset, upload.offset + UPLOAD_CHUNK_BYTES);
+      try {
+        const chunkResponse = await apiFetch(`/api/uploads/${upload.id}/chunk/?offset=${upload.offset}`, {
+          method: 'PUT',
+          headers: { 'Content-Type': 'application/octet-stream' },
+          body: chunk,
+        });
+        upload = await chunkResponse.json();
+        retries = 0;
+      } catch (error) {
+        if (++retries > UPLOAD_MAX_RETRIES) {
+          throw error;
+        }
+        // Resume from the offset the server actually committed
+        await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+        const statusResponse = await apiFetch(`/api/uploads/${upload.id}/`);
+        upload = await statusResponse.json();
+      }
+    }
+
+    const finalizeResponse = await apiFetch(`/api/uploads/${upload.id}/finalize/`, {
+      method: 'POST',
+    });
+    return finalizeResponse.json();
+  },
+
+  // `force` asks OpenAI again instead of reusing a cached answer for an unchanged transcript
+  async generateTutorial(transcriptId: string, force = false): Promise<void> {
+    const response = await apiFetch(`/api/transcripts/${transcriptId}/generate/`, {
       method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ force }),
     });
+    let job: GenerationJob = await response.json();
+
+    // Generation runs in a background worker: poll until the job is done
+    while (job.status === 'queued' || job.status === 'running') {
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+      job = await api.getJob(job.id);
+    }
+
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Generation failed');
+    }
+  },
+
+  async getJob(jobId: string): Promise<GenerationJob> {
+    const response = await apiFetch(`/api/jobs/${jobId}/`);
+    return response.json();
   },
 
   // Tutorials
@@ -46,32 +46,4 @@ export const formatDuration = (ticks: number): string => {
   const minutes = Math.floor(seconds / 60);
   const remainingSeconds = seconds % 60;
   return `${minutes.toString().padStart(2, '0')}:${remainingSeconds.toString().padStart(2, '0')}`;
-};
-
-/**
- * Extract the most common language from transcript phrases
- * 
- * @param phrases - Array of conversation phrases with locale information
- * @returns Most common language code or 'N/A' if none found
- */
-export const getLanguage = (phrases: any[]): string => {
-  if (!phrases.length) return 'N/A';
-  const locales = phrases.map(p => p.locale).filter(Boolean);
-  const mostCommon = locales.reduce((acc, locale) => {
-    acc[locale] = (acc[locale] || 0) + 1;
-    return acc;
-  }, {} as Record<string, number>);
-  return Object.keys(mostCommon).sort((a, b) => mostCommon[b] - mostCommon[a])[0] || 'N/A';
-};
-
-/**
- * Calculate average confidence score from transcript phrases
- * 
- * @param phrases - Array of conversation phrases with confidence scores
- * @returns Average confidence as a decimal (0-1)
- */
-export const getAverageConfidence = (phrases: any[]): number => {
-  if (!phrases.length) return 0;
-  const confidences = phrases.map(p => p.confidence).filter(c => c !== undefined);
-  return confidences.length ? (confidences.reduce((a, b) => a + b, 0) / confidences.length) : 0;
 }; 
\ No newline at end of file
@@ -9,8 +9,10 @@ done
 
 echo "Database is ready!"
 
-# Auto-migrate the database
-python manage.py migrate --noinput
+# Auto-migrate the database (disabled for generation workers)
+if [ "${RUN_MIGRATIONS:-1}" = "1" ]; then
+    python manage.py migrate --noinput
+fi
 
 # Start the server
 exec "$@" 
\ No newline at end of file